@@ -0,0 +1,416 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# An alternate Python Minecraft library for the Rasperry-Pi
+# Copyright (c) 2013-2016 Dave Jones <dave@waveform.org.uk>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmarks for picraft's hot paths.
+
+This script times the operations that dominate real-world picraft scripts
+(block queries and updates, batching, vector ranges and shape generators,
+color matching, model parsing and rendering, event polling, turtle drawing and
+importing the turtle module) against a :class:`~picraft.testing.FakeServer`
+with an artificial round-trip latency. Results are written as JSON so that runs can be compared between
+releases::
+
+    $ python benchmarks/bench.py --output before.json
+    $ git checkout my-branch
+    $ python benchmarks/bench.py --output after.json --compare before.json
+
+When *--compare* is given, any benchmark more than *--threshold* (default 10%)
+slower than the baseline is reported and the script exits with a non-zero
+status. Use *--filter* to run a subset of the benchmarks.
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+str = type('')
+
+
+import io
+import os
+import re
+import sys
+import json
+import math
+import timeit
+import argparse
+import platform
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from picraft import (
+    World, Vector, Block, Model, vector_range, line, circle, sphere, filled,
+    lines, O, X, Y, Z,
+    )
+from picraft.turtle import TurtleScreen, Turtle
+from picraft.testing import FakeServer
+
+
+BENCHMARKS = []
+
+
+def benchmark(number):
+    """
+    Registers the decorated function as a benchmark. The function is called
+    with a :class:`Context` and must return a callable which performs one
+    iteration of the operation being measured. The callable is run *number*
+    times per repetition.
+    """
+    def decorator(f):
+        BENCHMARKS.append((f.__name__, number, f))
+        return f
+    return decorator
+
+
+class Context(object):
+    """
+    Holds the fake servers and worlds used by the benchmarks.
+    """
+    def __init__(self, latency, bandwidth):
+        self.juice = FakeServer(latency=latency, bandwidth=bandwidth)
+        self.pi = FakeServer(
+            version='minecraft-pi', latency=latency, bandwidth=bandwidth)
+        self.juice_world = World(*self.juice.address)
+        self.pi_world = World(*self.pi.address, timeout=max(0.1, latency * 4))
+
+    def sync(self):
+        """
+        Waits for both servers to finish processing any outstanding commands
+        (so that one benchmark's backlog isn't charged to the next).
+        """
+        self.juice_world.blocks[O]
+        self.pi_world.blocks[O]
+
+    def close(self):
+        self.juice_world.connection.close()
+        self.pi_world.connection.close()
+        self.juice.close()
+        self.pi.close()
+
+
+def sphere_obj(n):
+    """
+    Returns the source of an object file describing a unit sphere made of
+    2*n*n triangles.
+    """
+    out = ['usemtl stone']
+    for i in range(n + 1):
+        theta = math.pi * i / n
+        for j in range(n):
+            phi = 2 * math.pi * j / n
+            out.append('v %f %f %f' % (
+                math.sin(theta) * math.cos(phi),
+                math.cos(theta),
+                math.sin(theta) * math.sin(phi)))
+    for i in range(n):
+        for j in range(n):
+            a = i * n + j + 1
+            b = i * n + (j + 1) % n + 1
+            c = (i + 1) * n + (j + 1) % n + 1
+            d = (i + 1) * n + j + 1
+            out.append('f %d %d %d' % (a, b, c))
+            out.append('f %d %d %d' % (a, c, d))
+    return '\n'.join(out)
+
+
+@benchmark(number=100)
+def blocks_get_single(ctx):
+    world = ctx.juice_world
+    return lambda: world.blocks[O]
+
+
+@benchmark(number=10)
+def blocks_get_range_juice(ctx):
+    world = ctx.juice_world
+    vrange = vector_range(O, Vector(16, 4, 16))
+    return lambda: world.blocks[vrange]
+
+
+@benchmark(number=2)
+def blocks_get_range_pi(ctx):
+    world = ctx.pi_world
+    vrange = vector_range(O, Vector(8, 2, 8))
+    return lambda: world.blocks[vrange]
+
+
+@benchmark(number=100)
+def blocks_set_single(ctx):
+    world = ctx.juice_world
+    block = Block('stone')
+    return lambda: world.blocks.__setitem__(O, block)
+
+
+@benchmark(number=100)
+def blocks_set_range(ctx):
+    world = ctx.juice_world
+    vrange = vector_range(O, Vector(16, 4, 16))
+    block = Block('stone')
+    return lambda: world.blocks.__setitem__(vrange, block)
+
+
+@benchmark(number=5)
+def blocks_set_list(ctx):
+    world = ctx.juice_world
+    vrange = vector_range(O, Vector(16, 4, 16))
+    blocks = [Block.from_id(i % 16 + 1) for i in range(len(vrange))]
+    return lambda: world.blocks.__setitem__(vrange, blocks)
+
+
+@benchmark(number=5)
+def send_unbatched(ctx):
+    world = ctx.juice_world
+    block = Block('stone')
+    def run():
+        for i in range(100):
+            world.blocks[i * X] = block
+        # Wait for the server to catch up
+        world.blocks[O]
+    return run
+
+
+@benchmark(number=5)
+def send_batched(ctx):
+    world = ctx.juice_world
+    block = Block('stone')
+    def run():
+        with world.connection.batch_start():
+            for i in range(100):
+                world.blocks[i * X] = block
+        world.blocks[O]
+    return run
+
+
+@benchmark(number=5)
+def vector_range_iter(ctx):
+    vrange = vector_range(Vector(32, 32, 32))
+    return lambda: sum(1 for v in vrange)
+
+
+@benchmark(number=1000)
+def vector_range_index(ctx):
+    vrange = vector_range(Vector(32, 32, 32))
+    v = Vector(17, 23, 5)
+    return lambda: vrange.index(v)
+
+
+@benchmark(number=1000)
+def vector_range_contains(ctx):
+    vrange = vector_range(Vector(32, 32, 32))
+    v = Vector(17, 23, 5)
+    return lambda: v in vrange
+
+
+@benchmark(number=100)
+def shape_line(ctx):
+    end = Vector(50, 30, 20)
+    return lambda: list(line(O, end))
+
+
+@benchmark(number=20)
+def shape_circle(ctx):
+    return lambda: list(circle(O, 20 * Y))
+
+
+@benchmark(number=5)
+def shape_sphere(ctx):
+    return lambda: list(sphere(O, 10))
+
+
+@benchmark(number=20)
+def shape_filled(ctx):
+    points = [O, 20 * X, 20 * X + 20 * Z, 20 * Z]
+    return lambda: list(filled(lines(points)))
+
+
+@benchmark(number=100)
+def block_from_color(ctx):
+    colors = ['#%02x%02x%02x' % (i * 37 % 256, i * 91 % 256, i * 13 % 256)
+              for i in range(10)]
+    return lambda: [Block.from_color(c) for c in colors]
+
+
+@benchmark(number=3)
+def model_parse(ctx):
+    source = sphere_obj(32)
+    return lambda: Model(io.StringIO(source))
+
+
+@benchmark(number=3)
+def model_render(ctx):
+    model = Model(io.StringIO(sphere_obj(32)))
+    return lambda: model.render(scale=20)
+
+
+@benchmark(number=3)
+def model_render_sat(ctx):
+    model = Model(io.StringIO(sphere_obj(32)))
+    return lambda: model.render(scale=20, engine='sat')
+
+
+@benchmark(number=20)
+def events_poll(ctx):
+    world = ctx.juice_world
+    world.events.track_players = world.players
+    def run():
+        ctx.juice.hit_block(O, 'y+')
+        world.events.poll()
+    return run
+
+
+@benchmark(number=3)
+def turtle_draw(ctx):
+    screen = TurtleScreen(ctx.juice_world)
+    def run():
+        t = Turtle(screen, pos=O)
+        for i in range(4):
+            t.forward(10)
+            t.right(90)
+    return run
+
+
+@benchmark(number=20)
+def turtle_import(ctx):
+    # Executes the module's body in a fresh namespace each time; the source is
+    # compiled once up front, as an import would normally find it compiled
+    import picraft.turtle
+    filename = os.path.splitext(picraft.turtle.__file__)[0] + '.py'
+    with io.open(filename, 'rb') as f:
+        code = compile(f.read(), filename, 'exec')
+    def run():
+        exec(code, {
+            '__name__': 'picraft.turtle',
+            '__package__': 'picraft',
+            '__file__': filename,
+            })
+    return run
+
+
+def picraft_version():
+    try:
+        from pkg_resources import get_distribution
+        return get_distribution('picraft').version
+    except Exception:
+        return None
+
+
+def run(ctx, name_filter, repeat):
+    results = {}
+    for name, number, setup in BENCHMARKS:
+        if name_filter and not re.search(name_filter, name):
+            continue
+        timer = timeit.Timer(setup(ctx))
+        times = [t / number for t in timer.repeat(repeat, number)]
+        times.sort()
+        ctx.sync()
+        results[name] = {
+            'number': number,
+            'repeat': repeat,
+            'best': times[0],
+            'median': times[len(times) // 2],
+            }
+        print('%-24s %12.3f ms  (median %.3f ms)' % (
+            name, times[0] * 1000, times[len(times) // 2] * 1000))
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print()
+    print('%-24s %12s %12s %8s' % ('benchmark', 'baseline', 'current', 'ratio'))
+    for name, result in sorted(results.items()):
+        try:
+            old = baseline['results'][name]['best']
+        except KeyError:
+            continue
+        ratio = result['best'] / old
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('%-24s %9.3f ms %9.3f ms %7.2fx%s' % (
+            name, old * 1000, result['best'] * 1000, ratio, flag))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--latency', type=float, default=0.001,
+        help='Round-trip latency imposed by the fake server in seconds '
+        '(default: %(default)s)')
+    parser.add_argument(
+        '--bandwidth', type=float, default=None,
+        help='Bandwidth limit imposed by the fake server in bytes per second '
+        '(default: unlimited)')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of times to repeat each benchmark (default: %(default)s)')
+    parser.add_argument(
+        '--filter', default=None,
+        help='Only run benchmarks whose name matches this regular expression')
+    parser.add_argument(
+        '--output', default=None,
+        help='Write the results to this JSON file')
+    parser.add_argument(
+        '--compare', default=None,
+        help='Compare the results to this JSON file from an earlier run')
+    parser.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='Report benchmarks slower than the baseline by more than this '
+        'fraction (default: %(default)s)')
+    config = parser.parse_args(args)
+
+    ctx = Context(config.latency, config.bandwidth)
+    try:
+        results = run(ctx, config.filter, config.repeat)
+    finally:
+        ctx.close()
+    if config.output:
+        with io.open(config.output, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'picraft': picraft_version(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'latency': config.latency,
+                'bandwidth': config.bandwidth,
+                'results': results,
+                }, indent=4, sort_keys=True))
+    if config.compare:
+        with io.open(config.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, config.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
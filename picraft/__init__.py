@@ -63,6 +63,7 @@ package:
 * :ref:`api_events`
 * :ref:`api_connection`
 * :ref:`api_player`
+* :ref:`api_schematic`
 * :ref:`api_exc`
 """
 
@@ -91,11 +92,12 @@ from .exc import (
     UnsupportedCommand,
     NegativeWeight,
     )
-from .vector import Vector, vector_range, line, lines, circle, sphere, filled, V, O, X, Y, Z
+from .vector import Vector, vector_range, line, lines, circle, sphere, filled, cuboids, V, O, X, Y, Z
 from .block import Block
 from .events import BlockHitEvent, PlayerPosEvent, IdleEvent, ChatPostEvent
-from .connection import Connection
+from .connection import Connection, ConnectionMetrics
 from .player import Players, Player, HostPlayer
-from .world import World
+from .world import World, Snapshot
+from .schematic import Schematic
 from .render import Model
 
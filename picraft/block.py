@@ -106,6 +106,7 @@ str = type('')
 
 import io
 import warnings
+from array import array
 from math import sqrt
 from collections import namedtuple
 from itertools import cycle
@@ -113,6 +114,8 @@ from itertools import cycle
 from pkg_resources import resource_stream
 from .exc import EmptySliceWarning
 from .vector import Vector, vector_range
+from .compat import range
+from .tracing import span
 
 
 def _read_block_data(filename_or_object):
@@ -458,38 +461,204 @@ class Block(namedtuple('Block', ('id', 'data'))):
             return self._BLOCKS_DB[(self.id, 0)][3]
 
 
+# Pre-encoded command templates for the hot paths in Blocks (these are sent
+# as-is by Connection.send without an intermediate unicode string)
+_SET_BLOCK = b'world.setBlock(%d,%d,%d,%d,%d)\n'
+_SET_BLOCKS = b'world.setBlocks(%d,%d,%d,%d,%d,%d,%d,%d)\n'
+
+
 class Blocks(object):
     """
     This class implements the :attr:`~picraft.world.World.blocks` attribute.
     """
+    #: Against a Raspberry Juice server, a range with a non-unit step or a
+    #: non-default order is read by querying the whole box enclosing it with a
+    #: single ``world.getBlocks`` command (then selecting the requested blocks
+    #: client-side) if the range contains at least this proportion of the
+    #: box's blocks. Sparser ranges are read block by block.
+    fetch_density = 0.1
+
     def __init__(self, connection):
         self._connection = connection
 
     def __repr__(self):
         return '<Blocks>'
 
-    def _get_blocks(self, vrange):
+    def _get_box(self, vrange):
+        """
+        Returns the unit-step box (in the default order) to read with a single
+        ``world.getBlocks`` command in order to answer a query for *vrange*,
+        or ``None`` if *vrange* should be read block by block.
+        """
+        if self._connection.server_version != 'raspberry-juice':
+            return None
+        if vrange.step == Vector(1, 1, 1) and vrange.order == 'zxy':
+            return vrange
+        lo, hi = zip(*(
+            (min(r[0], r[-1]), max(r[0], r[-1]))
+            for r in (
+                range(
+                    getattr(vrange.start, axis),
+                    getattr(vrange.stop, axis),
+                    getattr(vrange.step, axis))
+                for axis in 'xyz'
+                )
+            ))
+        box = vector_range(Vector(*lo), Vector(*hi) + 1)
+        if len(vrange) >= len(box) * self.fetch_density:
+            return box
+        return None
+
+    @staticmethod
+    def _select(vrange, box, blocks):
+        """
+        Given the *blocks* read from *box* (as returned by :meth:`_get_box`),
+        return those within *vrange* in the order of *vrange*.
+        """
+        if box is vrange:
+            return blocks
+        size = box.stop - box.start
+        # Offsets of each coordinate within the box's zxy ordering
+        x_offsets = {
+            x: (x - box.start.x) * size.z
+            for x in range(box.start.x, box.stop.x)}
+        y_offsets = {
+            y: (y - box.start.y) * size.z * size.x
+            for y in range(box.start.y, box.stop.y)}
+        z_offsets = {
+            z: z - box.start.z
+            for z in range(box.start.z, box.stop.z)}
         return [
-            Block.from_string('%d,0' % int(i))
-            for i in self._connection.transact(
-                'world.getBlocks(%d,%d,%d,%d,%d,%d)' % (
-                vrange.start.x, vrange.start.y, vrange.start.z,
-                vrange.stop.x - vrange.step.x,
-                vrange.stop.y - vrange.step.y,
-                vrange.stop.z - vrange.step.z)
-                ).split(',')
+            blocks[y_offsets[v.y] + x_offsets[v.x] + z_offsets[v.z]]
+            for v in vrange
             ]
 
+    @staticmethod
+    def _get_blocks_command(vrange):
+        return 'world.getBlocks(%d,%d,%d,%d,%d,%d)' % (
+            vrange.start.x, vrange.start.y, vrange.start.z,
+            vrange.stop.x - vrange.step.x,
+            vrange.stop.y - vrange.step.y,
+            vrange.stop.z - vrange.step.z)
+
+    @staticmethod
+    def _ids_to_blocks(ids):
+        # getBlocks doesn't report block data; as blocks are immutable, one
+        # instance is shared by all occurrences of each id
+        lookup = {id: Block.from_id(id) for id in set(ids)}
+        return [lookup[id] for id in ids]
+
+    @classmethod
+    def _parse_blocks(cls, reply):
+        return cls._ids_to_blocks(array(str('H'), map(int, reply.split(','))))
+
+    def _get_blocks(self, vrange):
+        return self._ids_to_blocks(
+            self._connection.transact_array(self._get_blocks_command(vrange)))
+
     def _get_block_loop(self, vrange):
         return [
-            Block.from_string(
-                self._connection.transact(
-                    'world.getBlockWithData(%d,%d,%d)' %
-                    (v.x, v.y, v.z)))
-            for v in vrange
+            Block.from_string(s)
+            for s in self._connection.transact_many(
+                'world.getBlockWithData(%d,%d,%d)' % (v.x, v.y, v.z)
+                for v in vrange
+                )
             ]
 
+    def iter_chunks(self, vrange, chunk=Vector(16, 16, 16), pipeline=4):
+        """
+        Generator function which reads the blocks within *vrange* (a
+        :class:`~picraft.vector.vector_range`) in chunks, yielding a tuple of
+        ``(sub_range, blocks)`` for each, where *sub_range* is the part of
+        *vrange* covered by the chunk, and *blocks* is the list of blocks
+        within it (as would be returned by querying *sub_range*).
+
+        This is intended for scanning regions too large to read in one go.
+        Each chunk covers at most *chunk* elements of *vrange* along each axis.
+        The requests for up to *pipeline* chunks are sent before any replies
+        are read, so no more than *pipeline* chunks are held in memory at once,
+        and none are still being received when a chunk is yielded. Hence the
+        caller may stop iterating at any time::
+
+            >>> v = world.player.tile_pos
+            >>> for sub_range, blocks in world.blocks.iter_chunks(
+            ...         vector_range(v - 500, v + 500)):
+            ...     if Block.from_name('diamond_ore') in blocks:
+            ...         print('Found diamonds near %s' % sub_range.start)
+            ...         break
+
+        Chunks are yielded in Y, X, Z order (Y varying slowest). Against a
+        Raspberry Juice server, each chunk is read with a single
+        ``world.getBlocks`` command (subject to :attr:`fetch_density`);
+        otherwise every block is read with (pipelined)
+        ``world.getBlockWithData`` commands.
+        """
+        if pipeline < 1:
+            raise ValueError('pipeline must be 1 or more')
+        chunk = Vector(*chunk)
+        if not (chunk.x > 0 and chunk.y > 0 and chunk.z > 0):
+            raise ValueError('all elements of chunk must be positive')
+        counts = Vector(*(
+            len(range(
+                getattr(vrange.start, axis),
+                getattr(vrange.stop, axis),
+                getattr(vrange.step, axis)))
+            for axis in 'xyz'))
+        sub_ranges = (
+            vrange[Vector(x, y, z):Vector(x, y, z) + chunk]
+            for y in range(0, counts.y, chunk.y)
+            for x in range(0, counts.x, chunk.x)
+            for z in range(0, counts.z, chunk.z)
+            )
+        group = []
+        for sub_range in sub_ranges:
+            group.append(sub_range)
+            if len(group) == pipeline:
+                for result in self._get_chunks(group):
+                    yield result
+                group = []
+        for result in self._get_chunks(group):
+            yield result
+
+    def _get_chunks(self, sub_ranges):
+        if not sub_ranges:
+            return []
+        with span('blocks.get_chunks') as s:
+            commands = []
+            boxes = [self._get_box(sub_range) for sub_range in sub_ranges]
+            for sub_range, box in zip(sub_ranges, boxes):
+                if box is not None:
+                    commands.append(self._get_blocks_command(box))
+                else:
+                    commands.extend(
+                        'world.getBlockWithData(%d,%d,%d)' % (v.x, v.y, v.z)
+                        for v in sub_range)
+            if s.recording:
+                s.set(chunks=len(sub_ranges), commands=len(commands))
+            replies = iter(self._connection.transact_many(commands))
+            result = []
+            for sub_range, box in zip(sub_ranges, boxes):
+                if box is not None:
+                    blocks = self._select(
+                        sub_range, box, self._parse_blocks(next(replies)))
+                else:
+                    blocks = [
+                        Block.from_string(next(replies))
+                        for v in sub_range
+                        ]
+                result.append((sub_range, blocks))
+            return result
+
     def __getitem__(self, index):
+        with span('blocks.get') as s:
+            result = self._get_item(index)
+            if s.recording:
+                s.set(
+                    count=len(result) if isinstance(result, list) else 1,
+                    server_version=self._connection.server_version)
+            return result
+
+    def _get_item(self, index):
         if isinstance(index, slice):
             index = vector_range(index.start, index.stop, index.step)
         if isinstance(index, vector_range):
@@ -497,17 +666,16 @@ class Blocks(object):
             if not vrange:
                 warnings.warn(EmptySliceWarning(
                     "ignoring empty slice passed to blocks"))
-            elif (
-                    abs(vrange.step) == Vector(1, 1, 1) and
-                    vrange.order == 'zxy' and
-                    self._connection.server_version == 'raspberry-juice'):
-                # Query for a simple unbroken range (getBlocks fast-path)
-                # against a Raspberry Juice server
-                return self._get_blocks(vrange)
             else:
-                # Query for any other type of range (non-unit step, wrong
-                # order, etc.)
-                return self._get_block_loop(vrange)
+                box = self._get_box(vrange)
+                if box is not None:
+                    # Query a Raspberry Juice server for the range, or the box
+                    # enclosing it (getBlocks fast-path)
+                    return self._select(vrange, box, self._get_blocks(box))
+                else:
+                    # Query for any other type of range (Minecraft Pi, or a
+                    # sparse range)
+                    return self._get_block_loop(vrange)
         else:
             try:
                 index.x, index.y, index.z
@@ -523,19 +691,29 @@ class Blocks(object):
 
     def _set_blocks(self, vrange, block):
         assert vrange.step == Vector(1, 1, 1)
-        self._connection.send(
-            'world.setBlocks(%d,%d,%d,%d,%d,%d,%d,%d)' % (
-                vrange.start.x, vrange.start.y, vrange.start.z,
-                vrange.stop.x - 1, vrange.stop.y - 1, vrange.stop.z - 1,
-                block.id, block.data))
+        self._connection.send(_SET_BLOCKS % (
+            vrange.start.x, vrange.start.y, vrange.start.z,
+            vrange.stop.x - 1, vrange.stop.y - 1, vrange.stop.z - 1,
+            block.id, block.data))
 
     def _set_block_loop(self, vrange, blocks):
+        send = self._connection.send
         for v, b in zip(vrange, blocks):
-            self._connection.send(
-                'world.setBlock(%d,%d,%d,%d,%d)' % (
-                    v.x, v.y, v.z, b.id, b.data))
+            send(_SET_BLOCK % (v.x, v.y, v.z, b.id, b.data))
 
     def __setitem__(self, index, value):
+        with span('blocks.set') as s:
+            if s.recording:
+                try:
+                    count = len(index)
+                except TypeError:
+                    count = None
+                s.set(
+                    count=count,
+                    server_version=self._connection.server_version)
+            self._set_item(index, value)
+
+    def _set_item(self, index, value):
         if isinstance(index, slice):
             index = vector_range(index.start, index.stop, index.step)
         if isinstance(index, vector_range):
@@ -572,9 +750,8 @@ class Blocks(object):
                     self._set_block_loop(index, cycle((value,)))
                 else:
                     # A single block for a single vector
-                    self._connection.send(
-                        'world.setBlock(%d,%d,%d,%d,%d)' % (
-                            index.x, index.y, index.z, value.id, value.data))
+                    self._connection.send(_SET_BLOCK % (
+                        index.x, index.y, index.z, value.id, value.data))
 
 
 AIR                 = Block(0)
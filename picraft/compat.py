@@ -204,3 +204,20 @@ if sys.version_info < (3, 3):
             return range(range_start, range_stop, range_step)
 else:
     range = range
+
+
+# Python 2's arrays lack tobytes and frombytes; their equivalents are named
+# tostring and fromstring (which are deprecated in Python 3)
+
+def array_to_bytes(arr):
+    try:
+        return arr.tobytes()
+    except AttributeError:
+        return arr.tostring()
+
+
+def array_from_bytes(arr, data):
+    try:
+        arr.frombytes(data)
+    except AttributeError:
+        arr.fromstring(data)
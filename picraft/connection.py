@@ -45,6 +45,13 @@ Connection
 ==========
 
 .. autoclass:: Connection
+
+
+ConnectionMetrics
+=================
+
+.. autoclass:: ConnectionMetrics
+    :members:
 """
 
 from __future__ import (
@@ -56,11 +63,17 @@ from __future__ import (
 str = type('')
 
 
+import re
+import time
 import socket
 import logging
 import select
 import threading
+from array import array
+from bisect import bisect_left
 
+from .tracing import span
+from .vector import Vector, cuboids
 from .exc import (
         CommandError,
         NoResponse,
@@ -71,6 +84,58 @@ from .exc import (
 
 logger = logging.getLogger('picraft')
 
+# The most precise clock available for timing commands
+_clock = getattr(time, 'perf_counter', time.time)
+
+# The amount of a reply parsed at a time by Connection.transact_array
+_PARSE_SIZE = 65536
+
+
+class _NoLock(object):
+    """
+    A stand-in for a lock which the caller already holds.
+    """
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+_NO_LOCK = _NoLock()
+
+
+class _MeteredLock(object):
+    """
+    Context manager returned by :meth:`Connection._metered` when metrics are
+    being recorded. Acquires *lock*, then records the time spent waiting for
+    it, and the time for which it was held, against the command(s) in *buf*
+    in *metrics*.
+    """
+    def __init__(self, metrics, lock, buf, batch):
+        self._metrics = metrics
+        self._lock = lock
+        self._buf = buf
+        self._batch = batch
+
+    def __enter__(self):
+        start = _clock()
+        self._lock.__enter__()
+        self._locked = _clock()
+        if self._lock is not _NO_LOCK:
+            self._metrics.lock_wait(self._locked - start)
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        elapsed = _clock() - self._locked
+        self._lock.__exit__(exc_type, exc_value, exc_tb)
+        if exc_type is not None and issubclass(exc_type, ConnectionClosed):
+            return
+        if self._batch:
+            self._metrics.batch(
+                [_command_name(line) for line in self._buf.splitlines()],
+                elapsed)
+        else:
+            self._metrics.command(_command_name(self._buf), elapsed)
+
 
 class Connection(object):
     """
@@ -108,12 +173,34 @@ class Connection(object):
 
     .. automethod:: transact
 
+    .. automethod:: transact_many
+
     .. automethod:: batch_start
 
     .. automethod:: batch_send
 
     .. automethod:: batch_forget
 
+    .. automethod:: flush
+
+    .. autoattribute:: auto_batch
+
+    .. attribute:: auto_batch_commands
+
+        The number of commands that may be buffered while :attr:`auto_batch`
+        is ``True`` before they are transmitted. Defaults to 256.
+
+    .. attribute:: auto_batch_bytes
+
+        The number of bytes that may be buffered while :attr:`auto_batch` is
+        ``True`` before they are transmitted. Defaults to 16384.
+
+    .. attribute:: auto_batch_delay
+
+        The longest time in seconds that a command may be buffered while
+        :attr:`auto_batch` is ``True`` before it is transmitted. Defaults to
+        0.01 seconds.
+
     .. attribute:: ignore_errors
 
         If ``False``, use the :attr:`timeout` to determine when responses have
@@ -123,6 +210,25 @@ class Connection(object):
         (this is the behaviour of the mcpi implementation; it is faster but
         less "safe").
 
+        When errors are ignored, any "Fail" responses are discarded just
+        before the next :meth:`transact`, or after every
+        :attr:`drain_interval` commands sent, whichever comes first. The
+        number discarded is counted in :attr:`ignored_errors`.
+
+    .. attribute:: drain_interval
+
+        The number of commands that may be sent when :attr:`ignore_errors` is
+        ``True`` before the connection checks for (and discards) any "Fail"
+        responses. Defaults to 64. Checking requires a system call, so
+        checking less often is faster, but there is little benefit to raising
+        this beyond a few hundred.
+
+    .. attribute:: pipeline_depth
+
+        The maximum number of commands that :meth:`transact_many` transmits
+        before reading their replies. Defaults to 256. Larger values save
+        round-trips, but risk exceeding the server's buffers.
+
     .. attribute:: timeout
 
         The length of time in seconds to wait for a response (positive or
@@ -134,12 +240,24 @@ class Connection(object):
         The encoding that will be used for messages transmitted to, and
         received from the server. Defaults to ``'ascii'``.
 
+    .. attribute:: metrics
+
+        If set to a :class:`ConnectionMetrics` instance, the connection will
+        record the number, latency and size of the commands it transmits into
+        it. Defaults to ``None`` (no metrics are recorded)::
+
+            >>> from picraft import World, ConnectionMetrics
+            >>> w = World()
+            >>> w.connection.metrics = ConnectionMetrics()
+
     .. autoattribute:: server_version
+
+    .. autoattribute:: ignored_errors
     """
 
     def __init__(
             self, host, port, timeout=1.0, ignore_errors=True,
-            encoding='ascii'):
+            encoding='ascii', auto_batch=False):
         self._lock = threading.Lock()
         self._local = threading.local()
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -148,8 +266,20 @@ class Connection(object):
         self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self._socket.connect((host, port))
         self._rfile = self._socket.makefile('rb', -1)
-        self._wfile = self._socket.makefile('wb', 0) # no buffering for writes
         self._directions = {} # temp space for calculated direction
+        self.metrics = None
+        self.drain_interval = 64
+        self.pipeline_depth = 256
+        self._unchecked = [] # commands sent since the last drain
+        self._drained = b'' # incomplete line left by the last drain
+        self._ignored_errors = 0
+        self._auto_batch = False
+        self._pending = bytearray() # commands buffered by auto_batch
+        self._pending_count = 0
+        self._flush_timer = None
+        self.auto_batch_commands = 256
+        self.auto_batch_bytes = 16384
+        self.auto_batch_delay = 0.01
         self.timeout = timeout
         self.encoding = encoding
         # Determine what version of Minecraft we're talking to. Sadly, nobody
@@ -167,6 +297,7 @@ class Connection(object):
             raise CommandError('unexpected response to foo() test: %s' %
                     test_result)
         self.ignore_errors = ignore_errors
+        self.auto_batch = auto_batch
 
     def __repr__(self):
         host, port = self._socket.getpeername()
@@ -182,12 +313,46 @@ class Connection(object):
         """
         return self._server_version
 
+    @property
+    def ignored_errors(self):
+        """
+        Returns the number of "Fail" responses that have been discarded
+        because :attr:`ignore_errors` was ``True``.
+        """
+        return self._ignored_errors
+
+    def _get_auto_batch(self):
+        return self._auto_batch
+    def _set_auto_batch(self, value):
+        with self._lock:
+            self._auto_batch = bool(value)
+            if not self._auto_batch:
+                self._flush()
+    auto_batch = property(_get_auto_batch, _set_auto_batch, doc="""
+        If ``True``, commands sent outside of a batch are buffered and
+        transmitted together. Defaults to ``False``.
+
+        This gives scripts much of the throughput of :meth:`batch_start`
+        without modifying them. The buffer is shared by all threads and is
+        transmitted when it holds :attr:`auto_batch_commands` commands or
+        :attr:`auto_batch_bytes` bytes, when its oldest command is
+        :attr:`auto_batch_delay` seconds old, or when :meth:`flush`,
+        :meth:`transact`, :meth:`batch_send`, or :meth:`close` are called.
+        Hence, commands still reach the server in the order they were sent,
+        and the replies to any "getters" reflect all prior commands.
+
+        Because several commands are transmitted at once, errors are handled
+        as they are by :meth:`batch_send`. Setting this attribute to
+        ``False`` transmits anything that is buffered.
+        """)
+
     def close(self):
         """
         Closes the connection.
 
         This method can be used to close down the connection to the game
-        server. After this method is called, any further requests will raise a
+        server. Anything buffered by :attr:`auto_batch` is transmitted first.
+        After this method is called, any further requests will raise a
         :exc:`~picraft.exc.ConnectionClosed` exception.
         """
         try:
@@ -195,21 +360,49 @@ class Connection(object):
         except BatchNotStarted:
             pass
         with self._lock:
-            if self._rfile:
-                self._rfile.close()
-                self._rfile = None
-            if self._wfile:
-                self._wfile.close()
-                self._wfile = None
-            if self._socket:
-                self._socket.shutdown(socket.SHUT_RDWR)
-                self._socket.close()
-                self._socket = None
+            try:
+                if self._socket:
+                    self._flush()
+            finally:
+                self._close()
+
+    def _close(self):
+        """
+        Closes the socket (and the file used to read from it). Must be called
+        with the connection's lock held.
+        """
+        if self._rfile:
+            self._rfile.close()
+            self._rfile = None
+        if self._socket:
+            self._socket.shutdown(socket.SHUT_RDWR)
+            self._socket.close()
+            self._socket = None
+
+    def _metered(self, buf, batch=False, lock=True):
+        """
+        Returns a context manager which holds the connection's lock (unless
+        *lock* is ``False``, when the caller must already hold it) while the
+        command *buf* is transmitted. If :attr:`metrics` are being recorded,
+        the time spent waiting for the lock, and the time spent within the
+        context, are recorded against the command (or against each of the
+        commands in *buf* as a batch, if *batch* is ``True``).
+
+        Commands are recorded even if they fail, unless the connection was
+        closed (in which case nothing was transmitted).
+        """
+        metrics = self.metrics
+        lock = self._lock if lock else _NO_LOCK
+        if metrics is None:
+            return lock
+        return _MeteredLock(metrics, lock, buf, batch)
 
     def _readable(self, timeout):
         """
         Determines whether the socket is readable within the given timeout.
         """
+        if not self._socket:
+            raise ConnectionClosed('connection closed')
         return bool(select.select([self._socket], [], [], timeout)[0])
 
     def _drain(self):
@@ -217,27 +410,64 @@ class Connection(object):
         Drain all data from the readable end of the socket. This is typically
         used to ensure that any "Fail" messages are removed prior to executing
         something for which we expect a result.
+
+        Any "Fail" messages found are counted in :attr:`ignored_errors`. If
+        :attr:`metrics` are being recorded, the failures are attributed to
+        the commands sent since the last drain when this is unambiguous
+        (i.e. every such command failed).
         """
+        failures = 0
         while True:
             if not self._readable(0):
                 break
-            self._socket.recv(1500)
+            data = self._socket.recv(1500)
+            if not data:
+                break
+            if self.metrics is not None:
+                self.metrics.drained(len(data))
+            # Only count complete lines; a "Fail" may be split between reads
+            lines = (self._drained + data).split(b'\n')
+            self._drained = lines.pop()
+            failures += lines.count(b'Fail')
+        if failures:
+            self._ignored_errors += failures
+            logger.debug('discarded %d Fail responses', failures)
+            if self.metrics is not None:
+                names = [
+                    _command_name(line)
+                    for buf in self._unchecked
+                    for line in buf.splitlines()
+                    ]
+                if failures != len(names):
+                    names = [None] * failures
+                for name in names:
+                    self.metrics.failed(name)
+        del self._unchecked[:]
+
+    def _encode(self, buf):
+        """
+        Returns *buf* as a line-feed terminated byte-string, encoding it with
+        :attr:`encoding` if it is a unicode string.
+        """
+        if isinstance(buf, str):
+            buf = buf.encode(self.encoding)
+        if not buf.endswith(b'\n'):
+            buf += b'\n'
+        return buf
 
     def _send(self, buf):
         """
-        Write *buf* (suitably encoded) to the socket.
+        Write *buf* (which must already be encoded with :meth:`_encode`) to
+        the socket.
         """
         if not self._socket:
             raise ConnectionClosed('connection closed')
-        if not buf.endswith('\n'):
-            buf += '\n'
-        buf = buf.encode(self.encoding)
-        if self.ignore_errors:
-            self._drain()
-        self._wfile.write(buf)
+        self._socket.sendall(buf)
+        if self.metrics is not None:
+            self.metrics.sent(len(buf))
         logger.debug('>: %r', buf)
 
-    def _receive(self, required=False):
+    def _receive(self, required=False, buffered=False):
         """
         Read a line from the socket, and return it (after decoding and
         stripping any trailing newline). If no response is received before
@@ -246,15 +476,21 @@ class Connection(object):
         :attr:`ignore_errors` is ``True``, the method simply returns ``None``.
         Otherwise, a :exc:`~picraft.exc.NoResponse` error is raised.
 
+        If *buffered* is ``True`` the response may already have been read
+        from the socket into the file's buffer, so the socket is not tested
+        for readability; the caller must set a timeout on the socket instead.
+
         If the response received is "Fail", a :exc:`~picraft.exc.CommandError`
         exception is raised (this is case even if :attr:`ignore_errors` is
         ``True`` to maintain compatibility with the reference implementation).
         """
-        if not self._readable(self.timeout):
+        if not buffered and not self._readable(self.timeout):
             if required and not self.ignore_errors:
                 raise NoResponse('no response received')
             return
         result = self._rfile.readline()
+        if self.metrics is not None:
+            self.metrics.received(len(result))
         logger.debug('<: %r', result)
         result = result.decode(self.encoding).rstrip('\n')
         if result == 'Fail':
@@ -270,19 +506,29 @@ class Connection(object):
         Minecraft server. If *buf* is a unicode string, the method attempts
         to encode the content in a byte-encoding prior to transmission (the
         encoding used is the :attr:`encoding` attribute of the class which
-        defaults to "ascii").
+        defaults to "ascii"). If *buf* is already a byte-string it is
+        transmitted as is; this is the fastest option for code sending large
+        numbers of commands.
 
         If a batch has been initiated, the contents of *buf* are appended to
         the batch (batches cannot be nested; see :meth:`batch_start` for more
         information).
         """
+        buf = self._encode(buf)
         try:
-            self._local.batch.append(buf)
+            self._local.batch += buf
         except AttributeError:
-            with self._lock:
+            if self._auto_batch:
+                self._buffer(buf)
+                return
+            with self._metered(buf):
                 self._send(buf)
                 if not self.ignore_errors:
                     self._receive()
+                else:
+                    self._unchecked.append(buf)
+                    if len(self._unchecked) >= self.drain_interval:
+                        self._drain()
 
     def transact(self, buf):
         """
@@ -296,13 +542,239 @@ class Connection(object):
             This method ignores the batch mechanism entirely as transmission
             is required in order to obtain the response. As this method
             is typically used to implement "getters", this is not usually an
-            issue but it is worth bearing in mind.
+            issue but it is worth bearing in mind. Anything buffered by
+            :attr:`auto_batch` is transmitted first.
         """
-        with self._lock:
+        buf = self._encode(buf)
+        with span('connection.transact') as s:
+            if s.recording:
+                s.set(
+                    command=_command_name(buf),
+                    server_version=getattr(self, '_server_version', None))
+            return self._transact(buf)
+
+    def _transact(self, buf):
+        with self._metered(buf):
+            self._flush()
+            if self.ignore_errors:
+                self._drain()
             self._send(buf)
             return self._receive(required=True)
 
-    def batch_start(self):
+    def transact_array(self, buf, typecode='H'):
+        """
+        Transmits the contents of *buf*, and returns the reply (which must be
+        a comma-separated list of integers) as an :class:`array.array` with
+        the specified *typecode*.
+
+        This is equivalent to splitting and converting the result of
+        :meth:`transact`, but the reply is parsed incrementally as it is read
+        from the socket, so a huge reply (such as that of ``world.getBlocks``
+        for a large range) is never held as a string. The resulting array
+        can be wrapped without copying by ``numpy.frombuffer``, if desired.
+        """
+        buf = self._encode(buf)
+        with span('connection.transact_array') as s:
+            if s.recording:
+                s.set(
+                    command=_command_name(buf),
+                    server_version=getattr(self, '_server_version', None))
+            with self._metered(buf):
+                self._flush()
+                if self.ignore_errors:
+                    self._drain()
+                self._send(buf)
+                return self._receive_array(typecode)
+
+    def _receive_array(self, typecode):
+        """
+        Read a comma-separated line of integers from the socket, returning
+        them as an array with the specified *typecode*. Raises
+        :exc:`~picraft.exc.NoResponse` if no response is received before
+        :attr:`timeout` has elapsed, and :exc:`~picraft.exc.CommandError` if
+        the response is "Fail".
+        """
+        result = array(str(typecode))
+        peek = getattr(self._rfile, 'peek', None)
+        if peek is None:
+            # Py2 compat; socket files can't peek so read the whole line
+            line = self._receive(required=True)
+            if line is None:
+                raise NoResponse('no response received')
+            result.extend(int(i) for i in line.split(','))
+            return result
+        if not self._readable(self.timeout):
+            raise NoResponse('no response received')
+        received = 0
+        partial = b''
+        while True:
+            # Only consume up to the end of the reply; anything following it
+            # belongs to the next one
+            data = peek(_PARSE_SIZE)
+            if not data:
+                raise ConnectionClosed('connection closed by server')
+            end = data.find(b'\n')
+            if end >= 0:
+                data = data[:end]
+                self._rfile.read(end + 1)
+            else:
+                self._rfile.read(len(data))
+            received += len(data)
+            values = (partial + data).split(b',')
+            partial = values.pop()
+            result.extend(map(int, values))
+            if end >= 0:
+                if partial == b'Fail' and not result:
+                    raise CommandError('an error occurred')
+                elif partial:
+                    result.append(int(partial))
+                break
+        if self.metrics is not None:
+            self.metrics.received(received + 1)
+        logger.debug('<: %d values', len(result))
+        return result
+
+    def transact_many(self, bufs):
+        """
+        Transmits each of the commands in *bufs*, and returns a list of their
+        reply strings.
+
+        This is equivalent to calling :meth:`transact` for each command, but
+        is much faster over a connection with any latency, as commands are
+        transmitted in groups of up to :attr:`pipeline_depth` before any of
+        their replies are read (a technique known as "pipelining").
+
+        If any command fails, the replies to the remaining commands in its
+        group are still read (so the connection remains usable), then
+        :exc:`~picraft.exc.CommandError` is raised. If the replies stop
+        arriving for longer than :attr:`timeout`, the connection is closed
+        (as any late replies would be mistaken for those of subsequent
+        commands) and :exc:`~picraft.exc.NoResponse` is raised.
+        """
+        bufs = [self._encode(buf) for buf in bufs]
+        if not bufs:
+            return []
+        with span('connection.transact_many') as s:
+            if s.recording:
+                s.set(
+                    commands=len(bufs),
+                    server_version=getattr(self, '_server_version', None))
+            result = []
+            for i in range(0, len(bufs), self.pipeline_depth):
+                result.extend(
+                    self._transact_many(bufs[i:i + self.pipeline_depth]))
+            return result
+
+    def _transact_many(self, bufs):
+        buf = b''.join(bufs)
+        result = []
+        error = None
+        with self._metered(buf, batch=True):
+            self._flush()
+            if self.ignore_errors:
+                self._drain()
+            self._send(buf)
+            # Replies after the first may already be buffered by _rfile, in
+            # which case the socket won't be readable; rely on a socket
+            # timeout to detect missing replies instead (for every reply, as
+            # a missing one must raise even when errors are ignored)
+            self._socket.settimeout(self.timeout)
+            try:
+                for buf in bufs:
+                    try:
+                        result.append(
+                            self._receive(required=True, buffered=True))
+                    except CommandError as e:
+                        if error is None:
+                            error = e
+                        result.append(None)
+            except (socket.timeout, NoResponse):
+                # If one reply doesn't arrive, the rest won't either. The file
+                # can't be read after a timeout, and the missing replies may
+                # yet arrive and be mistaken for the replies to later
+                # commands, so the connection can't be used again
+                self._close()
+                raise NoResponse(
+                    'no response received; the connection has been closed')
+            finally:
+                if self._socket:
+                    self._socket.settimeout(None)
+        if error is not None:
+            raise error
+        return result
+
+    def _buffer(self, buf):
+        """
+        Append *buf* (which must already be encoded with :meth:`_encode`) to
+        the buffer used by :attr:`auto_batch`, transmitting the buffer if it
+        has reached :attr:`auto_batch_commands` or :attr:`auto_batch_bytes`,
+        or starting the timer that transmits it after
+        :attr:`auto_batch_delay` otherwise.
+        """
+        with self._lock:
+            if not self._socket:
+                raise ConnectionClosed('connection closed')
+            self._pending += buf
+            self._pending_count += 1
+            if (
+                    self._pending_count >= self.auto_batch_commands or
+                    len(self._pending) >= self.auto_batch_bytes):
+                self._flush()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(
+                    self.auto_batch_delay, self._flush_later)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _flush_later(self):
+        """
+        Called by the timer started in :meth:`_buffer` to transmit the
+        :attr:`auto_batch` buffer once :attr:`auto_batch_delay` has elapsed.
+        """
+        with self._lock:
+            self._flush_timer = None
+            if self._socket:
+                try:
+                    self._flush()
+                except Exception:
+                    logger.exception('failed to flush buffered commands')
+
+    def _flush(self):
+        """
+        Transmit the content of the :attr:`auto_batch` buffer. Must be called
+        with the connection's lock held.
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        buf = self._pending
+        self._pending = bytearray()
+        self._pending_count = 0
+        with self._metered(buf, batch=True, lock=False):
+            self._send(buf)
+            self._unchecked.append(buf)
+            try:
+                if not self.ignore_errors:
+                    self._receive()
+            finally:
+                self._drain()
+
+    def flush(self):
+        """
+        Transmits any commands buffered by :attr:`auto_batch`.
+
+        This method is called implicitly by :meth:`transact`,
+        :meth:`batch_send`, and :meth:`close`, but may be useful when a
+        script wants commands to take effect immediately without waiting for
+        :attr:`auto_batch_delay` (e.g. before sleeping). If nothing is
+        buffered, this method does nothing.
+        """
+        with self._lock:
+            self._flush()
+
+    def batch_start(self, compact=False):
         """
         Starts a new batch transmission.
 
@@ -310,6 +782,15 @@ class Connection(object):
         subsequent calls to :meth:`send` will append data to the batch buffer
         instead of actually sending the data.
 
+        If *compact* is ``True``, redundant ``world.setBlock`` and
+        ``world.setBlocks`` commands are removed from the batch when it is
+        sent. Only the last block written to each position is kept, and
+        adjacent positions receiving the same block are merged into
+        ``world.setBlocks`` commands. Any other command acts as a barrier:
+        commands are never moved or merged across it. This is useful for
+        scripts (like animations) which re-draw the same blocks many times
+        within a batch.
+
         To terminate the batch transmission, call :meth:`batch_send` or
         :meth:`batch_forget`. If a batch has already been started, a
         :exc:`~picraft.exc.BatchStarted` exception is raised.
@@ -324,7 +805,8 @@ class Connection(object):
         try:
             self._local.batch
         except AttributeError:
-            self._local.batch = []
+            self._local.batch = bytearray()
+            self._local.compact = compact
             return self
         else:
             raise BatchStarted('batch already started')
@@ -345,18 +827,28 @@ class Connection(object):
         except AttributeError:
             raise BatchNotStarted('no batch in progress')
         try:
+            if self._local.batch and self._local.compact:
+                self._local.batch = _compact(self._local.batch)
             if self._local.batch:
-                buf = '\n'.join(self._local.batch)
-                with self._lock:
-                    self._send(buf)
-                    try:
-                        if not self.ignore_errors:
-                            self._receive()
-                    finally:
-                        self._drain()
+                with span('connection.batch_send') as s:
+                    if s.recording:
+                        s.set(commands=self._local.batch.count(b'\n'))
+                    self._batch_send()
         finally:
             del self._local.batch
 
+    def _batch_send(self):
+        buf = self._local.batch
+        with self._metered(buf, batch=True):
+            self._flush()
+            self._send(buf)
+            self._unchecked.append(buf)
+            try:
+                if not self.ignore_errors:
+                    self._receive()
+            finally:
+                self._drain()
+
     def batch_forget(self):
         """
         Terminates a batch transmission without sending anything.
@@ -382,3 +874,388 @@ class Connection(object):
         else:
             self.batch_forget()
 
+
+# Matches the world.setBlock and world.setBlocks commands that _compact
+# understands; anything else is treated as a barrier
+_SET_BLOCKS_RE = re.compile(br'^world\.setBlock(s?)\((-?\d+(?:,-?\d+)*)\)$')
+
+# setBlocks commands at least this large are never broken into individual
+# positions by _compact
+_COMPACT_VOLUME = 4096
+
+
+def _compact(buf):
+    """
+    Returns a copy of the batch *buf* with redundant setBlock and setBlocks
+    commands removed, and adjacent setBlock commands merged into setBlocks.
+    See :meth:`Connection.batch_start` for the rules followed.
+    """
+    result = bytearray()
+    segment = bytearray()
+    boxes = []
+    voxels = {}
+    for line in buf.splitlines():
+        match = _SET_BLOCKS_RE.match(line)
+        if match:
+            args = match.group(2).split(b',')
+            ncoords = 6 if match.group(1) else 3
+            if len(args) - ncoords not in (1, 2):
+                match = None
+        if not match:
+            result += _compact_segment(segment, boxes, voxels)
+            result += line + b'\n'
+            segment = bytearray()
+            boxes = []
+            voxels = {}
+            continue
+        segment += line + b'\n'
+        coords = [int(i) for i in args[:ncoords]]
+        block = b','.join(args[ncoords:])
+        if ncoords == 3:
+            voxels[Vector(*coords)] = block
+            continue
+        lo = Vector(*(min(a, b) for a, b in zip(coords[:3], coords[3:])))
+        hi = Vector(*(max(a, b) for a, b in zip(coords[:3], coords[3:])))
+        size = hi - lo + 1
+        if size.x * size.y * size.z < _COMPACT_VOLUME:
+            for x in range(lo.x, hi.x + 1):
+                for y in range(lo.y, hi.y + 1):
+                    for z in range(lo.z, hi.z + 1):
+                        voxels[Vector(x, y, z)] = block
+        else:
+            # Anything written earlier within the box is superseded by it
+            boxes = [
+                (box_lo, box_hi, box_block)
+                for (box_lo, box_hi, box_block) in boxes
+                if not (
+                    _box_contains(lo, hi, box_lo) and
+                    _box_contains(lo, hi, box_hi))
+                ]
+            for v in [v for v in voxels if _box_contains(lo, hi, v)]:
+                del voxels[v]
+            boxes.append((lo, hi, block))
+    result += _compact_segment(segment, boxes, voxels)
+    return result
+
+
+def _box_contains(lo, hi, v):
+    return (
+        lo.x <= v.x <= hi.x and
+        lo.y <= v.y <= hi.y and
+        lo.z <= v.z <= hi.z)
+
+
+def _compact_segment(segment, boxes, voxels):
+    """
+    Returns the compacted form of *segment*, a run of setBlock and setBlocks
+    commands, given the large *boxes* and individual *voxels* that
+    :func:`_compact` determined it writes. If compaction would make the
+    segment longer, it is returned unchanged.
+    """
+    result = bytearray()
+    for lo, hi, block in boxes:
+        result += b'world.setBlocks(%d,%d,%d,%d,%d,%d,%s)\n' % (
+            lo.x, lo.y, lo.z, hi.x, hi.y, hi.z, block)
+    by_block = {}
+    for v, block in voxels.items():
+        by_block.setdefault(block, []).append(v)
+    for block, points in by_block.items():
+        for box in cuboids(points):
+            if len(box) == 1:
+                result += b'world.setBlock(%d,%d,%d,%s)\n' % (
+                    box.start.x, box.start.y, box.start.z, block)
+            else:
+                hi = box.stop - 1
+                result += b'world.setBlocks(%d,%d,%d,%d,%d,%d,%s)\n' % (
+                    box.start.x, box.start.y, box.start.z,
+                    hi.x, hi.y, hi.z, block)
+    if len(result) > len(segment):
+        return segment
+    return result
+
+
+def _command_name(buf):
+    """
+    Returns the name of the command in the encoded *buf* (e.g.
+    "world.setBlock").
+    """
+    return bytes(buf.split(b'(', 1)[0]).strip().decode('ascii', 'replace')
+
+
+class _Histogram(object):
+    """
+    Accumulates a count, sum, minimum, maximum and bucketed distribution of
+    the values passed to :meth:`add`.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = []
+        for le, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            buckets.append((le, cumulative))
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'buckets': buckets,
+            }
+
+
+class ConnectionMetrics(object):
+    """
+    Records statistics about the traffic passing through a
+    :class:`Connection`.
+
+    Assign an instance of this class to the :attr:`Connection.metrics`
+    attribute to start recording. The following are recorded:
+
+    * The number of each command sent (keyed by command name, e.g.
+      ``'world.setBlock'``), including those sent as part of a batch.
+
+    * A histogram of the latency of each command sent outside a batch. For
+      commands which return a value this is the full round-trip time; for
+      others it is the time taken to transmit the command (plus the time
+      taken to wait for an error when :attr:`~Connection.ignore_errors` is
+      ``False``).
+
+    * The number of bytes sent, received, and discarded while draining the
+      socket of unread replies (typically "Fail" responses which were
+      ignored).
+
+    * The number of "Fail" responses discarded, keyed by the command that
+      failed where this can be determined (or ``None`` where it cannot).
+
+    * A histogram of the time spent waiting to acquire the connection's lock
+      (which will only be significant when several threads share a
+      connection).
+
+    * Histograms of the number of commands in, and the time taken to transmit,
+      each batch.
+
+    The :meth:`snapshot` method returns all these as a :class:`dict`. For
+    example::
+
+        >>> from picraft import World, ConnectionMetrics, Vector, Block
+        >>> w = World()
+        >>> w.connection.metrics = m = ConnectionMetrics()
+        >>> w.blocks[Vector(0, 0, 0)]
+        <Block "air" id=0 data=0>
+        >>> m.snapshot()['commands']['world.getBlockWithData']['count']
+        1
+
+    Histograms are represented as a :class:`dict` with ``count``, ``sum``,
+    ``min``, and ``max`` keys, along with ``buckets`` which is a list of
+    cumulative ``(upper_bound, count)`` tuples in the style of Prometheus.
+    The upper bounds of the time histograms (in seconds) can be customized
+    with the *buckets* parameter, and those of the batch size histogram with
+    *batch_buckets*.
+
+    To feed the measurements into an external system such as `Prometheus`_ or
+    `statsd`_, register a hook with :meth:`add_hook`. Each hook is called with
+    the name of the measurement, the value measured, and (for command
+    measurements) the name of the command::
+
+        import statsd
+
+        client = statsd.StatsClient()
+
+        def hook(metric, value, command=None):
+            if metric == 'command':
+                client.timing(command, value * 1000)
+            elif metric.startswith('bytes_'):
+                client.incr(metric, value)
+
+        m = ConnectionMetrics()
+        m.add_hook(hook)
+        w.connection.metrics = m
+
+    The measurements passed to hooks are:
+
+    ============== ================================== ====================
+    Metric         Value                              Command
+    ============== ================================== ====================
+    command        latency in seconds (or ``None``    command name
+                   for commands sent in a batch)
+    lock_wait      seconds spent waiting for the lock ``None``
+    batch          seconds spent transmitting a batch ``None``
+    batch_size     number of commands in a batch      ``None``
+    bytes_sent     number of bytes sent               ``None``
+    bytes_received number of bytes received           ``None``
+    bytes_drained  number of bytes discarded          ``None``
+    failed         1 (one "Fail" response discarded)  command name or
+                                                      ``None``
+    ============== ================================== ====================
+
+    Hooks are called synchronously from the thread using the connection, so
+    they should be quick.
+
+    .. _Prometheus: https://prometheus.io/
+    .. _statsd: https://github.com/etsy/statsd
+    """
+
+    BUCKETS = (
+        0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+        0.1, 0.25, 0.5, 1.0, 2.5,
+        )
+    BATCH_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+    def __init__(self, buckets=None, batch_buckets=None):
+        self._lock = threading.Lock()
+        self._buckets = tuple(self.BUCKETS if buckets is None else buckets)
+        self._batch_buckets = tuple(
+            self.BATCH_BUCKETS if batch_buckets is None else batch_buckets)
+        self._hooks = []
+        self.reset()
+
+    def reset(self):
+        """
+        Resets all measurements to zero (hooks remain registered).
+        """
+        with self._lock:
+            self._counts = {}
+            self._latency = {}
+            self._lock_wait = _Histogram(self._buckets)
+            self._batch_time = _Histogram(self._buckets)
+            self._batch_size = _Histogram(self._batch_buckets)
+            self._bytes_sent = 0
+            self._bytes_received = 0
+            self._bytes_drained = 0
+            self._failures = {}
+
+    def add_hook(self, hook):
+        """
+        Registers *hook* to be called with each measurement recorded.
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """
+        Unregisters a *hook* previously registered with :meth:`add_hook`.
+        """
+        self._hooks.remove(hook)
+
+    def _notify(self, metric, value, command=None):
+        for hook in self._hooks:
+            hook(metric, value, command)
+
+    def command(self, name, seconds):
+        """
+        Records that the command *name* was sent and took *seconds* to
+        complete.
+        """
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + 1
+            try:
+                self._latency[name].add(seconds)
+            except KeyError:
+                self._latency[name] = h = _Histogram(self._buckets)
+                h.add(seconds)
+        if self._hooks:
+            self._notify('command', seconds, name)
+
+    def batch(self, names, seconds):
+        """
+        Records that a batch consisting of the commands *names* was sent and
+        took *seconds* to transmit.
+        """
+        with self._lock:
+            for name in names:
+                self._counts[name] = self._counts.get(name, 0) + 1
+            self._batch_size.add(len(names))
+            self._batch_time.add(seconds)
+        if self._hooks:
+            for name in names:
+                self._notify('command', None, name)
+            self._notify('batch_size', len(names))
+            self._notify('batch', seconds)
+
+    def lock_wait(self, seconds):
+        """
+        Records that the connection waited *seconds* to acquire its lock.
+        """
+        with self._lock:
+            self._lock_wait.add(seconds)
+        if self._hooks:
+            self._notify('lock_wait', seconds)
+
+    def sent(self, size):
+        """
+        Records that *size* bytes were sent to the server.
+        """
+        with self._lock:
+            self._bytes_sent += size
+        if self._hooks:
+            self._notify('bytes_sent', size)
+
+    def received(self, size):
+        """
+        Records that *size* bytes were received from the server.
+        """
+        with self._lock:
+            self._bytes_received += size
+        if self._hooks:
+            self._notify('bytes_received', size)
+
+    def drained(self, size):
+        """
+        Records that *size* bytes of unread replies were discarded.
+        """
+        with self._lock:
+            self._bytes_drained += size
+        if self._hooks:
+            self._notify('bytes_drained', size)
+
+    def failed(self, name):
+        """
+        Records that a "Fail" response to the command *name* (which may be
+        ``None`` if the command is unknown) was discarded.
+        """
+        with self._lock:
+            self._failures[name] = self._failures.get(name, 0) + 1
+        if self._hooks:
+            self._notify('failed', 1, name)
+
+    def snapshot(self):
+        """
+        Returns a :class:`dict` of all measurements recorded so far. The
+        result is a copy; it will not change as further measurements are
+        made.
+        """
+        with self._lock:
+            return {
+                'commands': {
+                    name: {
+                        'count': count,
+                        'latency': (
+                            self._latency[name].snapshot()
+                            if name in self._latency else None),
+                        }
+                    for name, count in self._counts.items()
+                    },
+                'bytes_sent': self._bytes_sent,
+                'bytes_received': self._bytes_received,
+                'bytes_drained': self._bytes_drained,
+                'failures': dict(self._failures),
+                'lock_wait': self._lock_wait.snapshot(),
+                'batch_size': self._batch_size.snapshot(),
+                'batch_time': self._batch_time.snapshot(),
+                }
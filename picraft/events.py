@@ -89,17 +89,27 @@ import logging
 import threading
 import time
 import warnings
-from collections import namedtuple, Container
+from collections import namedtuple
+try:
+    from collections.abc import Container
+except ImportError:
+    # Py2 compat
+    from collections import Container
 from weakref import WeakSet
 from functools import update_wrapper
 from types import FunctionType
 
 from .exc import ConnectionClosed, NoHandlersWarning
-from .vector import Vector
+from .vector import Vector, vector_range
 from .player import Player
+from .tracing import span
 
 logger = logging.getLogger('picraft')
 
+# A clock which can't go backwards (where available) for scheduling player
+# position queries
+_clock = getattr(time, 'monotonic', time.time)
+
 
 class BlockHitEvent(namedtuple('BlockHitEvent', ('pos', 'face', 'player'))):
     """
@@ -307,6 +317,7 @@ class Events(object):
     def __init__(self, connection, poll_gap=0.1, include_idle=False):
         self._connection = connection
         self._handlers = []
+        self._index = None
         self._handler_instances = WeakSet()
         self._poll_gap = poll_gap
         self._include_idle = include_idle
@@ -333,18 +344,21 @@ class Events(object):
         return self._track_players.keys()
     def _set_track_players(self, value):
         try:
-            self._track_players = {
-                pid: Player(self._connection, pid).pos.round(1)
-                for pid in value
-                }
+            pids = set(value)
         except TypeError:
             if not isinstance(value, int):
                 raise ValueError(
                         'track_players value must be a player id '
                         'or a sequence of player ids')
-            self._track_players = {
-                value: Player(self._connection, value).pos.round(1)
-                }
+            pids = {value}
+        now = _clock()
+        # Players already tracked keep the settings given to track_player
+        self._track_players = {
+            pid: self._track_players.get(pid) or _PlayerTracker()
+            for pid in pids
+            }
+        for pid, tracker in self._track_players.items():
+            tracker.reset(Player(self._connection, pid).pos.round(1), now)
         if self._connection.server_version != 'raspberry-juice':
             # Filter out calculated directions for untracked players
             self._connection._directions = {
@@ -370,8 +384,70 @@ class Events(object):
         track all players you can simply do::
 
             >>> world.events.track_players = world.players
+
+        Players added by this attribute are queried on every :meth:`poll`, and
+        generate an event for any movement. See :meth:`track_player` to reduce
+        the number of queries, or the number of events generated.
         """)
 
+    def track_player(
+            self, player_id, threshold=0.0, interval=0.0, idle_interval=0.0,
+            regions=None):
+        """
+        Start tracking the movement of the player with the specified
+        *player_id*, or change the settings of a player already tracked. The
+        remaining parameters control how often the player's position is
+        queried, and when :class:`PlayerPosEvent` events are generated:
+
+        * *threshold* is the distance (in blocks) that the player must move
+          from the position reported in their last event before another event
+          is generated. The default (0.0) generates an event for any movement.
+
+        * *interval* is the minimum time (in seconds) between queries of the
+          player's position. The default (0.0) queries the position on every
+          :meth:`poll`.
+
+        * *idle_interval*, if greater than *interval*, permits the time
+          between queries to grow while the player is idle. Each time the
+          player is found not to have moved, the time until their next query
+          is doubled (starting from *interval*, or 0.1 seconds if that is
+          smaller) up to this limit. As soon as they move, the time returns to
+          *interval*.
+
+        * *regions*, if specified, is a sequence of regions (like
+          :class:`~picraft.vector.vector_range` instances) to geofence the
+          player with. Events are only generated when the player crosses the
+          boundary of one of the regions (and *threshold* is ignored).
+
+        For example, to watch for dozens of players entering or leaving a
+        building, while querying any idle players at most every two
+        seconds::
+
+            >>> from picraft import *
+            >>> world = World()
+            >>> house = vector_range(Vector(-10, 0, -10), Vector(11, 10, 11))
+            >>> for player_id in world.players:
+            ...     world.events.track_player(player_id, idle_interval=2.0,
+            ...                               regions=[house])
+
+        The player's id is added to :attr:`track_players`, and their current
+        position is queried immediately.
+        """
+        if idle_interval and idle_interval < interval:
+            raise ValueError('idle_interval must not be less than interval')
+        tracker = _PlayerTracker(threshold, interval, idle_interval, regions)
+        tracker.reset(Player(self._connection, player_id).pos.round(1), _clock())
+        self._track_players[player_id] = tracker
+
+    def untrack_player(self, player_id):
+        """
+        Stop tracking the movement of the player with the specified
+        *player_id*. If the player is not being tracked, :exc:`KeyError` is
+        raised.
+        """
+        del self._track_players[player_id]
+        self._connection._directions.pop(player_id, None)
+
     def _get_include_idle(self):
         return self._include_idle
     def _set_include_idle(self, value):
@@ -411,17 +487,20 @@ class Events(object):
             >>> w.events.poll()
             [<IdleEvent>]
         """
-        def player_pos_events(positions):
-            for pid, old_pos in positions.items():
+        def player_pos_events(trackers):
+            now = _clock()
+            for pid, tracker in trackers.items():
+                if now < tracker.due:
+                    continue
                 player = Player(self._connection, pid)
+                old_pos = tracker.pos
                 new_pos = player.pos.round(1)
-                if old_pos != new_pos:
+                if tracker.update(new_pos, now):
                     if self._connection.server_version != 'raspberry-juice':
                         # Calculate directions for tracked players on platforms
                         # which don't provide it natively
                         self._connection._directions[pid] = new_pos - old_pos
                     yield PlayerPosEvent(old_pos, new_pos, player)
-                positions[pid] = new_pos
 
         def block_hit_events():
             s = self._connection.transact('events.block.hits()')
@@ -436,7 +515,9 @@ class Events(object):
                     for e in s.split('|'):
                         yield ChatPostEvent.from_string(self._connection, e)
 
-        events = list(player_pos_events(self._track_players)) + list(block_hit_events()) + list(chat_post_events())
+        with span('events.poll') as s:
+            events = list(player_pos_events(self._track_players)) + list(block_hit_events()) + list(chat_post_events())
+            s.set(events=len(events))
 
         if events:
             return events
@@ -476,10 +557,18 @@ class Events(object):
         non-threaded) event handler is engaged in a long operation and they
         wish to permit events to be processed in the meantime.
         """
-        for event in self.poll():
-            for handler in self._handlers:
-                if handler.matches(event):
-                    handler.execute(event)
+        with span('events.process') as s:
+            events = self.poll()
+            s.set(events=len(events))
+            if events:
+                # Handlers can only be added (by the decorators below), so a
+                # change in their number is sufficient to detect staleness
+                if self._index is None or len(self._index) != len(self._handlers):
+                    self._index = _HandlerIndex(self._handlers)
+                for event in events:
+                    for handler in self._index.candidates(event):
+                        if handler.matches(event):
+                            handler.execute(event)
 
     def has_handlers(self, cls):
         """
@@ -634,6 +723,11 @@ class Events(object):
 
             world.events.main_loop()
 
+        As with :meth:`on_block_hit`, handlers with a
+        :class:`~picraft.vector.Vector`, :class:`~picraft.vector.vector_range`,
+        :class:`tuple` or :class:`frozenset` position are indexed for quick
+        dispatch.
+
         Various effects can be achieved by combining *old_pos* and *new_pos*
         filters. For example, one could detect when a player crosses a boundary
         in a particular direction, or decide when a player enters or leaves a
@@ -662,7 +756,12 @@ class Events(object):
         The *pos* parameter can be used to specify a vector or sequence of
         vectors (including a :class:`~picraft.vector.vector_range`); in this
         case the event handler will only be called for block hits on matching
-        vectors.
+        vectors. Handlers with a :class:`~picraft.vector.Vector`,
+        :class:`~picraft.vector.vector_range`, :class:`tuple` or
+        :class:`frozenset` position are indexed so that events are only
+        tested against the handlers they might match; this keeps dispatch
+        quick even with thousands of handlers. Mutable sequences (like
+        :class:`list`) are tested against every event.
 
         The *face* parameter can be used to specify a face or sequence of
         faces for which the handler will be called.
@@ -706,7 +805,7 @@ class Events(object):
         return decorator
 
     def on_chat_post(self, thread=False, multi=True, message=None):
-        """
+        r"""
         Decorator for registering a function/method as a chat event handler.
 
         This decorator is used to mark a function as an event handler which
@@ -934,3 +1033,188 @@ class IdleHandler(EventHandler):
 
     def matches(self, event):
         return isinstance(event, IdleEvent)
+
+
+class _PlayerTracker(object):
+    """
+    Holds the settings and state used by :meth:`Events.poll` to track the
+    movement of a single player; see :meth:`Events.track_player` for the
+    meaning of the parameters.
+    """
+
+    # The time between position queries of idle players starts from at least
+    # this value before doubling
+    min_idle_gap = 0.1
+
+    def __init__(
+            self, threshold=0.0, interval=0.0, idle_interval=0.0,
+            regions=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.regions = None if regions is None else tuple(regions)
+
+    def reset(self, pos, now):
+        """
+        Forget the player's history; *pos* is their current position at time
+        *now*.
+        """
+        self.pos = self.seen = pos
+        self.inside = self._inside(pos)
+        self.gap = self.interval
+        self.due = now + self.gap
+
+    def _inside(self, pos):
+        if self.regions is None:
+            return None
+        pos = pos.floor()
+        return tuple(pos in region for region in self.regions)
+
+    def update(self, pos, now):
+        """
+        Record that the player was at *pos* at time *now*, scheduling their
+        next query. Returns ``True`` if an event should be generated, in which
+        case *pos* becomes the position last reported.
+        """
+        if self.regions is None:
+            report = pos != self.pos and (
+                not self.threshold or
+                pos.distance_to(self.pos) >= self.threshold)
+        else:
+            inside = self._inside(pos)
+            report = inside != self.inside
+            self.inside = inside
+        if pos != self.seen:
+            self.gap = self.interval
+        elif self.idle_interval > self.interval:
+            self.gap = min(
+                self.idle_interval, max(self.gap * 2, self.min_idle_gap))
+        self.seen = pos
+        self.due = now + self.gap
+        if report:
+            self.pos = pos
+        return report
+
+
+class _PosIndex(object):
+    """
+    Indexes the position filters of event handlers so that the handlers whose
+    filter might contain a given position can be found quickly.
+
+    Handlers are identified by their registration order. Filters which are a
+    single :class:`~picraft.vector.Vector`, or an immutable collection of them
+    (a :class:`tuple` or :class:`frozenset`) are stored in a hash map by
+    exact position. Filters which are a
+    :class:`~picraft.vector.vector_range` are stored in every grid bucket
+    (of size :attr:`bucket_size`) their bounds overlap, unless that would
+    take more than :attr:`max_buckets` buckets in which case, like any other
+    filter, they are returned for every position. Candidates must still be
+    tested with the handler's ``matches`` method.
+    """
+
+    bucket_size = 16
+    max_buckets = 4096
+
+    def __init__(self):
+        self._exact = {}
+        self._buckets = {}
+        self._any = []
+
+    def add(self, order, test):
+        """
+        Add the handler at position *order* with the position filter *test*.
+        Returns ``False`` if *test* is ``None`` (and thus matches every
+        position); the handler is not added in this case.
+        """
+        if test is None:
+            return False
+        if isinstance(test, Vector):
+            self._exact.setdefault(test, []).append(order)
+        elif isinstance(test, vector_range):
+            if test:
+                lo, hi = (
+                    Vector(*bounds) // self.bucket_size
+                    for bounds in zip(*(
+                        (min(r[0], r[-1]), max(r[0], r[-1]))
+                        for r in (test._xrange, test._yrange, test._zrange)
+                        ))
+                    )
+                size = hi - lo + 1
+                if size.x * size.y * size.z > self.max_buckets:
+                    self._any.append(order)
+                else:
+                    for bucket in vector_range(lo, hi + 1):
+                        self._buckets.setdefault(bucket, []).append(order)
+        elif isinstance(test, (tuple, frozenset)) and all(
+                isinstance(v, Vector) for v in test):
+            for v in set(test):
+                self._exact.setdefault(v, []).append(order)
+        else:
+            self._any.append(order)
+        return True
+
+    def candidates(self, pos):
+        """
+        Returns a list of the orders of the handlers which might match *pos*.
+        """
+        return (
+            self._exact.get(pos, []) +
+            self._buckets.get(pos // self.bucket_size, []) +
+            self._any)
+
+
+class _HandlerIndex(object):
+    """
+    An index of the *handlers* registered with :class:`Events`, used by
+    :meth:`Events.process` to find the handlers that might match each event
+    without testing every handler.
+
+    Block hit handlers are indexed by position (see :class:`_PosIndex`), or by
+    face if they match any position. Player position handlers are indexed by
+    new position, or by old position if they match any new position. All
+    other handlers are tested against every event.
+    """
+
+    def __init__(self, handlers):
+        self._handlers = list(handlers)
+        self._block_pos = _PosIndex()
+        self._block_faces = {}
+        self._new_pos = _PosIndex()
+        self._old_pos = _PosIndex()
+        self._rest = []
+        for order, handler in enumerate(self._handlers):
+            if isinstance(handler, BlockHitHandler):
+                if not self._block_pos.add(order, handler.pos):
+                    if isinstance(handler.face, str):
+                        self._block_faces.setdefault(
+                            handler.face, []).append(order)
+                    else:
+                        self._rest.append(order)
+            elif isinstance(handler, PlayerPosHandler):
+                if not (
+                        self._new_pos.add(order, handler.new_pos) or
+                        self._old_pos.add(order, handler.old_pos)):
+                    self._rest.append(order)
+            else:
+                self._rest.append(order)
+
+    def __len__(self):
+        return len(self._handlers)
+
+    def candidates(self, event):
+        """
+        Yields the handlers which might match *event* in the order they were
+        registered.
+        """
+        if isinstance(event, BlockHitEvent):
+            orders = (
+                self._block_pos.candidates(event.pos) +
+                self._block_faces.get(event.face, []))
+        elif isinstance(event, PlayerPosEvent):
+            orders = (
+                self._new_pos.candidates(event.new_pos.floor()) +
+                self._old_pos.candidates(event.old_pos.floor()))
+        else:
+            orders = []
+        for order in sorted(set(orders + self._rest)):
+            yield self._handlers[order]
@@ -66,12 +66,21 @@ str = type('')
 
 
 import io
+import os
+import sys
+import json
+import math
+import mmap
+import struct
+import hashlib
 import warnings
+from array import array
 from collections import namedtuple, defaultdict
 from itertools import chain
 
 from .vector import Vector, vector_range, filled, lines
 from .block import Block
+from .tracing import span
 from .exc import (
     UnsupportedCommand,
     NegativeWeight,
@@ -400,6 +409,11 @@ class ModelFace(object):
         self._vectors = tuple(vectors)
         self._groups = frozenset(groups)
         self._material = material
+        xs, ys, zs = zip(*self._vectors)
+        self._extents = (
+            Vector(min(xs), min(ys), min(zs)),
+            Vector(max(xs), max(ys), max(zs)),
+            )
 
     @property
     def material(self):
@@ -434,6 +448,14 @@ class ModelFace(object):
         """
         return self._vectors
 
+    @property
+    def bounds(self):
+        """
+        Returns a vector range which completely encompasses the face at scale
+        1.0 (see :attr:`Model.bounds`).
+        """
+        return _extents_range(self._extents)
+
     def __repr__(self):
         return '<ModelFace %d points, material="%s", groups=%s>' % (
                 len(self._vectors), self._material,
@@ -462,15 +484,33 @@ class Model(object):
     in the Minecraft world at the specified scale, and with a given material
     mapping.
 
+    Parsing large object files can take a while. If the optional *cache*
+    parameter is specified, it must be the filename of a binary cache (see
+    :meth:`save_cache`) and *source* must be a filename. If the cache exists,
+    and was written from a source with the same modification time and content
+    (and the same *swap_yz* setting), it will be loaded instead of parsing the
+    source. Otherwise, the source is parsed and the cache is (re)written::
+
+        >>> m = Model('airboat.obj', cache='airboat.cache')
+
     .. _object file: https://en.wikipedia.org/wiki/Wavefront_.obj_file
     """
 
-    def __init__(self, source, swap_yz=False):
-        self._faces = []
-        self._materials = set()
-        self._groups = defaultdict(list)
-        self._swap_yz = swap_yz
-        self._parse(source)
+    def __init__(self, source, swap_yz=False, cache=None):
+        self._init(swap_yz)
+        if cache is None:
+            self._parse(source)
+        else:
+            if isinstance(source, bytes):
+                source = source.decode('utf-8')
+            if not isinstance(source, str):
+                raise ValueError('cache can only be used with a source filename')
+            stamp = _source_stamp(source)
+            if _cache_matches(cache, stamp, swap_yz):
+                self._load(cache)
+            else:
+                self._parse(source)
+                self._save(cache, stamp)
 
     def _parse(self, source):
         vertexes = []
@@ -504,6 +544,137 @@ class Model(object):
                 for group in active_groups:
                     self._groups[group].append(face)
 
+    @classmethod
+    def load(cls, filename):
+        """
+        Construct a :class:`Model` from a binary cache previously written by
+        :meth:`save_cache`. The original source file is not required::
+
+            >>> m = Model('airboat.obj')
+            >>> m.save_cache('airboat.cache')
+            >>> m = Model.load('airboat.cache')
+        """
+        self = cls.__new__(cls)
+        self._init(False)
+        self._load(filename)
+        return self
+
+    def _init(self, swap_yz):
+        self._faces = []
+        self._materials = set()
+        self._groups = defaultdict(list)
+        self._swap_yz = swap_yz
+        # Derived information, calculated (once) on demand
+        self._extents = None
+        self._group_extents = None
+        self._vertex_count = None
+        self._index = None
+
+    def save_cache(self, filename):
+        """
+        Write the model to *filename* in a compact binary format which can be
+        loaded by :meth:`load` considerably faster than the source can be
+        parsed. Vertex coordinates are stored as double-precision floats (so a
+        loaded model renders exactly as the parsed one did), face vertexes as
+        indexes into the (de-duplicated) vertex table, and materials and groups
+        as indexes into string tables.
+        """
+        self._save(filename, (0.0, b'\0' * 20))
+
+    def _save(self, filename, stamp):
+        mtime, digest = stamp
+        vertex_index = {}
+        coords = array(str('d'))
+        offsets = array(str('I'), [0])
+        indexes = array(str('I'))
+        face_materials = array(str('i'))
+        face_groups = array(str('I'))
+        materials = {}
+        group_sets = {}
+        for face in self._faces:
+            for v in face.vectors:
+                try:
+                    indexes.append(vertex_index[v])
+                except KeyError:
+                    indexes.append(len(vertex_index))
+                    vertex_index[v] = len(vertex_index)
+                    coords.extend(v)
+            offsets.append(len(indexes))
+            if face.material is None:
+                face_materials.append(-1)
+            else:
+                face_materials.append(
+                    materials.setdefault(face.material, len(materials)))
+            face_groups.append(
+                group_sets.setdefault(face.groups, len(group_sets)))
+        tables = json.dumps({
+            'materials': sorted(materials, key=materials.get),
+            'groups': [
+                sorted(g) for g in sorted(group_sets, key=group_sets.get)],
+            'none': None in self._materials,
+            }).encode('utf-8')
+        sections = [coords, offsets, indexes, face_materials, face_groups]
+        if sys.byteorder != 'little':
+            for section in sections:
+                section.byteswap()
+        with io.open(filename, 'wb') as f:
+            f.write(_CACHE_HEADER.pack(
+                _CACHE_MAGIC, _CACHE_VERSION, bool(self._swap_yz), mtime,
+                digest, len(vertex_index), len(self._faces), len(indexes),
+                len(tables)))
+            for section in sections:
+                section.tofile(f)
+            f.write(tables)
+
+    def _load(self, filename):
+        with io.open(filename, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            try:
+                (
+                    magic, version, swap_yz, mtime, digest, vertex_count,
+                    face_count, index_count, tables_size,
+                ) = _CACHE_HEADER.unpack_from(buf, 0)
+            except struct.error:
+                magic = version = None
+            if magic != _CACHE_MAGIC or version != _CACHE_VERSION:
+                raise ValueError('%s is not a model cache' % filename)
+            offset = _CACHE_HEADER.size
+            sections = []
+            for typecode, count in (
+                    ('d', vertex_count * 3),
+                    ('I', face_count + 1),
+                    ('I', index_count),
+                    ('i', face_count),
+                    ('I', face_count),
+                    ):
+                sections.append(_read_section(buf, offset, typecode, count))
+                offset += _section_size(typecode, count)
+            tables = json.loads(
+                buf[offset:offset + tables_size].decode('utf-8'))
+        finally:
+            buf.close()
+        coords, offsets, indexes, face_materials, face_groups = sections
+        vertexes = [
+            Vector(*coords[i:i + 3])
+            for i in range(0, len(coords), 3)
+            ]
+        materials = [Material(m) for m in tables['materials']]
+        group_sets = [frozenset(g) for g in tables['groups']]
+        self._swap_yz = bool(swap_yz)
+        self._materials = set(materials)
+        if tables['none']:
+            self._materials.add(None)
+        for i in range(face_count):
+            m = face_materials[i]
+            face = ModelFace(
+                [vertexes[v] for v in indexes[offsets[i]:offsets[i + 1]]],
+                None if m < 0 else materials[m],
+                group_sets[face_groups[i]])
+            self._faces.append(face)
+            for group in face.groups:
+                self._groups[group].append(face)
+
     @property
     def faces(self):
         """
@@ -543,19 +714,56 @@ class Model(object):
 
         .. _axis-aligned: https://en.wikipedia.org/wiki/Minimum_bounding_box#Axis-aligned_minimum_bounding_box
         """
-        min_v = Vector(
-            min(v.x for f in self.faces for v in f.vectors),
-            min(v.y for f in self.faces for v in f.vectors),
-            min(v.z for f in self.faces for v in f.vectors),
-            ).floor()
-        max_v = Vector(
-            max(v.x for f in self.faces for v in f.vectors),
-            max(v.y for f in self.faces for v in f.vectors),
-            max(v.z for f in self.faces for v in f.vectors),
-            ).floor()
-        return vector_range(min_v, max_v + 1)
+        if self._extents is None:
+            self._extents = _merge_extents(f._extents for f in self._faces)
+        return _extents_range(self._extents)
 
-    def render(self, scale=1.0, materials=None, groups=None):
+    @property
+    def group_bounds(self):
+        """
+        A mapping of group names to vector ranges which completely encompass
+        the faces of each group at scale 1.0 (see :attr:`bounds`).
+        """
+        if self._group_extents is None:
+            self._group_extents = {
+                group: _merge_extents(f._extents for f in faces)
+                for group, faces in self._groups.items()
+                }
+        return {
+            group: _extents_range(extents)
+            for group, extents in self._group_extents.items()
+            }
+
+    @property
+    def face_count(self):
+        """
+        Returns the number of faces in the model.
+        """
+        return len(self._faces)
+
+    @property
+    def vertex_count(self):
+        """
+        Returns the number of distinct vertexes used by the faces of the
+        model.
+        """
+        if self._vertex_count is None:
+            self._vertex_count = len({
+                v for f in self._faces for v in f.vectors})
+        return self._vertex_count
+
+    def _faces_within(self, lo, hi):
+        """
+        Returns the faces whose extents intersect the (unscaled, inclusive)
+        box from *lo* to *hi*, in the order they appear in the model.
+        """
+        if self._index is None:
+            self._index = _FaceIndex(self._faces)
+        return [self._faces[i] for i in self._index.query(lo, hi)]
+
+    def render(
+            self, scale=1.0, materials=None, groups=None, workers=None,
+            engine='filled', solid=False, region=None, lod=False):
         """
         Renders the model as a :class:`dict` mapping vectors to block types.
         Effectively this rounds the vertices of each face to integers (after
@@ -655,10 +863,92 @@ class Model(object):
         names to block types, this enables another means of constructing
         objects in the Minecraft world. For example, see :ref:`models`.
 
+        Finally, the *workers* parameter can be used to spread the work of
+        rendering large models across several processes. If *workers* is
+        ``None`` (the default) or 1, all faces are rendered in the calling
+        process. Otherwise, faces are partitioned between a pool of *workers*
+        processes; the result is identical to the serial result (where faces
+        overlap, the face that appears later in the model still takes
+        precedence)::
+
+            from picraft import Model
+
+            m = Model('airboat.obj').render(scale=10.0, workers=4)
+
+        .. note::
+
+            Only the vertex positions of each face are sent to the worker
+            processes; *materials* is always evaluated in the calling process
+            so it may be an arbitrary callable (including a lambda).
+
+        The *engine* parameter selects the algorithm used to calculate the
+        coordinates covered by each face. The default, ``'filled'``, is the
+        rounding method described above; this is quick for small faces but can
+        leave holes in thin or oblique triangles. The alternative, ``'sat'``,
+        splits each face into triangles and includes every block that the
+        (unrounded) triangle touches, determined by a `separating axis`_ test
+        within the triangle's bounding box. This produces a watertight surface
+        at the cost of slightly "thicker" rendering::
+
+            from picraft import Model
+
+            m = Model('airboat.obj').render(scale=4.0, engine='sat')
+
+        Finally, if *solid* is ``True``, the interior of the model is filled
+        in addition to its surface. The interior is determined by casting a ray
+        up the Y axis through each column of blocks and counting how many faces
+        it crosses (even-odd parity), so the model should be closed for this to
+        produce sensible results. Interior blocks take the type of the face
+        through which the ray entered the model.
+
+        If *region* is specified, it must be a
+        :class:`~picraft.vector.vector_range` (in the coordinates of the
+        rendered result, i.e. after scaling). Only faces which intersect the
+        region are rendered, and only blocks within the region are included in
+        the result. This is useful for rendering very large models in tiles::
+
+            from picraft import Model, Vector, vector_range
+
+            m = Model('city.obj')
+            tile = m.render(scale=4.0, region=vector_range(
+                Vector(0, -100, 0), Vector(64, 100, 64)))
+
+        When rendering a detailed model at a small scale, many faces collapse
+        into the same handful of blocks. If *lod* is ``True``, the model is
+        simplified by `vertex clustering`_ before rendering: every vertex is
+        snapped to the block grid, faces which then duplicate a later face are
+        discarded, and faces which collapse to a single point or line are
+        drawn directly (and only where no other face has already placed a
+        block). The result is an approximation intended for quick previews::
+
+            from picraft import Model
+
+            preview = Model('city.obj').render(scale=0.5, lod=True)
+
+        .. _separating axis: https://en.wikipedia.org/wiki/Hyperplane_separation_theorem
+
+        .. _vertex clustering: https://en.wikipedia.org/wiki/Polygon_mesh#Simplification
+
         .. _object file: https://en.wikipedia.org/wiki/Wavefront_.obj_file
         """
+        with span('model.render', engine=engine, workers=workers) as trace:
+            result = self._render(
+                trace, scale, materials, groups, workers, engine, solid,
+                region, lod)
+            trace.set(voxels=len(result))
+        return result
+
+    def _render(
+            self, trace, scale, materials, groups, workers, engine, solid,
+            region, lod):
         if materials is None:
-            materials = lambda f: Block(f.material)
+            blocks = {}
+            def materials(face):
+                try:
+                    return blocks[face.material]
+                except KeyError:
+                    b = blocks[face.material] = Block(face.material)
+                    return b
         if isinstance(groups, bytes):
             groups = groups.decode('utf-8')
         if groups is None:
@@ -667,7 +957,34 @@ class Model(object):
             faces = self.groups[groups]
         else:
             faces = chain(*(self.groups[g] for g in groups))
-        result = {}
+        if region is not None:
+            if not region:
+                return {}
+            region_lo, region_hi = _range_extents(region)
+            # Blocks rendered for a face never lie more than half a block
+            # outside its scaled extents, so convert the region (enlarged
+            # by that much) back to the model's unscaled coordinates
+            lo, hi = zip(*(
+                sorted((l / scale, h / scale))
+                for l, h in zip(region_lo - 0.5, region_hi + 0.5)
+                ))
+            if solid:
+                # Parity fill needs every face above and below the region
+                lo = (lo[0], float('-inf'), lo[2])
+                hi = (hi[0], float('inf'), hi[2])
+            within = set(self._faces_within(lo, hi))
+            faces = [f for f in faces if f in within]
+        try:
+            render_face = {
+                'filled': _render_face,
+                'sat':    _render_face_sat,
+                }[engine]
+        except KeyError:
+            raise ValueError('invalid engine: %s' % engine)
+        jobs = []
+        # Vertex clustering for lod: each distinct vertex is snapped to the
+        # block grid once, no matter how many faces share it
+        snapped = {}
         for face in faces:
             try:
                 b = materials[face.material]
@@ -676,8 +993,405 @@ class Model(object):
             except TypeError:
                 b = materials(face)
             if b is not None:
-                points = ((p * scale).round() for p in face.vectors)
-                for v in filled(lines(points)):
-                    result[v] = b
+                if lod:
+                    points = []
+                    for p in face.vectors:
+                        try:
+                            points.append(snapped[p])
+                        except KeyError:
+                            q = snapped[p] = (p * scale).round()
+                            points.append(q)
+                    jobs.append((b, points))
+                elif engine == 'filled':
+                    jobs.append((b, [(p * scale).round() for p in face.vectors]))
+                else:
+                    jobs.append((b, [p * scale for p in face.vectors]))
+        if lod:
+            jobs, degenerate = _decimate(jobs)
+        trace.set(faces=len(jobs))
+        if workers is None or workers <= 1 or len(jobs) < 2:
+            rendered = (render_face(points) for b, points in jobs)
+        else:
+            rendered = _render_faces_parallel(
+                render_face, [points for b, points in jobs], workers)
+        result = {}
+        for (b, points), face_vectors in zip(jobs, rendered):
+            for v in face_vectors:
+                result[v] = b
+        if lod:
+            for b, face_vectors in degenerate:
+                for v in face_vectors:
+                    result.setdefault(v, b)
+        if solid:
+            for v, b in _render_interior(jobs):
+                result.setdefault(v, b)
+        if region is not None:
+            unit_step = abs(region.step) == Vector(1, 1, 1)
+            result = {
+                v: b for v, b in result.items()
+                if region_lo.x <= v.x <= region_hi.x
+                and region_lo.y <= v.y <= region_hi.y
+                and region_lo.z <= v.z <= region_hi.z
+                and (unit_step or v in region)
+                }
         return result
 
+
+def _merge_extents(extents):
+    """
+    Returns the (min, max) vectors of the box enclosing all the (min, max)
+    pairs in *extents*.
+    """
+    los, his = zip(*extents)
+    return (
+        Vector(*(min(i) for i in zip(*los))),
+        Vector(*(max(i) for i in zip(*his))),
+        )
+
+
+def _extents_range(extents):
+    """
+    Converts the (min, max) vectors in *extents* to a vector range that
+    includes every block they touch.
+    """
+    lo, hi = extents
+    return vector_range(lo.floor(), hi.floor() + 1)
+
+
+def _range_extents(vrange):
+    """
+    Returns the (min, max) vectors of the box enclosing the (non-empty) vector
+    range *vrange*.
+    """
+    first, last = vrange[0], vrange[-1]
+    return (
+        Vector(*(min(a, b) for a, b in zip(first, last))),
+        Vector(*(max(a, b) for a, b in zip(first, last))),
+        )
+
+
+class _FaceIndex(object):
+    """
+    A simple spatial index of *faces* by their extents. Space is divided into a
+    uniform grid of cells (sized so the model's bounding box spans roughly
+    :attr:`GRID` cells along its longest axis), and each face is listed under
+    every cell its extents touch. Faces spanning a large number of cells are
+    kept in a separate list which is always checked.
+    """
+
+    GRID = 32
+    MAX_CELLS = 64
+
+    def __init__(self, faces):
+        self._faces = faces
+        self._cells = defaultdict(list)
+        self._large = []
+        if faces:
+            lo, hi = _merge_extents(f._extents for f in faces)
+            self._size = max(max(hi - lo) / self.GRID, 1e-9)
+        else:
+            self._size = 1.0
+        for i, face in enumerate(faces):
+            cells = self._cell_range(*face._extents)
+            if len(cells) > self.MAX_CELLS:
+                self._large.append(i)
+            else:
+                for cell in cells:
+                    self._cells[cell].append(i)
+
+    def _cell_range(self, lo, hi):
+        return vector_range(
+            Vector(*(int(math.floor(i / self._size)) for i in lo)),
+            Vector(*(int(math.floor(i / self._size)) + 1 for i in hi)))
+
+    def query(self, lo, hi):
+        """
+        Returns a sorted list of the indexes of faces whose extents intersect
+        the inclusive box from *lo* to *hi* (tuples of three floats, which may
+        be infinite).
+        """
+        candidates = set(self._large)
+        if self._cells:
+            # Clamp the query to the occupied cells (this also deals with
+            # infinite bounds)
+            occupied = list(zip(*self._cells))
+            start = [
+                max(min(axis), int(math.floor(max(l, -1e18) / self._size)))
+                for axis, l in zip(occupied, lo)
+                ]
+            stop = [
+                min(max(axis), int(math.floor(min(h, 1e18) / self._size))) + 1
+                for axis, h in zip(occupied, hi)
+                ]
+            if all(a < b for a, b in zip(start, stop)):
+                volume = (
+                    (stop[0] - start[0]) *
+                    (stop[1] - start[1]) *
+                    (stop[2] - start[2]))
+                if volume <= len(self._cells):
+                    for cell in vector_range(Vector(*start), Vector(*stop)):
+                        candidates.update(self._cells.get(cell, ()))
+                else:
+                    for cell, faces in self._cells.items():
+                        if all(a <= c < b for a, c, b in zip(start, cell, stop)):
+                            candidates.update(faces)
+        return sorted(
+            i for i in candidates
+            if all(
+                f_lo <= h and f_hi >= l
+                for f_lo, f_hi, l, h in zip(
+                    self._faces[i]._extents[0], self._faces[i]._extents[1],
+                    lo, hi))
+            )
+
+
+_CACHE_MAGIC = b'PICRAFTM'
+_CACHE_VERSION = 2
+# magic, version, swap_yz, source mtime, source SHA1, vertex count, face count,
+# face-vertex index count, string tables size
+_CACHE_HEADER = struct.Struct(str('<8sHHd20sIIII'))
+
+
+def _section_size(typecode, count):
+    """
+    Returns the size in bytes of *count* values of type *typecode* in a model
+    cache.
+    """
+    return struct.calcsize(str('<%d%s' % (count, typecode)))
+
+
+def _read_section(buf, offset, typecode, count):
+    """
+    Returns a list of *count* values of type *typecode* from the
+    (little-endian) buffer *buf* at *offset*.
+    """
+    data = memoryview(buf)[offset:offset + _section_size(typecode, count)]
+    try:
+        if sys.byteorder == 'little':
+            with data.cast(str(typecode)) as values:
+                return values.tolist()
+        else:
+            values = array(str(typecode), data.tobytes())
+            values.byteswap()
+            return values.tolist()
+    finally:
+        data.release()
+
+
+def _source_stamp(filename):
+    """
+    Returns a (modification time, SHA1 digest) tuple for *filename*, used to
+    determine whether a model cache is still valid for its source.
+    """
+    digest = hashlib.sha1()
+    with io.open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return os.stat(filename).st_mtime, digest.digest()
+
+
+def _cache_matches(filename, stamp, swap_yz):
+    """
+    Returns ``True`` if the model cache *filename* exists and was produced from
+    a source with the same *stamp* (see :func:`_source_stamp`) and *swap_yz*
+    setting.
+    """
+    try:
+        with io.open(filename, 'rb') as f:
+            header = f.read(_CACHE_HEADER.size)
+        (
+            magic, version, cache_swap_yz, mtime, digest, vertex_count,
+            face_count, index_count, tables_size,
+        ) = _CACHE_HEADER.unpack(header)
+    except (IOError, OSError, struct.error):
+        return False
+    return (
+        magic == _CACHE_MAGIC and
+        version == _CACHE_VERSION and
+        bool(cache_swap_yz) == bool(swap_yz) and
+        (mtime, digest) == stamp
+        )
+
+
+def _decimate(jobs):
+    """
+    Simplifies the list of (block, points) *jobs*, whose points have already
+    been snapped to the block grid, by removing repeated points within each
+    face. Where several faces then have the same block and the same set of
+    points only the last is kept (it would overwrite the others anyway).
+
+    Returns a tuple of the remaining (block, points) jobs with at least three
+    distinct points, and a list of (block, vectors) pairs for the faces that
+    degenerated to a point or a line, which are cheap to calculate directly.
+    """
+    last = {}
+    for i, (b, points) in enumerate(jobs):
+        clustered = []
+        for p in points:
+            if p not in clustered:
+                clustered.append(p)
+        last[(b, frozenset(clustered))] = (i, clustered)
+    faces = []
+    degenerate = []
+    for i, clustered in sorted(last.values()):
+        b = jobs[i][0]
+        if len(clustered) > 2:
+            faces.append((b, clustered))
+        elif len(clustered) == 2:
+            degenerate.append((b, lines(clustered, closed=False)))
+        else:
+            degenerate.append((b, clustered))
+    return faces, degenerate
+
+
+def _render_face(points):
+    """
+    Returns a tuple of all coordinates covered by the face with the specified
+    (already scaled and rounded) *points*. This is a module-level function so
+    that it can be pickled for use by worker processes.
+    """
+    return tuple(filled(lines(points)))
+
+
+def _render_face_sat(points):
+    """
+    Returns a tuple of all coordinates covered by the face with the specified
+    (scaled, but not rounded) *points*, by splitting the face into a fan of
+    triangles and voxelizing each with :func:`_triangle_voxels`.
+    """
+    result = {}
+    points = [tuple(p) for p in points]
+    for i in range(1, len(points) - 1):
+        for v in _triangle_voxels(points[0], points[i], points[i + 1]):
+            result[v] = True
+    return tuple(result)
+
+
+def _sub(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def _cross(a, b):
+    return (
+        a[1] * b[2] - a[2] * b[1],
+        a[2] * b[0] - a[0] * b[2],
+        a[0] * b[1] - a[1] * b[0],
+        )
+
+
+def _triangle_voxels(v0, v1, v2):
+    """
+    Generator which yields the coordinates of all blocks (unit cubes centered
+    on integer coordinates) which overlap the triangle with corners *v0*, *v1*
+    and *v2* (each an (x, y, z) tuple of floats).
+
+    This is the separating axis test of Akenine-Moller's "Fast 3D
+    Triangle-Box Overlap Testing", restricted to the triangle's bounding box.
+    Rather than testing every block within the bounding box against the
+    triangle's plane, the range of blocks along the dominant axis of the
+    triangle's normal is solved for directly, leaving the nine edge axes to be
+    tested for each candidate block. Touching counts as overlapping, so the
+    result is conservative (no gaps between adjacent triangles).
+    """
+    lo = [int(math.ceil(min(a, b, c) - 0.5)) for a, b, c in zip(v0, v1, v2)]
+    hi = [int(math.floor(max(a, b, c) + 0.5)) for a, b, c in zip(v0, v1, v2)]
+    edges = (_sub(v1, v0), _sub(v2, v1), _sub(v0, v2))
+    # For each separating axis precalculate the (inclusive) interval that
+    # a block center's projection must lie within for the block to overlap the
+    # triangle; the block's "radius" along the axis widens the triangle's own
+    # projected interval
+    tests = []
+    for u in ((1, 0, 0), (0, 1, 0), (0, 0, 1)):
+        for e in edges:
+            a = _cross(u, e)
+            if a != (0, 0, 0):
+                p = (_dot(a, v0), _dot(a, v1), _dot(a, v2))
+                r = 0.5 * (abs(a[0]) + abs(a[1]) + abs(a[2]))
+                tests.append((a[0], a[1], a[2], min(p) - r, max(p) + r))
+    normal = _cross(edges[0], edges[1])
+    k = max(range(3), key=lambda axis: abs(normal[axis]))
+    i, j = [axis for axis in range(3) if axis != k]
+    if normal[k]:
+        d = _dot(normal, v0)
+        r = 0.5 * (abs(normal[0]) + abs(normal[1]) + abs(normal[2]))
+    c = [0, 0, 0]
+    for c[i] in range(lo[i], hi[i] + 1):
+        for c[j] in range(lo[j], hi[j] + 1):
+            if normal[k]:
+                # Solve the plane test for the range along the dominant axis
+                rest = normal[i] * c[i] + normal[j] * c[j]
+                k_lo, k_hi = sorted((
+                    (d - r - rest) / normal[k],
+                    (d + r - rest) / normal[k]))
+                k_lo = max(lo[k], int(math.ceil(k_lo)))
+                k_hi = min(hi[k], int(math.floor(k_hi)))
+            else:
+                # Degenerate (zero area) triangle; no plane to test against
+                k_lo, k_hi = lo[k], hi[k]
+            for c[k] in range(k_lo, k_hi + 1):
+                for ax, ay, az, t_lo, t_hi in tests:
+                    t = ax * c[0] + ay * c[1] + az * c[2]
+                    if t < t_lo or t > t_hi:
+                        break
+                else:
+                    yield Vector(*c)
+
+
+def _render_interior(jobs):
+    """
+    Generator which yields (vector, block) tuples for the blocks within the
+    closed surface described by *jobs* (a sequence of (block, points) tuples).
+    A ray is cast along the Y axis through each column of blocks; crossings
+    are sorted, and blocks between each pair of crossings (even-odd parity) are
+    yielded with the block of the face that the ray entered through.
+    """
+    # The ray is offset from the block centers by a small, irregular amount to
+    # avoid passing exactly through the edges or vertices shared by adjacent
+    # triangles (which would be counted twice and break the parity)
+    offset_x, offset_z = 1.23e-6, 2.71e-6
+    columns = defaultdict(list)
+    for b, points in jobs:
+        points = [tuple(p) for p in points]
+        for n in range(1, len(points) - 1):
+            (x0, y0, z0), (x1, y1, z1), (x2, y2, z2) = (
+                points[0], points[n], points[n + 1])
+            area = (x1 - x0) * (z2 - z0) - (x2 - x0) * (z1 - z0)
+            if not area:
+                # Triangle is edge-on to the ray
+                continue
+            for x in range(
+                    int(math.ceil(min(x0, x1, x2))),
+                    int(math.floor(max(x0, x1, x2))) + 1):
+                for z in range(
+                        int(math.ceil(min(z0, z1, z2))),
+                        int(math.floor(max(z0, z1, z2))) + 1):
+                    px, pz = x + offset_x, z + offset_z
+                    w1 = ((px - x0) * (z2 - z0) - (x2 - x0) * (pz - z0)) / area
+                    w2 = ((x1 - x0) * (pz - z0) - (px - x0) * (z1 - z0)) / area
+                    if w1 >= 0 and w2 >= 0 and w1 + w2 <= 1:
+                        y = y0 + w1 * (y1 - y0) + w2 * (y2 - y0)
+                        columns[(x, z)].append((y, b))
+    for (x, z) in sorted(columns):
+        crossings = sorted(columns[(x, z)], key=lambda c: c[0])
+        for (y_in, b), (y_out, _) in zip(crossings[::2], crossings[1::2]):
+            for y in range(int(math.ceil(y_in)), int(math.floor(y_out)) + 1):
+                yield Vector(x, y, z), b
+
+
+def _render_faces_parallel(render_face, faces, workers):
+    """
+    Renders each entry of *faces* (a list of lists of points) with
+    *render_face* in a pool of *workers* processes, returning the results in
+    the same order as *faces*.
+    """
+    # Imported here as concurrent.futures doesn't exist in Python 2
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Send faces to the workers in reasonably large chunks to amortize the
+    # pickling overhead, but small enough that the pool remains balanced when
+    # face complexity varies throughout the model
+    chunksize = max(1, len(faces) // (workers * 4))
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(render_face, faces, chunksize=chunksize))
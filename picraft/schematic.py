@@ -0,0 +1,518 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# An alternate Python Minecraft library for the Rasperry-Pi
+# Copyright (c) 2013-2016 Dave Jones <dave@waveform.org.uk>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The schematic module defines the :class:`Schematic` class, which holds a
+portable copy of a box of blocks. Schematics can be copied from a world, saved
+to and loaded from files, and placed anywhere in the same or another world.
+
+.. note::
+
+    All items in this module are available from the :mod:`picraft` namespace
+    without having to import :mod:`picraft.schematic` directly.
+
+Two file formats are supported: picraft's own compact format, and the classic
+MCEdit ``.schematic`` format (gzip-compressed `NBT`_) understood by many
+other Minecraft tools. If `NumPy`_ is installed, schematics can also be
+converted to and from NumPy arrays.
+
+.. _NBT: https://minecraft.gamepedia.com/NBT_format
+.. _NumPy: http://www.numpy.org/
+
+The following items are defined in the module:
+
+
+Schematic
+=========
+
+.. autoclass:: Schematic
+    :members:
+
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+str = type('')
+
+
+import sys
+import gzip
+import struct
+from array import array
+
+from .compat import array_to_bytes, array_from_bytes
+from .vector import Vector, vector_range, cuboids
+from .block import Block
+from .world import Snapshot
+from .tracing import span
+
+
+class Schematic(object):
+    """
+    A box of blocks with the specified *size* (a
+    :class:`~picraft.vector.Vector` giving its width along the X-axis, height
+    along the Y-axis, and length along the Z-axis).
+
+    The block ids and data are held in the :attr:`ids` and :attr:`data`
+    arrays in Y, Z, X order (the X coordinate varies fastest) as in the
+    ``.schematic`` format. If *ids* or *data* are not specified, the schematic
+    is filled with air. Blocks can be queried and changed by indexing the
+    schematic with a :class:`~picraft.vector.Vector` relative to its origin::
+
+        >>> s = Schematic(Vector(4, 2, 4))
+        >>> s[Vector(1, 0, 1)] = Block.from_name('stone')
+        >>> s[Vector(1, 0, 1)]
+        <Block "stone" id=1 data=0>
+
+    More usually, schematics are copied from a world with :meth:`from_world`,
+    read from a file with :meth:`load`, then drawn with :meth:`place`::
+
+        >>> v = world.player.tile_pos
+        >>> s = Schematic.from_world(world, vector_range(v - 10, v + 10))
+        >>> s.save('house.schematic')
+        >>> Schematic.load('house.schematic').place(other_world, Vector(0, 0, 0))
+    """
+
+    _MAGIC = b'PICRAFT-SCHEMATIC-1\n'
+    _HEADER = struct.Struct(str('<3I'))
+
+    def __init__(self, size, ids=None, data=None):
+        size = Vector(*size)
+        if not (size.x > 0 and size.y > 0 and size.z > 0):
+            raise ValueError('all elements of size must be positive')
+        count = size.x * size.y * size.z
+        self._size = size
+        if ids is None:
+            self._ids = array(str('H'), [0]) * count
+        else:
+            self._ids = array(str('H'), ids)
+        if data is None:
+            self._data = array(str('B'), [0]) * count
+        else:
+            self._data = array(str('B'), data)
+        if not (len(self._ids) == len(self._data) == count):
+            raise ValueError('ids and data must contain %d elements' % count)
+
+    def __repr__(self):
+        return '<Schematic size=%d,%d,%d>' % self._size
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _index(self, v):
+        size = self._size
+        if not (0 <= v.x < size.x and 0 <= v.y < size.y and 0 <= v.z < size.z):
+            raise IndexError('%r is outside the schematic' % (v,))
+        return (v.y * size.z + v.z) * size.x + v.x
+
+    def __getitem__(self, index):
+        i = self._index(index)
+        return Block.from_id(self._ids[i], self._data[i])
+
+    def __setitem__(self, index, value):
+        i = self._index(index)
+        self._ids[i] = value.id
+        self._data[i] = value.data
+
+    @property
+    def size(self):
+        """
+        The size of the schematic as a :class:`~picraft.vector.Vector`.
+        """
+        return self._size
+
+    @property
+    def ids(self):
+        """
+        An :class:`array.array` of the block ids in the schematic.
+        """
+        return self._ids
+
+    @property
+    def data(self):
+        """
+        An :class:`array.array` of the block data in the schematic.
+        """
+        return self._data
+
+    @property
+    def vrange(self):
+        """
+        A :class:`~picraft.vector.vector_range` of the positions within the
+        schematic, in the same order as :attr:`ids` and :attr:`data`.
+        """
+        return vector_range(self._size, order='xzy')
+
+    @classmethod
+    def from_world(cls, world, vrange):
+        """
+        Returns a new schematic copied from the blocks within *vrange* in
+        *world*. The range must have a unit step; its start becomes the
+        origin of the schematic. The region is read in bulk in the same
+        manner as :meth:`World.snapshot`.
+        """
+        if vrange.step != Vector(1, 1, 1):
+            raise ValueError('vrange must have a step of (1, 1, 1)')
+        size = vrange.stop - vrange.start
+        result = cls(size)
+        # Read in the default zxy order (which permits Raspberry Juice's
+        # getBlocks fast-path) and re-order the result
+        snapshot = Snapshot.from_world(
+            world, vector_range(vrange.start, vrange.stop))
+        src_ids, src_data = snapshot._ids, snapshot._data
+        ids, data = result._ids, result._data
+        i = 0
+        for y in range(size.y):
+            for x in range(size.x):
+                j = y * size.z * size.x + x
+                for z in range(size.z):
+                    ids[j] = src_ids[i]
+                    data[j] = src_data[i]
+                    i += 1
+                    j += size.x
+        return result
+
+    def place(self, world, pos, air=True, layers=16):
+        """
+        Draw the schematic in *world* with its origin at *pos*.
+
+        Blocks are grouped into as few boxes as possible (see
+        :func:`~picraft.vector.cuboids`), each of which is drawn with a single
+        ``world.setBlocks`` command. The schematic is processed in slabs of
+        *layers* horizontal layers, each of which is sent as one batch, so
+        placing a large schematic doesn't require holding the commands for
+        all of it at once.
+
+        If *air* is ``False``, air blocks in the schematic are skipped,
+        leaving whatever is already in the world at those positions.
+        """
+        pos = Vector(*pos)
+        size = self._size
+        ids = self._ids
+        data = self._data
+        with span('schematic.place') as s:
+            if s.recording:
+                s.set(count=len(self))
+            for y_start in range(0, size.y, layers):
+                groups = {}
+                for y in range(y_start, min(size.y, y_start + layers)):
+                    for z in range(size.z):
+                        i = (y * size.z + z) * size.x
+                        for x in range(size.x):
+                            key = (ids[i + x], data[i + x])
+                            if air or key != (0, 0):
+                                groups.setdefault(key, []).append(
+                                    Vector(x, y, z))
+                if not groups:
+                    continue
+                with world.connection.batch_start():
+                    for (id, data_), points in sorted(groups.items()):
+                        block = Block.from_id(id, data_)
+                        for box in cuboids(points):
+                            if len(box) == 1:
+                                world.blocks[box.start + pos] = block
+                            else:
+                                world.blocks[
+                                    box.start + pos:box.stop + pos] = block
+
+    def to_numpy(self):
+        """
+        Returns a tuple of two NumPy arrays containing the block ids and data
+        of the schematic. Both arrays are indexed by Y, Z, and X (in that
+        order) to match the layout of the ``.schematic`` format::
+
+            >>> ids, data = s.to_numpy()
+            >>> ids[0, 1, 1]
+            1
+
+        This method requires NumPy to be installed.
+        """
+        import numpy as np
+        shape = (self._size.y, self._size.z, self._size.x)
+        return (
+            np.array(self._ids, dtype=np.uint16).reshape(shape),
+            np.array(self._data, dtype=np.uint8).reshape(shape),
+            )
+
+    @classmethod
+    def from_numpy(cls, ids, data=None):
+        """
+        Returns a new schematic constructed from the NumPy array *ids*, and
+        optionally *data*, which are both indexed by Y, Z, and X (as returned
+        by :meth:`to_numpy`). This method requires NumPy to be installed.
+        """
+        import numpy as np
+        ids = np.asarray(ids, dtype=np.uint16)
+        if ids.ndim != 3:
+            raise ValueError('ids must have 3 dimensions')
+        if data is None:
+            data = np.zeros(ids.shape, dtype=np.uint8)
+        else:
+            data = np.asarray(data, dtype=np.uint8)
+        if data.shape != ids.shape:
+            raise ValueError('ids and data must have the same shape')
+        result = cls(Vector(ids.shape[2], ids.shape[0], ids.shape[1]))
+        result._ids = array(str('H'))
+        result._data = array(str('B'))
+        array_from_bytes(result._ids, np.ascontiguousarray(ids).tobytes())
+        array_from_bytes(result._data, np.ascontiguousarray(data).tobytes())
+        return result
+
+    def save(self, filename_or_object, format=None):
+        """
+        Write the schematic to *filename_or_object*. The *format* may be
+        ``'picraft'`` for picraft's own format, or ``'schematic'`` for the
+        MCEdit ``.schematic`` format. If it is not specified, the format is
+        ``'schematic'`` when *filename_or_object* is a filename ending with
+        ``.schematic``, and ``'picraft'`` otherwise. Both formats are
+        compressed with gzip.
+
+        Note that the ``.schematic`` format stores the top four bits of block
+        ids greater than 255 separately; this is handled transparently.
+        """
+        if format is None:
+            if (
+                    isinstance(filename_or_object, str) and
+                    filename_or_object.lower().endswith('.schematic')):
+                format = 'schematic'
+            else:
+                format = 'picraft'
+        if format == 'picraft':
+            content = self._to_picraft()
+        elif format == 'schematic':
+            content = self._to_nbt()
+        else:
+            raise ValueError('invalid format: %s' % format)
+        if isinstance(filename_or_object, str):
+            stream = gzip.open(filename_or_object, 'wb')
+        else:
+            stream = gzip.GzipFile(fileobj=filename_or_object, mode='wb')
+        with stream:
+            stream.write(content)
+
+    @classmethod
+    def load(cls, filename_or_object):
+        """
+        Returns a schematic read from *filename_or_object*, which may be in
+        either of the formats written by :meth:`save` (the format is detected
+        automatically).
+        """
+        if isinstance(filename_or_object, str):
+            stream = gzip.open(filename_or_object, 'rb')
+        else:
+            stream = gzip.GzipFile(fileobj=filename_or_object, mode='rb')
+        with stream:
+            try:
+                content = stream.read()
+            except (IOError, EOFError):
+                raise ValueError('not a schematic')
+        if content.startswith(cls._MAGIC):
+            return cls._from_picraft(content)
+        elif content.startswith(b'\x0a'):
+            return cls._from_nbt(content)
+        else:
+            raise ValueError('not a schematic')
+
+    def _to_picraft(self):
+        ids = array(str('H'), self._ids)
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        return b''.join((
+            self._MAGIC,
+            self._HEADER.pack(*self._size),
+            array_to_bytes(ids),
+            array_to_bytes(self._data),
+            ))
+
+    @classmethod
+    def _from_picraft(cls, content):
+        offset = len(cls._MAGIC)
+        size = Vector(*cls._HEADER.unpack_from(content, offset))
+        offset += cls._HEADER.size
+        count = size.x * size.y * size.z
+        if len(content) != offset + count * 3:
+            raise ValueError('truncated schematic')
+        ids = array(str('H'))
+        data = array(str('B'))
+        array_from_bytes(ids, content[offset:offset + count * 2])
+        array_from_bytes(data, content[offset + count * 2:])
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        return cls(size, ids, data)
+
+    def _to_nbt(self):
+        blocks = bytearray(i & 0xff for i in self._ids)
+        tags = [
+            _nbt_tag(_TAG_SHORT, 'Width', struct.pack(str('>h'), self._size.x)),
+            _nbt_tag(_TAG_SHORT, 'Height', struct.pack(str('>h'), self._size.y)),
+            _nbt_tag(_TAG_SHORT, 'Length', struct.pack(str('>h'), self._size.z)),
+            _nbt_tag(_TAG_STRING, 'Materials', _nbt_string('Alpha')),
+            _nbt_tag(_TAG_BYTE_ARRAY, 'Blocks', _nbt_bytes(blocks)),
+            _nbt_tag(_TAG_BYTE_ARRAY, 'Data', _nbt_bytes(
+                array_to_bytes(self._data))),
+            ]
+        if any(i > 0xff for i in self._ids):
+            add = bytearray((len(self._ids) + 1) // 2)
+            for i, id in enumerate(self._ids):
+                if id > 0xff:
+                    nibble = (id >> 8) & 0xf
+                    add[i >> 1] |= nibble if i & 1 else nibble << 4
+            tags.append(_nbt_tag(_TAG_BYTE_ARRAY, 'AddBlocks', _nbt_bytes(add)))
+        empty_list = struct.pack(str('>bi'), _TAG_COMPOUND, 0)
+        tags.append(_nbt_tag(_TAG_LIST, 'Entities', empty_list))
+        tags.append(_nbt_tag(_TAG_LIST, 'TileEntities', empty_list))
+        return _nbt_tag(
+            _TAG_COMPOUND, 'Schematic', b''.join(tags) + b'\x00')
+
+    @classmethod
+    def _from_nbt(cls, content):
+        try:
+            tag, name, root, offset = _nbt_read_tag(content, 0)
+        except (struct.error, IndexError):
+            raise ValueError('truncated schematic')
+        if tag != _TAG_COMPOUND:
+            raise ValueError('not a schematic')
+        try:
+            size = Vector(root['Width'], root['Height'], root['Length'])
+            blocks = bytearray(root['Blocks'])
+            data = bytearray(root['Data'])
+        except KeyError as exc:
+            raise ValueError('schematic is missing %s' % exc)
+        ids = array(str('H'), list(blocks))
+        if 'AddBlocks' in root:
+            add = bytearray(root['AddBlocks'])
+            for i in range(len(ids)):
+                nibble = add[i >> 1] if i & 1 else add[i >> 1] >> 4
+                ids[i] |= (nibble & 0xf) << 8
+        return cls(size, ids, data)
+
+
+_TAG_END = 0
+_TAG_BYTE = 1
+_TAG_SHORT = 2
+_TAG_INT = 3
+_TAG_LONG = 4
+_TAG_FLOAT = 5
+_TAG_DOUBLE = 6
+_TAG_BYTE_ARRAY = 7
+_TAG_STRING = 8
+_TAG_LIST = 9
+_TAG_COMPOUND = 10
+_TAG_INT_ARRAY = 11
+_TAG_LONG_ARRAY = 12
+
+_NBT_SCALARS = {
+    _TAG_BYTE:   struct.Struct(str('>b')),
+    _TAG_SHORT:  struct.Struct(str('>h')),
+    _TAG_INT:    struct.Struct(str('>i')),
+    _TAG_LONG:   struct.Struct(str('>q')),
+    _TAG_FLOAT:  struct.Struct(str('>f')),
+    _TAG_DOUBLE: struct.Struct(str('>d')),
+    }
+_NBT_ARRAYS = {
+    _TAG_INT_ARRAY:  str('>%di'),
+    _TAG_LONG_ARRAY: str('>%dq'),
+    }
+
+
+def _nbt_string(s):
+    s = s.encode('utf-8')
+    return struct.pack(str('>H'), len(s)) + s
+
+
+def _nbt_bytes(b):
+    return struct.pack(str('>i'), len(b)) + bytes(b)
+
+
+def _nbt_tag(tag, name, payload):
+    return struct.pack(str('>b'), tag) + _nbt_string(name) + payload
+
+
+def _nbt_read_tag(content, offset):
+    """
+    Read a named tag from *content* at *offset*, returning a tuple of the tag
+    type, its name, its value, and the offset following it.
+    """
+    tag, = struct.unpack_from(str('>b'), content, offset)
+    if tag == _TAG_END:
+        return tag, None, None, offset + 1
+    name, offset = _nbt_read_payload(content, offset + 1, _TAG_STRING)
+    value, offset = _nbt_read_payload(content, offset, tag)
+    return tag, name, value, offset
+
+
+def _nbt_read_payload(content, offset, tag):
+    """
+    Read the payload of a tag of type *tag* from *content* at *offset*,
+    returning a tuple of the value and the offset following it. Compounds are
+    returned as dicts, lists as lists, and arrays as bytes or tuples.
+    """
+    if tag in _NBT_SCALARS:
+        s = _NBT_SCALARS[tag]
+        return s.unpack_from(content, offset)[0], offset + s.size
+    elif tag == _TAG_STRING:
+        length, = struct.unpack_from(str('>H'), content, offset)
+        offset += 2
+        value = content[offset:offset + length]
+        if len(value) != length:
+            raise IndexError('truncated string')
+        return value.decode('utf-8'), offset + length
+    elif tag == _TAG_BYTE_ARRAY:
+        length, = struct.unpack_from(str('>i'), content, offset)
+        offset += 4
+        value = content[offset:offset + length]
+        if len(value) != length:
+            raise IndexError('truncated array')
+        return value, offset + length
+    elif tag in _NBT_ARRAYS:
+        length, = struct.unpack_from(str('>i'), content, offset)
+        fmt = _NBT_ARRAYS[tag] % length
+        value = struct.unpack_from(fmt, content, offset + 4)
+        return value, offset + 4 + struct.calcsize(fmt)
+    elif tag == _TAG_LIST:
+        item_tag, length = struct.unpack_from(str('>bi'), content, offset)
+        offset += 5
+        value = []
+        for i in range(length):
+            item, offset = _nbt_read_payload(content, offset, item_tag)
+            value.append(item)
+        return value, offset
+    elif tag == _TAG_COMPOUND:
+        value = {}
+        while True:
+            item_tag, name, item, offset = _nbt_read_tag(content, offset)
+            if item_tag == _TAG_END:
+                return value, offset
+            value[name] = item
+    else:
+        raise ValueError('invalid NBT tag type: %d' % tag)
@@ -0,0 +1,601 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# An alternate Python Minecraft library for the Rasperry-Pi
+# Copyright (c) 2013-2016 Dave Jones <dave@waveform.org.uk>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The testing module defines a fake Minecraft server which can be used to
+exercise picraft (and scripts built upon it) without a copy of Minecraft.
+
+.. note::
+
+    Unlike most other modules, the items in this module are *not* available
+    from the :mod:`picraft` namespace; you must import :mod:`picraft.testing`
+    explicitly.
+
+The :class:`FakeServer` class listens on a real TCP socket (by default on a
+random port on the loopback interface) and speaks the text protocol described
+in :ref:`protocol`. The state of the world is kept in memory, and the server
+can emulate the behaviour of either Minecraft Pi or Raspberry Juice. Artificial
+latency and bandwidth limits can be imposed to make the server behave more
+like a remote one, which is useful when measuring the effect of changes to
+picraft's network behaviour::
+
+    from picraft import World, Vector, Block
+    from picraft.testing import FakeServer
+
+    with FakeServer(latency=0.005) as server:
+        world = World(*server.address)
+        world.blocks[Vector(0, 0, 0)] = Block('stone')
+        assert world.blocks[Vector(0, 0, 0)] == Block('stone')
+        assert server.commands['world.setBlock'] == 1
+
+The following items are defined in the module:
+
+
+FakeServer
+==========
+
+.. autoclass:: FakeServer
+    :members:
+
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+str = type('')
+
+
+import re
+import math
+import time
+import socket
+import threading
+from collections import Counter, defaultdict
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from .vector import Vector
+from .block import Block
+
+
+# The face numbering used by the events.block.hits() command (the inverse of
+# the mapping in BlockHitEvent.from_string)
+FACES = {
+    'y-': 0,
+    'y+': 1,
+    'z-': 2,
+    'z+': 3,
+    'x-': 4,
+    'x+': 5,
+    }
+
+COMMAND_RE = re.compile(r'^(?P<name>[a-zA-Z.]+)\((?P<args>.*)\)$')
+
+PI = {'minecraft-pi'}
+JUICE = {'raspberry-juice'}
+BOTH = PI | JUICE
+
+# Maps command names to the name of the FakeServer method which implements
+# them, and the set of server versions which support the command
+COMMANDS = {
+    'world.setBlock':           ('_cmd_set_block', BOTH),
+    'world.setBlocks':          ('_cmd_set_blocks', BOTH),
+    'world.getBlock':           ('_cmd_get_block', BOTH),
+    'world.getBlockWithData':   ('_cmd_get_block_with_data', BOTH),
+    'world.getBlocks':          ('_cmd_get_blocks', JUICE),
+    'world.getHeight':          ('_cmd_get_height', BOTH),
+    'world.getPlayerIds':       ('_cmd_get_player_ids', BOTH),
+    'world.getPlayerId':        ('_cmd_get_player_id', JUICE),
+    'world.checkpoint.save':    ('_cmd_checkpoint_save', PI),
+    'world.checkpoint.restore': ('_cmd_checkpoint_restore', PI),
+    'world.setting':            ('_cmd_setting', PI),
+    'chat.post':                ('_cmd_chat_post', BOTH),
+    'camera.mode.setFixed':     ('_cmd_camera_fixed', PI),
+    'camera.mode.setFollow':    ('_cmd_camera_follow', PI),
+    'camera.mode.setNormal':    ('_cmd_camera_normal', PI),
+    'camera.setPos':            ('_cmd_camera_pos', PI),
+    'player.getPos':            ('_cmd_player_get_pos', BOTH),
+    'player.getTile':           ('_cmd_player_get_tile', BOTH),
+    'player.setPos':            ('_cmd_player_set_pos', BOTH),
+    'player.setTile':           ('_cmd_player_set_tile', BOTH),
+    'player.getRotation':       ('_cmd_player_get_rotation', JUICE),
+    'player.getPitch':          ('_cmd_player_get_pitch', JUICE),
+    'player.getDirection':      ('_cmd_player_get_direction', JUICE),
+    'player.setting':           ('_cmd_player_setting', PI),
+    'entity.getPos':            ('_cmd_player_get_pos', BOTH),
+    'entity.getTile':           ('_cmd_player_get_tile', BOTH),
+    'entity.setPos':            ('_cmd_player_set_pos', BOTH),
+    'entity.setTile':           ('_cmd_player_set_tile', BOTH),
+    'entity.getRotation':       ('_cmd_player_get_rotation', JUICE),
+    'entity.getPitch':          ('_cmd_player_get_pitch', JUICE),
+    'entity.getDirection':      ('_cmd_player_get_direction', JUICE),
+    'events.clear':             ('_cmd_events_clear', BOTH),
+    'events.block.hits':        ('_cmd_events_block_hits', BOTH),
+    'events.chat.posts':        ('_cmd_events_chat_posts', JUICE),
+    }
+
+
+class FakeServer(object):
+    """
+    An in-process emulation of a Minecraft server.
+
+    The server binds to *host* and *port* (which default to the loopback
+    interface and a random free port) and immediately begins accepting
+    connections in a background thread. The :attr:`address` attribute gives
+    the address actually bound, which can be passed to
+    :class:`~picraft.world.World`::
+
+        server = FakeServer()
+        world = World(*server.address)
+
+    The *version* parameter selects the behaviour to emulate, and must be
+    ``'raspberry-juice'`` (the default) or ``'minecraft-pi'``. Minecraft Pi
+    silently ignores commands it doesn't recognize (including all Raspberry
+    Juice extensions like ``world.getBlocks``), while Raspberry Juice replies
+    "Fail" to them (including Minecraft Pi specific commands like
+    ``world.checkpoint.save``). Both reply "Fail" to known commands with
+    invalid parameters.
+
+    .. note::
+
+        When emulating Minecraft Pi, the client's version detection must wait
+        for its timeout to expire, so you may wish to construct the
+        :class:`~picraft.world.World` with a short *timeout*.
+
+    The *latency* parameter specifies the round-trip time in seconds that the
+    server will impose on replies; each reply is written no earlier than
+    *latency* seconds after the line that prompted it arrived. Commands without
+    replies (e.g. ``world.setBlock``) are not delayed, so batched commands
+    behave much as they would against a remote server. The *bandwidth*
+    parameter, if not ``None``, limits the rate (in bytes per second) at which
+    the server will receive and transmit data. Both attributes can be altered
+    while the server is running.
+
+    The world is initially empty (every block is air) and contains a single
+    player (with id 1) standing at the origin. Further players can be added
+    with :meth:`add_player`, and block hit and chat events can be queued with
+    :meth:`hit_block` and :meth:`post_chat`.
+
+    .. attribute:: latency
+
+        The artificial round-trip time imposed on replies, in seconds.
+
+    .. attribute:: bandwidth
+
+        The maximum rate at which data is transferred, in bytes per second, or
+        ``None`` for no limit.
+
+    .. attribute:: commands
+
+        A :class:`~collections.Counter` of the names of all commands the server
+        has received (including ones it didn't recognize).
+
+    .. attribute:: chat
+
+        A list of all messages posted with the ``chat.post`` command.
+
+    .. attribute:: settings
+
+        A dict mapping the names of world and player settings to their current
+        (boolean) values. Player settings are prefixed with "player.".
+
+    .. attribute:: bytes_received
+
+        The total number of bytes received from all clients.
+
+    .. attribute:: bytes_sent
+
+        The total number of bytes sent to all clients.
+    """
+
+    def __init__(
+            self, host='127.0.0.1', port=0, version='raspberry-juice',
+            latency=0.0, bandwidth=None):
+        if version not in ('raspberry-juice', 'minecraft-pi'):
+            raise ValueError('invalid version: %s' % version)
+        self._version = version
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.commands = Counter()
+        self.chat = []
+        self.settings = {}
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._columns = defaultdict(set)
+        self._checkpoint = None
+        self._players = {}
+        self._names = {}
+        self._next_player = 1
+        self._camera = None
+        self._block_hits = []
+        self._chat_posts = []
+        self.add_player(name='player')
+        self._server = _TCPServer((host, port), _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        return '<FakeServer address=%s:%d version="%s">' % (
+            self.address + (self._version,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Stops the server, closing all client connections.
+        """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server.close_clients()
+            self._thread.join()
+            self._server = None
+
+    @property
+    def address(self):
+        """
+        The (host, port) tuple that the server is listening on.
+        """
+        return self._server.server_address[:2]
+
+    @property
+    def version(self):
+        """
+        The version of Minecraft being emulated; ``'raspberry-juice'`` or
+        ``'minecraft-pi'``.
+        """
+        return self._version
+
+    @property
+    def blocks(self):
+        """
+        Returns a :class:`dict` mapping :class:`~picraft.vector.Vector`
+        instances to :class:`~picraft.block.Block` instances for every
+        non-air block in the world.
+        """
+        with self._lock:
+            return {
+                Vector(*v): Block.from_id(*b)
+                for v, b in self._blocks.items()
+                }
+
+    @property
+    def players(self):
+        """
+        Returns a :class:`dict` mapping player ids to their (floating-point)
+        positions as :class:`~picraft.vector.Vector` instances.
+        """
+        with self._lock:
+            return {
+                pid: Vector(*state['pos'])
+                for pid, state in self._players.items()
+                }
+
+    def add_player(self, pos=Vector(0, 0, 0), name=None):
+        """
+        Adds a new player to the world at *pos* (which defaults to the origin)
+        and returns their id. Raspberry Juice permits players to be looked up
+        by *name*; if omitted, a name is generated.
+        """
+        with self._lock:
+            pid = self._next_player
+            self._next_player += 1
+            if name is None:
+                name = 'player%d' % pid
+            self._players[pid] = {
+                'pos': tuple(float(i) for i in pos),
+                'rotation': 0.0,
+                'pitch': 0.0,
+                }
+            self._names[name] = pid
+            return pid
+
+    def hit_block(self, pos, face='y+', player=1):
+        """
+        Queues an event indicating that *player* struck the *face* (one of
+        ``'x-'``, ``'x+'``, ``'y-'``, ``'y+'``, ``'z-'``, ``'z+'``) of the block
+        at *pos*.
+        """
+        with self._lock:
+            self._block_hits.append('%d,%d,%d,%d,%d' % (
+                pos[0], pos[1], pos[2], FACES[face], player))
+
+    def post_chat(self, message, player=1):
+        """
+        Queues an event indicating that *player* posted *message* to the chat
+        console. Only Raspberry Juice reports these events.
+        """
+        with self._lock:
+            self._chat_posts.append('%d,%s' % (player, message))
+
+    def execute(self, line):
+        """
+        Executes the command *line* (a unicode string, without a trailing
+        line-feed) against the world, and returns the reply to be sent to the
+        client, or ``None`` if no reply should be sent.
+        """
+        match = COMMAND_RE.match(line)
+        if match:
+            name, args = match.group('name'), match.group('args')
+        else:
+            name, args = line, None
+        with self._lock:
+            self.commands[name] += 1
+            try:
+                method, versions = COMMANDS[name]
+            except KeyError:
+                return self._unknown()
+            if self._version not in versions:
+                return self._unknown()
+            try:
+                return getattr(self, method)(*(args.split(',') if args else ()))
+            except (TypeError, ValueError, KeyError):
+                # Wrong number of parameters, unparseable parameters, or
+                # unknown player ids or names
+                return 'Fail'
+
+    def _unknown(self):
+        if self._version == 'raspberry-juice':
+            return 'Fail'
+        return None
+
+    def _set_block(self, key, block):
+        x, y, z = key
+        if block[0]:
+            self._blocks[key] = block
+            self._columns[x, z].add(y)
+        elif self._blocks.pop(key, None) is not None:
+            column = self._columns[x, z]
+            column.discard(y)
+            if not column:
+                del self._columns[x, z]
+
+    def _player(self, pid):
+        if pid is None:
+            return self._players[1]
+        return self._players[int(pid)]
+
+    # Command handlers follow; each is called with the (string) arguments of
+    # the command, with the server's lock held, and returns the reply (or
+    # None for no reply)
+
+    def _cmd_set_block(self, x, y, z, block_id, data='0'):
+        self._set_block(
+            (int(x), int(y), int(z)), (int(block_id), int(data)))
+
+    def _cmd_set_blocks(self, x1, y1, z1, x2, y2, z2, block_id, data='0'):
+        block = (int(block_id), int(data))
+        (x1, x2), (y1, y2), (z1, z2) = (
+            sorted((int(a), int(b))) for a, b in ((x1, x2), (y1, y2), (z1, z2)))
+        volume = (x2 - x1 + 1) * (y2 - y1 + 1) * (z2 - z1 + 1)
+        if not block[0] and volume > len(self._blocks):
+            # Clearing a large region; cheaper to scan the existing blocks
+            keys = [
+                v for v in self._blocks
+                if x1 <= v[0] <= x2 and y1 <= v[1] <= y2 and z1 <= v[2] <= z2
+                ]
+        else:
+            keys = (
+                (x, y, z)
+                for y in range(y1, y2 + 1)
+                for x in range(x1, x2 + 1)
+                for z in range(z1, z2 + 1)
+                )
+        for key in keys:
+            self._set_block(key, block)
+
+    def _cmd_get_block(self, x, y, z):
+        return '%d' % self._blocks.get((int(x), int(y), int(z)), (0, 0))[0]
+
+    def _cmd_get_block_with_data(self, x, y, z):
+        return '%d,%d' % self._blocks.get((int(x), int(y), int(z)), (0, 0))
+
+    def _cmd_get_blocks(self, x1, y1, z1, x2, y2, z2):
+        (x1, x2), (y1, y2), (z1, z2) = (
+            sorted((int(a), int(b))) for a, b in ((x1, x2), (y1, y2), (z1, z2)))
+        blocks = self._blocks
+        return ','.join(
+            '%d' % blocks.get((x, y, z), (0, 0))[0]
+            for y in range(y1, y2 + 1)
+            for x in range(x1, x2 + 1)
+            for z in range(z1, z2 + 1)
+            )
+
+    def _cmd_get_height(self, x, z):
+        column = self._columns.get((int(x), int(z)))
+        return '%d' % (max(column) if column else 0)
+
+    def _cmd_get_player_ids(self):
+        return '|'.join('%d' % pid for pid in sorted(self._players))
+
+    def _cmd_get_player_id(self, name):
+        return '%d' % self._names[name]
+
+    def _cmd_checkpoint_save(self):
+        self._checkpoint = dict(self._blocks)
+
+    def _cmd_checkpoint_restore(self):
+        if self._checkpoint is not None:
+            self._blocks = {}
+            self._columns = defaultdict(set)
+            for key, block in self._checkpoint.items():
+                self._set_block(key, block)
+
+    def _cmd_setting(self, name, value):
+        self.settings[name] = bool(int(value))
+
+    def _cmd_chat_post(self, *message):
+        self.chat.append(','.join(message))
+
+    def _cmd_camera_fixed(self):
+        self._camera = ('fixed', None)
+
+    def _cmd_camera_follow(self, pid=None):
+        self._camera = ('follow', None if pid is None else int(pid))
+
+    def _cmd_camera_normal(self, pid=None):
+        self._camera = ('normal', None if pid is None else int(pid))
+
+    def _cmd_camera_pos(self, x, y, z):
+        self._camera = ('fixed', (float(x), float(y), float(z)))
+
+    def _cmd_player_get_pos(self, pid=None):
+        return '%r,%r,%r' % self._player(pid)['pos']
+
+    def _cmd_player_get_tile(self, pid=None):
+        return '%d,%d,%d' % tuple(
+            int(math.floor(i)) for i in self._player(pid)['pos'])
+
+    def _cmd_player_set_pos(self, *args):
+        pid = args[0] if len(args) == 4 else None
+        x, y, z = (float(i) for i in args[-3:])
+        self._player(pid)['pos'] = (x, y, z)
+
+    def _cmd_player_set_tile(self, *args):
+        pid = args[0] if len(args) == 4 else None
+        x, y, z = (int(i) for i in args[-3:])
+        self._player(pid)['pos'] = (float(x), float(y), float(z))
+
+    def _cmd_player_get_rotation(self, pid=None):
+        return '%r' % self._player(pid)['rotation']
+
+    def _cmd_player_get_pitch(self, pid=None):
+        return '%r' % self._player(pid)['pitch']
+
+    def _cmd_player_get_direction(self, pid=None):
+        state = self._player(pid)
+        rotation = math.radians(state['rotation'])
+        pitch = math.radians(state['pitch'])
+        return '%r,%r,%r' % (
+            -math.sin(rotation) * math.cos(pitch),
+            -math.sin(pitch),
+            math.cos(rotation) * math.cos(pitch),
+            )
+
+    def _cmd_player_setting(self, name, value):
+        self.settings['player.' + name] = bool(int(value))
+
+    def _cmd_events_clear(self):
+        del self._block_hits[:]
+        del self._chat_posts[:]
+
+    def _cmd_events_block_hits(self):
+        result = '|'.join(self._block_hits)
+        del self._block_hits[:]
+        return result
+
+    def _cmd_events_chat_posts(self):
+        result = '|'.join(self._chat_posts)
+        del self._chat_posts[:]
+        return result
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, handler):
+        socketserver.TCPServer.__init__(self, address, handler)
+        self.clients = set()
+        self.clients_lock = threading.Lock()
+
+    def close_clients(self):
+        with self.clients_lock:
+            for client in self.clients:
+                try:
+                    client.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.clients_lock:
+            self.server.clients.add(self.request)
+
+    def finish(self):
+        with self.server.clients_lock:
+            self.server.clients.discard(self.request)
+
+    def throttle(self, size):
+        bandwidth = self.server.fake.bandwidth
+        if bandwidth:
+            time.sleep(size / bandwidth)
+
+    def handle(self):
+        fake = self.server.fake
+        buf = b''
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except socket.error:
+                break
+            if not data:
+                break
+            arrived = time.time()
+            with fake._lock:
+                fake.bytes_received += len(data)
+            self.throttle(len(data))
+            buf += data
+            lines = buf.split(b'\n')
+            buf = lines.pop()
+            replies = []
+            for line in lines:
+                reply = fake.execute(line.decode('ascii', 'replace').rstrip('\r'))
+                if reply is not None:
+                    replies.append(reply)
+            if replies:
+                # All lines in this chunk arrived together, so their replies
+                # can share one (simulated) round trip
+                delay = arrived + fake.latency - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                out = ''.join(reply + '\n' for reply in replies).encode('ascii')
+                self.throttle(len(out))
+                try:
+                    self.request.sendall(out)
+                except socket.error:
+                    break
+                with fake._lock:
+                    fake.bytes_sent += len(out)
@@ -0,0 +1,347 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# An alternate Python Minecraft library for the Rasperry-Pi
+# Copyright (c) 2013-2016 Dave Jones <dave@waveform.org.uk>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The tracing module provides hooks which can be used to discover where the time
+goes in a picraft script, without modifying (or monkey-patching) the library.
+
+.. note::
+
+    Unlike most other modules, the items in this module are *not* available
+    from the :mod:`picraft` namespace; you must import :mod:`picraft.tracing`
+    explicitly.
+
+Significant operations within picraft (querying and setting blocks, querying
+heights, polling for events, rendering models, moving turtles, and network
+transactions) are wrapped in *spans*. By default, no tracer is installed and
+spans cost almost nothing. To record them, install a :class:`Tracer` with
+:func:`set_tracer`. The :class:`RecordingTracer` simply keeps a list of all
+finished spans::
+
+    from picraft import World, Model
+    from picraft.tracing import RecordingTracer, set_tracer
+
+    tracer = RecordingTracer()
+    set_tracer(tracer)
+    w = World()
+    m = Model('airboat.obj').render(scale=2.0)
+    with w.connection.batch_start():
+        w.blocks[m.keys()] = m.values()
+    for span in tracer.spans:
+        print(span.name, span.duration, span.attrs)
+
+To forward spans to another system (for example `OpenTelemetry`_), derive a
+class from :class:`Tracer` and override :meth:`Tracer.start` and
+:meth:`Tracer.finish`.
+
+The spans currently emitted are:
+
+========================= ====================================================
+Span                      Attributes
+========================= ====================================================
+blocks.get                *count* (blocks queried), *server_version*
+blocks.set                *count* (blocks set, if known), *server_version*
+blocks.get_chunks         *chunks*, *commands* (commands sent for them)
+height.get                *count* (columns queried)
+events.poll               *events* (events returned)
+events.process            *events* (events dispatched)
+model.render              *faces*, *engine*, *workers*, *voxels* (result size)
+turtle.update             *action* ("draw" or "move")
+turtle.screen.update      (none)
+schematic.place           *count* (blocks in the schematic)
+connection.transact       *command*, *server_version*
+connection.transact_array *command*, *server_version*
+connection.transact_many  *commands* (number of commands), *server_version*
+connection.batch_send     *commands* (number of commands in the batch)
+========================= ====================================================
+
+.. _OpenTelemetry: https://opentelemetry.io/
+
+The following items are defined in the module:
+
+
+Functions
+=========
+
+.. autofunction:: set_tracer
+
+.. autofunction:: get_tracer
+
+.. autofunction:: span
+
+
+Tracer
+======
+
+.. autoclass:: Tracer
+    :members:
+
+
+RecordingTracer
+===============
+
+.. autoclass:: RecordingTracer
+    :members:
+
+
+Span
+====
+
+.. autoclass:: Span
+    :members:
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+str = type('')
+
+
+import time
+import threading
+
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class Span(object):
+    """
+    Represents a single traced operation. Spans are created by
+    :meth:`Tracer.span` and are used as context managers; the span starts when
+    the :keyword:`with` block is entered and finishes when it exits.
+
+    .. attribute:: name
+
+        The name of the operation (e.g. ``'blocks.get'``).
+
+    .. attribute:: attrs
+
+        A :class:`dict` of attributes describing the operation.
+
+    .. attribute:: parent
+
+        The span that was active (in the same thread) when this span started,
+        or ``None``.
+
+    .. attribute:: start
+
+        The time (from :func:`time.perf_counter` where available) at which
+        the span started.
+
+    .. attribute:: duration
+
+        The time in seconds between the start and finish of the span (``None``
+        until the span finishes).
+
+    .. attribute:: error
+
+        The exception which terminated the span, if any.
+
+    .. attribute:: recording
+
+        Always ``True`` for real spans (the placeholder span returned by
+        :func:`span` when no tracer is installed has this set to ``False``).
+        Code creating spans can test this to avoid calculating expensive
+        attributes that would be discarded.
+    """
+
+    __slots__ = (
+        'tracer', 'name', 'attrs', 'parent', 'start', 'duration', 'error')
+
+    recording = True
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def __repr__(self):
+        return '<Span name="%s" duration=%r attrs=%r>' % (
+            self.name, self.duration, self.attrs)
+
+    def set(self, **attrs):
+        """
+        Adds (or replaces) the attributes given as keyword arguments.
+        """
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.tracer._push(self)
+        self.start = _clock()
+        self.tracer.start(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.duration = _clock() - self.start
+        self.error = exc_value
+        self.tracer._pop(self)
+        self.tracer.finish(self)
+
+
+class _NullSpan(object):
+    """
+    The span used when no tracer is installed; does nothing as quickly as
+    possible.
+    """
+
+    __slots__ = ()
+
+    recording = False
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer(object):
+    """
+    Base class for tracers. The default implementation tracks the nesting of
+    spans within each thread but otherwise does nothing; override
+    :meth:`start` and/or :meth:`finish` to do something useful with each
+    span.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _push(self, span):
+        try:
+            stack = self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+        if stack:
+            span.parent = stack[-1]
+        stack.append(span)
+
+    def _pop(self, span):
+        stack = self._local.stack
+        # Tolerate spans finishing out of order
+        if stack and stack[-1] is span:
+            stack.pop()
+        else:
+            stack.remove(span)
+
+    def span(self, name, **attrs):
+        """
+        Returns a new :class:`Span` called *name* with the attributes given as
+        keyword arguments.
+        """
+        return Span(self, name, attrs)
+
+    def start(self, span):
+        """
+        Called when *span* starts.
+        """
+        pass
+
+    def finish(self, span):
+        """
+        Called when *span* finishes.
+        """
+        pass
+
+
+class RecordingTracer(Tracer):
+    """
+    A tracer which keeps every finished :class:`Span` in the :attr:`spans`
+    list (in the order they finished). If *limit* is specified, only the most
+    recent *limit* spans are kept.
+
+    .. attribute:: spans
+
+        The list of finished spans.
+    """
+
+    def __init__(self, limit=None):
+        super(RecordingTracer, self).__init__()
+        self._lock = threading.Lock()
+        self.limit = limit
+        self.spans = []
+
+    def finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+            if self.limit is not None and len(self.spans) > self.limit:
+                del self.spans[:len(self.spans) - self.limit]
+
+    def totals(self):
+        """
+        Returns a :class:`dict` mapping span names to a tuple of the number of
+        spans recorded with that name and their total duration.
+        """
+        result = {}
+        with self._lock:
+            for span in self.spans:
+                count, total = result.get(span.name, (0, 0.0))
+                result[span.name] = (count + 1, total + span.duration)
+        return result
+
+
+_tracer = None
+
+
+def set_tracer(tracer):
+    """
+    Installs *tracer* (an instance of :class:`Tracer`) as the global tracer,
+    or removes the current tracer if *tracer* is ``None``.
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    """
+    Returns the currently installed tracer, or ``None``.
+    """
+    return _tracer
+
+
+def span(name, **attrs):
+    """
+    Returns a context manager representing a span called *name* with the
+    attributes given as keyword arguments from the installed tracer. If no
+    tracer is installed, a shared do-nothing span is returned.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, **attrs)
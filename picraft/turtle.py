@@ -38,14 +38,24 @@ str = type('')
 
 import re
 import os
+import sys
 import math
 import inspect
-from threading import Lock, local
-from collections import namedtuple
+import logging
+from array import array
+from threading import Lock, Timer, local
+from collections import namedtuple, deque
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 from .world import World
-from .vector import Vector, O, X, Y, Z, line, filled
+from .vector import Vector, vector_range, O, X, Y, Z, line, filled
 from .block import Block
+from .tracing import span
+
+logger = logging.getLogger('picraft')
 
 
 class TurtleCache(object):
@@ -60,12 +70,35 @@ class TurtleCache(object):
     Requesting the state of blocks will always read from the cache and, if
     a batch is active, from the (as yet uncommitted) changes made by the batch.
     Note that batches are stored in thread-local state.
+
+    Blocks missing from the cache are read in bulk. Against a Raspberry Juice
+    server the whole cube (with sides of *chunk_size* blocks) around each is
+    read with a single ``world.getBlocks`` command (once per cube). That
+    command doesn't report block data, so only the air it finds is cached; any
+    other blocks requested are read with pipelined ``world.getBlockWithData``
+    commands, as are all missing blocks with other servers. Hence, a turtle
+    moving through empty space costs a round-trip every *chunk_size* blocks,
+    rather than one for every block.
+
+    While :attr:`defer` is ``True``, changes that would normally be written to
+    the world are held in memory (and reflected by reads from the cache) until
+    :meth:`flush` is called, which writes the net difference in one compacted
+    batch. If :attr:`interval` is not ``None``, :meth:`flush` is called
+    automatically that many seconds after the first change is held.
+
+    Where several changes to the same block are held, the last one written
+    wins, exactly as if each had been written to the world as it was made.
     """
-    def __init__(self, world):
+    def __init__(self, world, chunk_size=16):
         self._world = world
         self._lock = Lock()
         self._cache = {}
+        self._scanned = set() # chunks whose air has been cached
+        self._deferred = None
+        self._flush_timer = None
         self._batch = local()
+        self.chunk_size = chunk_size
+        self.interval = None
 
     def __enter__(self):
         try:
@@ -81,7 +114,7 @@ class TurtleCache(object):
             state = self._batch.state
             del self._batch.level, self._batch.state
             if exc_type is None:
-                self.__setitem__(state.keys(), state.values())
+                self.write(state)
 
     def __getitem__(self, positions):
         try:
@@ -90,39 +123,157 @@ class TurtleCache(object):
         except AttributeError:
             batch = {} # no active batch
         with self._lock:
-            unknown = set(positions) - set(self._cache.keys()) - set(batch.keys())
+            deferred = self._deferred or {}
+            unknown = {
+                v for v in positions
+                if v not in self._cache and v not in batch and v not in deferred
+                }
             if unknown:
-                self._cache.update({
-                    v: b
-                    for v, b in zip(unknown, self._world.blocks[unknown])
-                    })
+                self._fetch(unknown)
             return {
-                v: batch.get(v, self._cache[v])
+                v: batch.get(v, deferred.get(v, self._cache.get(v)))
                 for v in positions
                 }
 
+    def _fetch(self, positions):
+        # Must be called with the lock held
+        blocks = self._world.blocks
+        if self._world.connection.server_version == 'raspberry-juice':
+            size = self.chunk_size
+            for chunk in {v // size for v in positions} - self._scanned:
+                self._scanned.add(chunk)
+                chunk = vector_range(chunk * size, (chunk + 1) * size)
+                for v, b in zip(chunk, blocks[chunk]):
+                    if b.id == 0:
+                        self._cache.setdefault(v, b)
+            # Anything left is a non-air block in a chunk that's already been
+            # scanned; its data can only be read individually
+            positions = [v for v in positions if v not in self._cache]
+        else:
+            positions = list(positions)
+        if positions:
+            self._cache.update(zip(positions, blocks[positions]))
+
     def __setitem__(self, positions, blocks):
+        self.write(dict(zip(positions, blocks)))
+
+    def write(self, changes):
+        """
+        Apply *changes*, a mapping of vectors to blocks. If a batch is active,
+        the changes are added to it.
+        """
+        if not isinstance(changes, dict):
+            # Iterate over the items of other mappings instead of looking up
+            # each key, which is slow for the packed changes of the history
+            changes = dict(changes.items())
         try:
             # no need for thread lock, as we're updating a thread local
-            self._batch.state.update({v: b for (v, b) in zip(positions, blocks)})
+            batch = self._batch.state
         except AttributeError:
             with self._lock:
-                diff = {
-                    v: b
-                    for v, b in zip(positions, blocks)
-                    if b != self._cache[v]
-                    }
-                with self._world.connection.batch_start():
-                    self._world.blocks[diff.keys()] = diff.values()
-                self._cache.update(diff)
+                if self._deferred is None:
+                    self._write(changes)
+                else:
+                    self._defer(changes)
+        else:
+            batch.update(changes)
+
+    def _defer(self, changes):
+        # Must be called with the lock held
+        self._deferred.update(changes)
+        if self.interval is not None and self._flush_timer is None:
+            self._flush_timer = Timer(self.interval, self._flush_later)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_later(self):
+        """
+        Called by the timer started in :meth:`_defer` to write the held changes
+        once :attr:`interval` has elapsed.
+        """
+        with self._lock:
+            self._flush_timer = None
+            if self.interval is not None and self._deferred:
+                try:
+                    self._flush()
+                except Exception:
+                    logger.exception('failed to write held turtle changes')
+
+    def _flush(self):
+        # Must be called with the lock held
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        deferred, self._deferred = self._deferred, {}
+        try:
+            # Held changes may cover many scattered blocks, so merge them into
+            # setBlocks commands where possible
+            self._write(deferred, compact=True)
+        except Exception:
+            # Hold the changes again so the next flush retries them (anything
+            # held since is more recent, so it wins)
+            deferred.update(self._deferred)
+            self._deferred = deferred
+            raise
+
+    def _write(self, changes, compact=False):
+        # Must be called with the lock held
+        unknown = {v for v in changes if v not in self._cache}
+        if unknown:
+            self._fetch(unknown)
+        diff = {v: b for v, b in changes.items() if b != self._cache[v]}
+        if diff:
+            with self._world.connection.batch_start(compact=compact):
+                self._world.blocks[diff.keys()] = diff.values()
+            self._cache.update(diff)
+
+    def _get_defer(self):
+        return self._deferred is not None
+    def _set_defer(self, value):
+        with self._lock:
+            if value:
+                if self._deferred is None:
+                    self._deferred = {}
+            elif self._deferred is not None:
+                self._flush()
+                self._deferred = None
+    defer = property(_get_defer, _set_defer, doc="""\
+        When ``True``, changes are held in memory until :meth:`flush` is
+        called. Setting this to ``False`` flushes any held changes.
+        """)
+
+    def flush(self):
+        """
+        Write any changes held while :attr:`defer` is ``True`` to the world.
+        Only blocks which differ from their known state are written, so a
+        block drawn and later erased costs nothing.
+        """
+        with self._lock:
+            if self._deferred:
+                self._flush()
 
 
 class TurtleScreen(object):
+    """
+    The world that one or more turtles draw upon.
+
+    By default every turtle action is written to the world as it happens.
+    When many turtles share a screen (typically each driven by its own
+    thread) set :attr:`interval` to a number of seconds; the changes made by
+    all turtles are then merged in memory and written in one compacted batch
+    at most every *interval* seconds. Where turtles write to the same block
+    within an interval, the last write wins, so the result is the same as if
+    each change had been written immediately.
+    """
     def __init__(self, world=None):
         if world is None:
             world = _default_world()
         self._world = world
         self._blocks = TurtleCache(world)
+        self._sprites = []
+        self._tracer = 1
+        self._updates = 0
+        self._interval = None
 
     @property
     def world(self):
@@ -132,8 +283,91 @@ class TurtleScreen(object):
     def blocks(self):
         return self._blocks
 
+    @property
+    def tracing(self):
+        """
+        Returns ``True`` if turtle changes are drawn to the world immediately,
+        and ``False`` if they are deferred until :meth:`update`.
+        """
+        return self._tracer == 1
+
+    def _get_interval(self):
+        return self._interval
+    def _set_interval(self, value):
+        if value is not None and value <= 0:
+            raise ValueError('interval must be greater than 0')
+        self._interval = value
+        self._configure()
+    interval = property(_get_interval, _set_interval, doc="""\
+        The number of seconds between writes of the merged changes of all
+        turtles on the screen, or ``None`` (the default) to write each change
+        as it happens. Ignored while :meth:`tracer` is turned off.
+        """)
+
+    def _configure(self):
+        if self.tracing:
+            self._blocks.interval = self._interval
+            self._blocks.defer = self._interval is not None
+        else:
+            self._blocks.interval = None
+            self._blocks.defer = True
+
     def draw(self, state):
-        self.blocks[state.keys()] = state.values()
+        """
+        Draw *state*, a mapping of vectors to blocks, on the screen.
+        """
+        self._blocks.write(state)
+
+    def tracer(self, n=None):
+        """
+        :param int n: nonnegative integer
+
+        Turn turtle animation on or off. If *n* is 1 (the default), every
+        turtle action is drawn in the world as it happens. If *n* is 0, turtles
+        are not drawn and their changes are held in memory until
+        :meth:`update` is called, which writes the net result in a single
+        batch. Otherwise, only every *n*-th turtle action updates the world.
+        When called without arguments, returns the current value of *n*::
+
+            >>> tracer(0)
+            >>> for i in range(100):
+            ...     fd(i)
+            ...     rt(90)
+            ...
+            >>> update()
+
+        As drawing now costs no round-trips to the server, this can make
+        complex drawings many times faster.
+        """
+        if n is None:
+            return self._tracer
+        n = int(n)
+        if n < 0:
+            raise ValueError('n must be 0 or greater')
+        self._tracer = n
+        self._updates = 0
+        if n == 1:
+            self.update()
+        self._configure()
+
+    def update(self):
+        """
+        Draw any turtle changes held while :meth:`tracer` is turned off, along
+        with the turtles themselves.
+        """
+        with span('turtle.screen.update'):
+            with self._blocks:
+                for sprite in self._sprites:
+                    sprite.show()
+            self._blocks.flush()
+            self._updates = 0
+
+    def _count(self):
+        # Called by sprites after each action
+        if self._tracer > 1:
+            self._updates += 1
+            if self._updates >= self._tracer:
+                self.update()
 
 
 TurtleState = namedtuple('TurtleState', (
@@ -145,9 +379,215 @@ TurtleState = namedtuple('TurtleState', (
     'penblock',  # Block
     'fillblock', # Block
     'changed',   # Vector->Block map
-    'action',    # home/move/draw/begin_fill/end_fill/turtle
+    'action',    # home/move/draw/begin-fill/end-fill/turtle
     ))
 
+
+class _PackedChanges(Mapping):
+    """
+    A compact, read-only mapping of vectors to blocks, used to store the
+    reverse diffs in a :class:`TurtleHistory`. Each entry is stored as five
+    integers (x, y, z, id, data) in an :class:`array.array`, rather than as
+    a dictionary entry referencing two named tuples.
+
+    Raises :exc:`TypeError` if any of the coordinates in *changes* are not
+    integers.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, changes=None):
+        self._data = array(str('i'))
+        if changes:
+            for v, b in changes.items():
+                self._data.extend((v.x, v.y, v.z, b.id, b.data))
+
+    def __len__(self):
+        return len(self._data) // 5
+
+    def __iter__(self):
+        data = self._data
+        for i in range(0, len(data), 5):
+            yield Vector(data[i], data[i + 1], data[i + 2])
+
+    def __getitem__(self, key):
+        data = self._data
+        for i in range(0, len(data), 5):
+            if (data[i], data[i + 1], data[i + 2]) == key:
+                return Block(data[i + 3], data[i + 4])
+        raise KeyError(key)
+
+    def values(self):
+        data = self._data
+        return [
+            Block(data[i + 3], data[i + 4])
+            for i in range(0, len(data), 5)
+            ]
+
+    def items(self):
+        return list(zip(self, self.values()))
+
+
+class TurtleHistory(object):
+    """
+    The undo buffer of a turtle, holding the *start* state and up to *maxlen*
+    subsequent states (actions), each with the reverse diff needed to undo it
+    stored in packed form.
+
+    When the buffer is full, the oldest action is evicted. Evicted actions
+    can no longer be undone, but their reverse diffs are merged (keeping only
+    the original block at each position) so that :meth:`reset` can still
+    restore the world to its state before the turtle appeared. Hence, the
+    memory used grows with the area drawn over, not the number of actions.
+
+    Actions which draw the turtle itself (``'turtle'``) at the end of the
+    buffer are never evicted as they must always be undone. The position of
+    fill markers within the buffer is tracked separately so that
+    :attr:`filling` is answered without scanning the buffer.
+    """
+
+    def __init__(self, start, maxlen=1000):
+        self._start = start
+        self._maxlen = maxlen
+        self._floor = start
+        self._entries = deque() # (seq, state) tuples
+        self._seq = 0
+        self._marks = deque()   # (seq, action) of the fill markers in entries
+        self._base = {}         # merged reverse diffs of evicted entries
+        self._fill = None       # (start, nodes) of an evicted begin-fill
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        for seq, state in self._entries:
+            yield state
+
+    def __reversed__(self):
+        for seq, state in reversed(self._entries):
+            yield state
+
+    @property
+    def start(self):
+        """
+        The initial state of the turtle.
+        """
+        return self._start
+
+    @property
+    def last(self):
+        """
+        The most recent state in the buffer. When the buffer is empty this
+        is the start state, or the state after the last evicted action (in
+        which case its action is ``'home'`` as it cannot be undone).
+        """
+        try:
+            return self._entries[-1][1]
+        except IndexError:
+            return self._floor
+
+    @property
+    def maxlen(self):
+        """
+        The maximum number of actions the buffer will hold (excluding the
+        start state and the turtle itself).
+        """
+        return self._maxlen
+
+    @property
+    def filling(self):
+        """
+        ``True`` if the last fill marker appended was ``'begin-fill'``.
+        """
+        if self._marks:
+            return self._marks[-1][1] == 'begin-fill'
+        return self._fill is not None
+
+    def append(self, state):
+        """
+        Append *state* to the buffer, evicting the oldest action if the
+        buffer is full.
+        """
+        try:
+            changed = _PackedChanges(state.changed)
+        except TypeError:
+            # Non-integer positions can't be packed
+            changed = dict(state.changed)
+        self._entries.append((self._seq, state._replace(changed=changed)))
+        if state.action in ('begin-fill', 'end-fill'):
+            self._marks.append((self._seq, state.action))
+        self._seq += 1
+        self._evict(self._maxlen)
+
+    def pop(self):
+        """
+        Remove and return the most recent state in the buffer. Raises
+        :exc:`IndexError` if the buffer is empty.
+        """
+        seq, state = self._entries.pop()
+        if self._marks and self._marks[-1][0] == seq:
+            self._marks.pop()
+        return state
+
+    def resize(self, maxlen):
+        """
+        Evict all actions from the buffer, and set :attr:`maxlen` to
+        *maxlen*.
+        """
+        self._evict(0)
+        self._maxlen = maxlen
+
+    def reset(self):
+        """
+        Forget all evicted actions, returning the merged reverse diff of
+        them. This is used, after undoing all actions remaining in the buffer,
+        to restore the world to its state before the turtle appeared.
+        """
+        assert not self._entries
+        result, self._base = self._base, {}
+        self._floor = self._start
+        self._fill = None
+        return result
+
+    def fill_path(self):
+        """
+        If a fill is in progress (see :attr:`filling`), returns a tuple of the
+        position at which it began and the set of positions drawn since.
+        Otherwise returns ``None``.
+        """
+        if not self.filling:
+            return None
+        nodes = set()
+        for seq, state in reversed(self._entries):
+            if state.action == 'begin-fill':
+                return state.position, nodes
+            elif state.action == 'draw':
+                nodes.update(state.changed.keys())
+        start, evicted = self._fill
+        return start, nodes | evicted
+
+    def _evict(self, maxlen):
+        # Trailing turtle actions don't count toward the limit, and are
+        # never evicted
+        count = len(self._entries)
+        for seq, state in reversed(self._entries):
+            if state.action != 'turtle':
+                break
+            count -= 1
+        while count > maxlen:
+            count -= 1
+            seq, state = self._entries.popleft()
+            for v, b in state.changed.items():
+                self._base.setdefault(v, b)
+            if self._marks and self._marks[0][0] == seq:
+                self._marks.popleft()
+            if state.action == 'begin-fill':
+                self._fill = (state.position, set())
+            elif state.action == 'end-fill':
+                self._fill = None
+            elif state.action == 'draw' and self._fill is not None:
+                self._fill[1].update(state.changed.keys())
+            self._floor = state._replace(changed={}, action='home')
+
 clamp = lambda value, min_value, max_value: min(max_value, max(min_value, value))
 
 
@@ -166,8 +606,10 @@ class TurtleSprite(object):
             action='home',
             )
         self.last_position = self.state.position
-        self.history = [self.state] # undo buffer
-        self.draw()
+        self.history = TurtleHistory(self.state) # undo buffer
+        screen._sprites.append(self)
+        if screen.tracing:
+            self.draw()
 
     def draw_vectors(self):
         """
@@ -197,6 +639,14 @@ class TurtleSprite(object):
             state[self.state.position] = self.state.penblock
         self.commit(state, 'turtle')
 
+    def show(self):
+        """
+        Draw the turtle if it is visible and isn't already drawn.
+        """
+        if self.state.visible and not (
+                self.history and self.history.last.action == 'turtle'):
+            self.draw()
+
     def undraw(self):
         """
         If the last action in the undo history is "turtle" (indicating that the
@@ -204,7 +654,7 @@ class TurtleSprite(object):
         affected blocks to their prior state.
         """
         with self.screen.blocks:
-            while self.history and self.history[-1].action == 'turtle':
+            while self.history and self.history.last.action == 'turtle':
                 self.screen.draw(self.history.pop().changed)
 
     def commit(self, changes, action):
@@ -227,22 +677,25 @@ class TurtleSprite(object):
         recorded position to the undo history as a line (if the pen is down) or
         a move (if it's not).
         """
-        with self.screen.blocks, self:
+        with span('turtle.update') as s, self.screen.blocks, self:
             if self.state.pendown and self.state.position != self.last_position:
+                s.set(action='draw')
                 self.commit({
                     v: self.state.penblock
                     for v in line(self.last_position, self.state.position)
                     }, 'draw')
             else:
+                s.set(action='move')
                 self.commit({}, 'move')
         self.last_position = self.state.position
+        self.screen._count()
 
     def __enter__(self):
         self.undraw()
         return self
 
     def __exit__(self, exc_type, exc_value, exc_tb):
-        if self.state.visible:
+        if self.state.visible and self.screen.tracing:
             self.draw()
 
 
@@ -285,7 +738,26 @@ class Turtle(object):
             >>> while turtle.undobufferentries():
             ...     turtle.undo()
         """
-        return len(self._sprite.history) - 1 # ignore "home" action
+        # ignore the turtle's own drawing
+        return sum(
+            1 for state in self._sprite.history
+            if state.action != 'turtle'
+            )
+
+    def setundobuffer(self, size):
+        """
+        Set or disable the undobuffer. If *size* is an integer, an empty
+        undobuffer of the given size is installed. *size* gives the maximum
+        number of turtle actions that can be undone by the :meth:`undo`
+        method. If *size* is ``None``, the undobuffer is disabled::
+
+            >>> turtle.setundobuffer(42)
+
+        The undobuffer holds 1000 actions by default. Actions which no longer
+        fit in it can't be undone, but are still reverted by :meth:`clear`
+        and :meth:`reset`.
+        """
+        self._sprite.history.resize(0 if size is None else size)
 
     def undo(self):
         """
@@ -299,9 +771,9 @@ class Turtle(object):
             ...     turtle.undo()
         """
         with self._screen.blocks, self._sprite:
-            if self._sprite.history[-1].action != 'home':
+            if self._sprite.history.last.action != 'home':
                 self._screen.draw(self._sprite.history.pop().changed)
-                self._sprite.state = self._sprite.history[-1]
+                self._sprite.state = self._sprite.history.last
                 self._sprite.last_position = self._sprite.state.position
 
     def home(self):
@@ -326,7 +798,7 @@ class Turtle(object):
             0.0
         """
         self._sprite.state = self._sprite.state._replace(
-            position=self._sprite.history[0].position,
+            position=self._sprite.history.start.position,
             heading=Z,
             elevation=0.0,
             )
@@ -334,14 +806,15 @@ class Turtle(object):
 
     def clear(self):
         with self._screen.blocks:
-            while self._sprite.history[-1].action != 'home':
+            while self._sprite.history:
                 self._screen.draw(self._sprite.history.pop().changed)
+            self._screen.draw(self._sprite.history.reset())
             self._sprite.update()
 
     def reset(self):
         with self._screen.blocks:
             self.clear()
-            self._sprite.last_position = self._sprite.history[0].position
+            self._sprite.last_position = self._sprite.history.start.position
             self.home()
 
     def pos(self):
@@ -854,12 +1327,7 @@ class Turtle(object):
         fill state (``True`` if filling, ``False`` otherwise).
         """
         if flag is None:
-            for state in reversed(self._sprite.history):
-                if state.action == 'end-fill':
-                    return False
-                elif state.action == 'begin-fill':
-                    return True
-            return False
+            return self._sprite.history.filling
         elif flag:
             self.begin_fill()
         else:
@@ -879,22 +1347,18 @@ class Turtle(object):
         Equivalent to ``fill(False)``.
         """
         with self._screen.blocks, self._sprite:
-            fill_nodes = set()
-            for state in reversed(self._sprite.history):
-                if state.action == 'begin-fill':
-                    break
-                elif state.action == 'end-fill':
-                    # ending fill before starting one
-                    return
-                elif state.action == 'draw':
-                    fill_nodes |= state.changed.keys()
+            path = self._sprite.history.fill_path()
+            if path is None:
+                # ending fill before starting one
+                return
+            start, fill_nodes = path
             # fill in the last edge if the begin and end positions differ
-            if state.position != self._sprite.state.position:
-                fill_nodes |= set(line(self._sprite.state.position, state.position))
+            if start != self._sprite.state.position:
+                fill_nodes |= set(line(self._sprite.state.position, start))
             self._sprite.commit({
                 v: self._sprite.state.fillblock
                 for v in set(filled(fill_nodes)) - fill_nodes
-                }, 'end_fill')
+                }, 'end-fill')
 
     position = pos
     setpos = goto
@@ -975,21 +1439,22 @@ def _default_player():
 
 def _method_to_func(name, method, factory):
     """
-    Creates a procedural variant of *method* on the instance returned by
-    calling *factory*.
+    Returns a procedural variant of *method* (called *name*) which calls the
+    method on the instance returned by calling *factory*.
     """
-    template = """\
-def {name}{defargs}:
-    return {factory}().{name}{callargs}"""
-    spec = inspect.getargspec(method)
-    defargs = inspect.formatargspec(spec.args[1:], spec.varargs, spec.keywords, spec.defaults)
-    callargs = inspect.formatargspec(spec.args[1:], spec.varargs, spec.keywords, ())
-    exec(template.format(
-        name=name,
-        defargs=defargs,
-        callargs=callargs,
-        factory=factory.__name__,
-        ), globals())
+    def func(*args, **kwargs):
+        return getattr(factory(), name)(*args, **kwargs)
+    func.__name__ = name
+    if hasattr(func, '__qualname__'):
+        func.__qualname__ = name
+    try:
+        signature = inspect.signature(method)
+    except AttributeError:
+        # Py2 compat; the signature is only used for documentation
+        pass
+    else:
+        func.__signature__ = signature.replace(
+            parameters=list(signature.parameters.values())[1:])
     # If the method has a doc-string, copy it to the new function ... but only
     # when the method isn't an alias (name==method.__name__) or we're not
     # building the picraft docs (in which we don't want to repeat all the docs
@@ -997,21 +1462,77 @@ def {name}{defargs}:
     if method.__doc__ is not None:
         if 'PICRAFTDOCS' not in os.environ or name == method.__name__:
             # Replace "turtle." in all the examples with a blank string
-            globals()[name].__doc__ = re.sub(
+            func.__doc__ = re.sub(
                 r'^( *(?:>>>|\.\.\.).*)turtle\.', r'\1',
                 method.__doc__, flags=re.MULTILINE)
+    return func
+
+_FUNCS = {} # Maps procedural function names to (class, factory) tuples
 
 def _classes_to_funcs():
     """
-    Uses :func:`_method_to_func` to construct procedural variants of the
-    :class:`Turtle`, :class:`TurtleScreen`, and :class:`TurtlePlayer` class'
-    methods.
+    Fills :data:`_FUNCS` with the names of the procedural variants of the
+    :class:`Turtle` and :class:`TurtlePlayer` class' methods, and the
+    animation control methods of :class:`TurtleScreen`. The functions
+    themselves are constructed by :func:`_get_func` when first accessed.
     """
     for method in dir(Turtle):
         if not method.startswith('_'):
-            _method_to_func(method, getattr(Turtle, method), _default_turtle)
+            _FUNCS[method] = (Turtle, _default_turtle)
     for method in dir(TurtlePlayer):
         if not method.startswith('_'):
-            _method_to_func(method, getattr(TurtlePlayer, method), _default_player)
+            _FUNCS[method] = (TurtlePlayer, _default_player)
+    for method in dir(TurtleScreen):
+        if method in ('tracer', 'update'):
+            _FUNCS[method] = (TurtleScreen, _default_screen)
+
+def _get_func(name):
+    """
+    Uses :func:`_method_to_func` to construct the procedural function *name*,
+    storing it in the module's namespace so that it's only built once.
+    """
+    try:
+        cls, factory = _FUNCS[name]
+    except KeyError:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name))
+    func = _method_to_func(name, getattr(cls, name), factory)
+    globals()[name] = func
+    return func
 
 _classes_to_funcs()
+
+# "from picraft.turtle import *" exports the public classes, the procedural
+# functions (which must be listed here, as it doesn't consult __getattr__), and
+# the picraft names that turtle scripts have always been able to rely on
+__all__ = sorted(set(_FUNCS) | {
+    'Turtle',
+    'TurtleCache',
+    'TurtleHistory',
+    'TurtlePlayer',
+    'TurtleScreen',
+    'TurtleSprite',
+    'TurtleState',
+    'World',
+    'Vector',
+    'Block',
+    'O',
+    'X',
+    'Y',
+    'Z',
+    'line',
+    'filled',
+    })
+
+if sys.version_info >= (3, 7):
+    # Build the procedural functions on demand (PEP 562); this keeps the
+    # import of the module fast
+    def __getattr__(name):
+        return _get_func(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(_FUNCS))
+else:
+    for name in _FUNCS:
+        _get_func(name)
+    del name
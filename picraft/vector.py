@@ -105,6 +105,12 @@ filled
 ======
 
 .. autofunction:: filled
+
+
+cuboids
+=======
+
+.. autofunction:: cuboids
 """
 
 from __future__ import (
@@ -119,7 +125,12 @@ from .compat import range
 
 import math
 from functools import total_ordering
-from collections import namedtuple, Sequence
+from collections import namedtuple
+try:
+    from collections.abc import Sequence
+except ImportError:
+    # Py2 compat
+    from collections import Sequence
 try:
     from itertools import zip_longest, islice, tee
 except ImportError:
@@ -869,21 +880,12 @@ class vector_range(Sequence):
         ranges = self._ranges
         i, j, k = (getattr(value, axis) for axis in self.order)
         try:
-            i_indexes = set(rmod(len(ranges[0]), ranges[0].index(i), range(len(self))))
-            j_indexes = set(
-                    b
-                    for a in rmod(len(ranges[1]), ranges[1].index(j),
-                        range(len(self) // len(ranges[0])))
-                    for b in rdiv(len(ranges[0]), a)
-                    )
-            k_indexes = set(rdiv(len(ranges[0]) * len(ranges[1]), ranges[2].index(k)))
-            result = i_indexes & j_indexes & k_indexes
-            assert len(result) == 1
-            result = next(iter(result))
+            # Inverse of the calculation in __getitem__; range.index is O(1)
+            # so this is too
+            return ranges[0].index(i) + len(ranges[0]) * (
+                ranges[1].index(j) + len(ranges[1]) * ranges[2].index(k))
         except ValueError:
             raise ValueError('%r is not in range' % (value,))
-        else:
-            return result
 
     def count(self, value):
         """
@@ -1293,3 +1295,53 @@ def filled(points):
                 result_len += 1
                 yield l
 
+
+
+def cuboids(points):
+    """
+    Generator function which yields :class:`vector_range` instances that
+    together contain exactly the specified *points*, with no overlap.
+
+    This is useful for reducing the number of commands required to draw a
+    large collection of blocks, as each resulting range can be drawn with a
+    single assignment regardless of its size. For example, a filled square
+    yields a single range, while an "L" shape yields two::
+
+        >>> list(cuboids(vector_range(Vector(2, 1, 2))))
+        [vector_range(Vector(x=2, y=1, z=2), order='zxy')]
+        >>> list(cuboids([O, X, 2*X, Z, 2*Z]))
+        [vector_range(Vector(x=3, y=1, z=1), order='zxy'),
+         vector_range(Vector(x=0, y=0, z=1), Vector(x=1, y=1, z=3), order='zxy')]
+
+    The *points* must be integer vectors; duplicates are ignored. A simple
+    greedy algorithm is used: starting from the lowest remaining point (by
+    Y, then Z, then X) each box is extended as far as possible along the
+    X-axis, then the Z-axis, then the Y-axis. The result is not guaranteed to
+    be the smallest possible number of ranges, but is typically close.
+    """
+    remaining = set(points)
+    for p in sorted(remaining, key=lambda v: (v.y, v.z, v.x)):
+        if p not in remaining:
+            continue
+        x, y, z = p
+        x_stop = x + 1
+        while Vector(x_stop, y, z) in remaining:
+            x_stop += 1
+        x_range = range(x, x_stop)
+        z_stop = z + 1
+        while all(Vector(i, y, z_stop) in remaining for i in x_range):
+            z_stop += 1
+        z_range = range(z, z_stop)
+        y_stop = y + 1
+        while all(
+                Vector(i, y_stop, k) in remaining
+                for i in x_range
+                for k in z_range):
+            y_stop += 1
+        remaining.difference_update(
+            Vector(i, j, k)
+            for i in x_range
+            for j in range(y, y_stop)
+            for k in z_range
+            )
+        yield vector_range(p, Vector(x_stop, y_stop, z_stop))
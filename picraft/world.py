@@ -54,6 +54,13 @@ Checkpoint
     :members:
 
 
+Snapshot
+========
+
+.. autoclass:: Snapshot
+    :members:
+
+
 Camera
 ======
 
@@ -70,12 +77,20 @@ from __future__ import (
 str = type('')
 
 
+import io
+import sys
+import gzip
+import struct
+from array import array
+
 from .exc import NotSupported
+from .compat import array_to_bytes, array_from_bytes
 from .connection import Connection
 from .player import HostPlayer, Players
-from .block import Blocks
-from .vector import Vector, vector_range
+from .block import Block, Blocks
+from .vector import Vector, vector_range, cuboids
 from .events import Events
+from .tracing import span
 
 
 class World(object):
@@ -110,6 +125,7 @@ class World(object):
         self._blocks = Blocks(self._connection)
         self._height = WorldHeight(self._connection)
         self._checkpoint = Checkpoint(self._connection)
+        self._snapshots = {}
         self._camera = Camera(self._connection)
         self._events = Events(self._connection)
 
@@ -323,6 +339,52 @@ class World(object):
         """
         return self._checkpoint
 
+    @property
+    def snapshots(self):
+        """
+        A dictionary of the named snapshots taken with :meth:`snapshot` or
+        loaded with :meth:`load_snapshot`. Entries may be added or removed
+        freely::
+
+            >>> world.snapshot(vector_range(Vector(-10, 0, -10), Vector(10, 10, 10)), 'garden')
+            <Snapshot vrange=...>
+            >>> world.blocks[Vector()] = Block.from_name('stone')
+            >>> world.snapshots['garden'].restore()
+            >>> del world.snapshots['garden']
+        """
+        return self._snapshots
+
+    def snapshot(self, vrange, name=None):
+        """
+        Returns a :class:`Snapshot` of the blocks within *vrange* (a
+        :class:`~picraft.vector.vector_range`). If *name* is specified, the
+        snapshot is also stored under that name in :attr:`snapshots`.
+
+        Unlike :attr:`checkpoint`, snapshots work with any server, any number
+        may be held at once, and restoring one only affects its region::
+
+            >>> v = world.player.tile_pos
+            >>> s = world.snapshot(vector_range(v - 5, v + 5))
+            >>> world.blocks[v - 5:v + 5] = Block.from_name('air')
+            >>> s.restore()
+        """
+        result = Snapshot.from_world(self, vrange)
+        if name is not None:
+            self._snapshots[name] = result
+        return result
+
+    def load_snapshot(self, filename_or_object, name=None):
+        """
+        Returns a :class:`Snapshot` read from *filename_or_object* (previously
+        written by :meth:`Snapshot.save`), which will restore to this world. If
+        *name* is specified, the snapshot is also stored under that name in
+        :attr:`snapshots`.
+        """
+        result = Snapshot.load(self, filename_or_object)
+        if name is not None:
+            self._snapshots[name] = result
+        return result
+
     def say(self, message):
         """
         Displays *message* in the game's chat console.
@@ -405,15 +467,19 @@ class WorldHeight(object):
         return '<WorldHeight>'
 
     def __getitem__(self, index):
-        if isinstance(index, slice):
-            return [
-                Vector(v.x, int(self._connection.transact(
-                    'world.getHeight(%d,%d)' % (v.x, v.z))), v.z)
-                for v in vector_range(index.start, index.stop)
-                ]
-        else:
-            return Vector(index.x, int(self._connection.transact(
-                'world.getHeight(%d,%d)' % (index.x, index.z))), index.z)
+        with span('height.get') as s:
+            if isinstance(index, slice):
+                result = [
+                    Vector(v.x, int(self._connection.transact(
+                        'world.getHeight(%d,%d)' % (v.x, v.z))), v.z)
+                    for v in vector_range(index.start, index.stop)
+                    ]
+                s.set(count=len(result))
+            else:
+                result = Vector(index.x, int(self._connection.transact(
+                    'world.getHeight(%d,%d)' % (index.x, index.z))), index.z)
+                s.set(count=1)
+            return result
 
 
 class Checkpoint(object):
@@ -497,6 +563,188 @@ class Checkpoint(object):
             self.restore()
 
 
+class Snapshot(object):
+    """
+    A copy of the blocks within a region of the world.
+
+    Instances of this class are returned by :meth:`World.snapshot` and
+    :meth:`World.load_snapshot`. The blocks are held compactly (three bytes
+    per block) in the order of :attr:`vrange`, and can be queried by
+    :class:`~picraft.vector.Vector`. The :meth:`restore` method writes the
+    saved blocks back to the world, and :meth:`save` writes the snapshot to a
+    compressed file.
+
+    Like :class:`Checkpoint`, this class can be used as a context manager to
+    roll back modifications to its region if an exception occurs::
+
+        >>> with world.snapshot(vector_range(Vector(-5, 0, -5), Vector(5, 5, 5))):
+        ...     world.blocks[Vector()] = Block.from_name('stone')
+        ...     raise Exception()
+
+    .. note::
+
+        Raspberry Juice's ``world.getBlocks`` command doesn't report block
+        data, so against that server the blocks in the region which aren't air
+        are re-read with (pipelined) ``world.getBlockWithData`` commands.
+        Taking or restoring a snapshot of a mostly solid region is therefore
+        slower than that of a mostly empty one.
+    """
+
+    _MAGIC = b'PICRAFT-SNAPSHOT-1\n'
+    _HEADER = struct.Struct(str('<9i3sI'))
+
+    def __init__(self, world, vrange, ids, data):
+        if not (len(vrange) == len(ids) == len(data)):
+            raise ValueError('vrange, ids and data must be the same length')
+        self._world = world
+        self._vrange = vrange
+        self._ids = ids
+        self._data = data
+
+    def __repr__(self):
+        return '<Snapshot vrange=%r>' % (self._vrange,)
+
+    def __len__(self):
+        return len(self._vrange)
+
+    def __iter__(self):
+        for id, data in zip(self._ids, self._data):
+            yield Block.from_id(id, data)
+
+    def __contains__(self, value):
+        return value in self._vrange
+
+    def __getitem__(self, index):
+        try:
+            i = self._vrange.index(index)
+        except ValueError:
+            raise KeyError(index)
+        return Block.from_id(self._ids[i], self._data[i])
+
+    @classmethod
+    def from_world(cls, world, vrange):
+        """
+        Returns a new snapshot of the blocks within *vrange* in *world*.
+        """
+        ids, data = cls._read(world, vrange)
+        return cls(world, vrange, ids, data)
+
+    @staticmethod
+    def _read(world, vrange):
+        blocks = world.blocks[vrange]
+        if world.connection.server_version == 'raspberry-juice':
+            # world.getBlocks doesn't report block data; re-read anything
+            # that isn't air
+            solid = [i for i, block in enumerate(blocks) if block.id]
+            if solid:
+                for i, block in zip(
+                        solid, world.blocks[[vrange[i] for i in solid]]):
+                    blocks[i] = block
+        return (
+            array(str('H'), (block.id for block in blocks)),
+            array(str('B'), (block.data for block in blocks)),
+            )
+
+    @property
+    def vrange(self):
+        """
+        The :class:`~picraft.vector.vector_range` covered by the snapshot.
+        """
+        return self._vrange
+
+    def restore(self):
+        """
+        Restore the world's blocks within :attr:`vrange` to their state when
+        the snapshot was taken.
+
+        The region is read in bulk, and only the blocks which differ from the
+        snapshot are written. Differing blocks are grouped into as few boxes as
+        possible (see :func:`~picraft.vector.cuboids`), each of which is
+        written with a single ``world.setBlocks`` command. The commands are
+        transmitted together in a single batch, so this method cannot be
+        called while a batch is active.
+        """
+        ids, data = self._read(self._world, self._vrange)
+        changes = {}
+        for i, (old_id, old_data, new_id, new_data) in enumerate(
+                zip(self._ids, self._data, ids, data)):
+            if old_id != new_id or old_data != new_data:
+                changes.setdefault((old_id, old_data), []).append(
+                    self._vrange[i])
+        with self._world.connection.batch_start():
+            for (id, data), points in sorted(changes.items()):
+                block = Block.from_id(id, data)
+                for box in cuboids(points):
+                    self._world.blocks[box] = block
+
+    def save(self, filename_or_object):
+        """
+        Write the snapshot to *filename_or_object*, compressed with gzip. The
+        snapshot can be read back with :meth:`World.load_snapshot`.
+        """
+        if isinstance(filename_or_object, str):
+            stream = gzip.open(filename_or_object, 'wb')
+        else:
+            stream = gzip.GzipFile(fileobj=filename_or_object, mode='wb')
+        ids = array(str('H'), self._ids)
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        vrange = self._vrange
+        with stream:
+            stream.write(self._MAGIC)
+            stream.write(self._HEADER.pack(
+                vrange.start.x, vrange.start.y, vrange.start.z,
+                vrange.stop.x, vrange.stop.y, vrange.stop.z,
+                vrange.step.x, vrange.step.y, vrange.step.z,
+                vrange.order.encode('ascii'), len(vrange)))
+            stream.write(array_to_bytes(ids))
+            stream.write(array_to_bytes(self._data))
+
+    @classmethod
+    def load(cls, world, filename_or_object):
+        """
+        Returns a snapshot, which will restore to *world*, read from
+        *filename_or_object* (previously written by :meth:`save`).
+        """
+        if isinstance(filename_or_object, str):
+            stream = gzip.open(filename_or_object, 'rb')
+        else:
+            stream = gzip.GzipFile(fileobj=filename_or_object, mode='rb')
+        with stream:
+            try:
+                magic = stream.read(len(cls._MAGIC))
+            except (IOError, EOFError):
+                magic = None
+            if magic != cls._MAGIC:
+                raise ValueError('not a picraft snapshot')
+            header = stream.read(cls._HEADER.size)
+            if len(header) != cls._HEADER.size:
+                raise ValueError('truncated snapshot')
+            header = cls._HEADER.unpack(header)
+            vrange = vector_range(
+                Vector(*header[0:3]), Vector(*header[3:6]),
+                Vector(*header[6:9]), header[9].decode('ascii'))
+            count = header[10]
+            if count != len(vrange):
+                raise ValueError('corrupt snapshot')
+            ids = array(str('H'))
+            data = array(str('B'))
+            array_from_bytes(ids, stream.read(count * ids.itemsize))
+            array_from_bytes(data, stream.read(count))
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        if not (len(ids) == len(data) == count):
+            raise ValueError('truncated snapshot')
+        return cls(world, vrange, ids, data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if exc_type is not None:
+            self.restore()
+
+
 class Camera(object):
     """
     This class implements the :attr:`~picraft.world.World.camera` attribute.
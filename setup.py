@@ -86,6 +86,7 @@ __requires__ = [
 __extra_requires__ = {
     'doc':   ['sphinx'],
     'test':  ['pytest', 'coverage', 'mock'],
+    'numpy': ['numpy'],
     }
 
 if sys.version_info[:2] == (3, 2):
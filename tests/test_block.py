@@ -39,6 +39,7 @@ str = type('')
 import pytest
 import warnings
 import io
+from array import array
 import picraft.block
 from picraft import Block, Vector, X, O, line, vector_range, EmptySliceWarning
 try:
@@ -127,32 +128,138 @@ def test_blocks_get_vrange():
     v_from = Vector(1, 2, 3)
     v_to = Vector(2, 3, 5)
     conn = mock.MagicMock()
-    conn.transact.return_value = '1,1'
+    commands = []
+    def transact_many(bufs):
+        bufs = list(bufs)
+        commands.extend(bufs)
+        return ['1,1' for buf in bufs]
+    conn.transact_many.side_effect = transact_many
     assert picraft.block.Blocks(conn)[v_from:v_to] == [
             Block(1, 1) for v in vector_range(v_from, v_to)]
-    for v in vector_range(v_from, v_to):
-        conn.transact.assert_any_call(
-                'world.getBlockWithData(%d,%d,%d)' % (v.x, v.y, v.z))
+    assert commands == [
+            'world.getBlockWithData(%d,%d,%d)' % (v.x, v.y, v.z)
+            for v in vector_range(v_from, v_to)]
+    assert not conn.transact.called
 
 def test_blocks_get_vrange_fast():
     v_from = Vector(1, 2, 3)
     v_to = Vector(2, 3, 5)
     conn = mock.MagicMock()
     conn.server_version = 'raspberry-juice'
-    conn.transact.return_value = '1,1'
-    picraft.block.Blocks(conn)[v_from:v_to] == [
-            Block(1, 0) for v in vector_range(v_from, v_to)]
-    conn.transact.assert_called_once_with(
+    conn.transact_array.return_value = array(str('H'), [1, 1, 2, 1])
+    assert picraft.block.Blocks(conn)[v_from:v_to] == [
+            Block(1, 0), Block(1, 0), Block(2, 0), Block(1, 0)]
+    conn.transact_array.assert_called_once_with(
             'world.getBlocks(%s,%s)' % (v_from, v_to - 1))
+    assert not conn.transact.called
+
+def test_blocks_get_vrange_box():
+    box = vector_range(Vector(1, 2, 3), Vector(3, 4, 6))
+    conn = mock.MagicMock()
+    conn.server_version = 'raspberry-juice'
+    # Give each block in the box a distinct id so the selection is visible
+    conn.transact_array.return_value = array(str('H'), range(len(box)))
+    def expected(vrange):
+        return [Block(box.index(v), 0) for v in vrange]
+    for vrange in (
+            vector_range(box.start, box.stop, order='xyz'),
+            vector_range(box.stop - 1, box.start - 1, Vector(-1, -1, -1)),
+            vector_range(box.start, box.stop, Vector(1, 1, 2)),
+            ):
+        conn.transact_array.reset_mock()
+        assert picraft.block.Blocks(conn)[vrange] == expected(vrange)
+        conn.transact_array.assert_called_once_with(
+                'world.getBlocks(%s,%s)' % (box.start, box.stop - 1))
+    assert not conn.transact.called
+    assert not conn.transact_many.called
+
+def test_blocks_get_vrange_sparse():
+    vrange = vector_range(Vector(0, 0, 0), Vector(20, 1, 20), Vector(10, 1, 10))
+    conn = mock.MagicMock()
+    conn.server_version = 'raspberry-juice'
+    commands = []
+    def transact_many(bufs):
+        bufs = list(bufs)
+        commands.extend(bufs)
+        return ['1,1' for buf in bufs]
+    conn.transact_many.side_effect = transact_many
+    assert picraft.block.Blocks(conn)[vrange] == [Block(1, 1)] * 4
+    assert commands == [
+            'world.getBlockWithData(%d,%d,%d)' % (v.x, v.y, v.z)
+            for v in vrange]
+    assert not conn.transact_array.called
+
+def test_blocks_iter_chunks():
+    vrange = vector_range(Vector(0, 0, 0), Vector(5, 2, 3))
+    conn = mock.MagicMock()
+    calls = []
+    def transact_many(bufs):
+        bufs = list(bufs)
+        calls.append(bufs)
+        return ['1,1' for buf in bufs]
+    conn.transact_many.side_effect = transact_many
+    chunks = list(picraft.block.Blocks(conn).iter_chunks(
+        vrange, Vector(2, 2, 2), pipeline=2))
+    assert [sub_range for sub_range, blocks in chunks] == [
+        vector_range(Vector(0, 0, 0), Vector(2, 2, 2)),
+        vector_range(Vector(0, 0, 2), Vector(2, 2, 3)),
+        vector_range(Vector(2, 0, 0), Vector(4, 2, 2)),
+        vector_range(Vector(2, 0, 2), Vector(4, 2, 3)),
+        vector_range(Vector(4, 0, 0), Vector(5, 2, 2)),
+        vector_range(Vector(4, 0, 2), Vector(5, 2, 3)),
+        ]
+    assert all(blocks == [Block(1, 1)] * len(sub_range) for sub_range, blocks in chunks)
+    assert sum(len(sub_range) for sub_range, blocks in chunks) == len(vrange)
+    assert len(calls) == 3
+    assert calls[0] == [
+        'world.getBlockWithData(%d,%d,%d)' % (v.x, v.y, v.z)
+        for sub_range, blocks in chunks[:2]
+        for v in sub_range]
+    # Stopping early means no more requests are sent
+    del calls[:]
+    for sub_range, blocks in picraft.block.Blocks(conn).iter_chunks(
+            vrange, Vector(2, 2, 2), pipeline=2):
+        break
+    assert len(calls) == 1
+    with pytest.raises(ValueError):
+        list(picraft.block.Blocks(conn).iter_chunks(vrange, pipeline=0))
+    with pytest.raises(ValueError):
+        list(picraft.block.Blocks(conn).iter_chunks(vrange, Vector(0, 1, 1)))
+
+def test_blocks_iter_chunks_fast():
+    vrange = vector_range(Vector(0, 0, 0), Vector(4, 4, 4))
+    conn = mock.MagicMock()
+    conn.server_version = 'raspberry-juice'
+    calls = []
+    def transact_many(bufs):
+        bufs = list(bufs)
+        calls.append(bufs)
+        return [','.join(['2'] * 8) for buf in bufs]
+    conn.transact_many.side_effect = transact_many
+    chunks = list(picraft.block.Blocks(conn).iter_chunks(
+        vrange, Vector(2, 2, 2), pipeline=4))
+    assert len(chunks) == 8
+    assert all(blocks == [Block(2, 0)] * 8 for sub_range, blocks in chunks)
+    assert calls == [
+        ['world.getBlocks(%s,%s)' % (sub_range.start, sub_range.stop - 1)
+         for sub_range, blocks in chunks[:4]],
+        ['world.getBlocks(%s,%s)' % (sub_range.start, sub_range.stop - 1)
+         for sub_range, blocks in chunks[4:]],
+        ]
+    assert not conn.transact.called
 
 def test_blocks_get_sequence():
     l = list(line(O, 4*X))
     conn = mock.MagicMock()
-    conn.transact.return_value = '1,1'
+    commands = []
+    def transact_many(bufs):
+        bufs = list(bufs)
+        commands.extend(bufs)
+        return ['1,1' for buf in bufs]
+    conn.transact_many.side_effect = transact_many
     assert picraft.block.Blocks(conn)[l] == [Block(1, 1) for v in l]
-    for v in l:
-        conn.transact.assert_any_call(
-                'world.getBlockWithData(%d,%d,%d)' % (v.x, v.y, v.z))
+    assert commands == [
+            'world.getBlockWithData(%d,%d,%d)' % (v.x, v.y, v.z) for v in l]
 
 def test_blocks_get_none():
     conn = mock.MagicMock()
@@ -173,14 +280,14 @@ def test_blocks_set_none():
 def test_blocks_set_one():
     conn = mock.MagicMock()
     picraft.block.Blocks(conn)[Vector(1, 2, 3)] = Block(0, 0)
-    conn.send.assert_called_once_with('world.setBlock(1,2,3,0,0)')
+    conn.send.assert_called_once_with(b'world.setBlock(1,2,3,0,0)\n')
 
 def test_blocks_set_vrange_same():
     conn = mock.MagicMock()
     v_from = Vector(1, 2, 3)
     v_to = Vector(2, 3, 5)
     picraft.block.Blocks(conn)[v_from:v_to] = Block(0, 0)
-    conn.send.assert_called_once_with('world.setBlocks(1,2,3,1,2,4,0,0)')
+    conn.send.assert_called_once_with(b'world.setBlocks(1,2,3,1,2,4,0,0)\n')
 
 def test_blocks_set_vrange_same_stepped():
     conn = mock.MagicMock()
@@ -190,7 +297,7 @@ def test_blocks_set_vrange_same_stepped():
     picraft.block.Blocks(conn)[v_from:v_to:v_step] = Block(0, 0)
     for v in vector_range(v_from, v_to, v_step):
         conn.send.assert_any_call(
-                'world.setBlock(%d,%d,%d,0,0)' % (v.x, v.y, v.z))
+                b'world.setBlock(%d,%d,%d,0,0)\n' % (v.x, v.y, v.z))
 
 def test_blocks_set_vrange_different():
     conn = mock.MagicMock()
@@ -200,7 +307,7 @@ def test_blocks_set_vrange_different():
     picraft.block.Blocks(conn)[v_from:v_to] = blocks
     for v in vector_range(v_from, v_to):
         conn.send.assert_any_call(
-                'world.setBlock(%d,%d,%d,1,1)' % (v.x, v.y, v.z))
+                b'world.setBlock(%d,%d,%d,1,1)\n' % (v.x, v.y, v.z))
 
 def test_blocks_set_sequence_same():
     conn = mock.MagicMock()
@@ -208,7 +315,7 @@ def test_blocks_set_sequence_same():
     picraft.block.Blocks(conn)[l] = Block(0, 0)
     for v in l:
         conn.send.assert_any_call(
-                'world.setBlock(%d,%d,%d,0,0)' % (v.x, v.y, v.z))
+                b'world.setBlock(%d,%d,%d,0,0)\n' % (v.x, v.y, v.z))
 
 def test_blocks_set_sequence_different():
     conn = mock.MagicMock()
@@ -217,4 +324,4 @@ def test_blocks_set_sequence_different():
     picraft.block.Blocks(conn)[l] = blocks
     for v in l:
         conn.send.assert_any_call(
-                'world.setBlock(%d,%d,%d,1,1)' % (v.x, v.y, v.z))
+                b'world.setBlock(%d,%d,%d,1,1)\n' % (v.x, v.y, v.z))
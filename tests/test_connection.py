@@ -36,21 +36,27 @@ from __future__ import (
 str = type('')
 
 
+import io
 import pytest
 import socket
 import select
+import threading
+from array import array
 try:
     from unittest import mock
 except ImportError:
     import mock
 from picraft import (
     Connection,
+    ConnectionMetrics,
     ConnectionError,
     ConnectionClosed,
     CommandError,
+    NoResponse,
     BatchStarted,
     BatchNotStarted,
     )
+from picraft.testing import FakeServer
 
 
 def test_connection_init_pi():
@@ -101,9 +107,9 @@ def test_connection_send():
     with mock.patch('socket.socket'), mock.patch('select.select'):
         select.select.return_value = [False]
         conn = Connection('myhost', 1234)
-        conn._wfile.write.reset_mock()
+        conn._socket.sendall.reset_mock()
         conn.send('foo()')
-        conn._wfile.write.assert_called_once_with(b'foo()\n')
+        conn._socket.sendall.assert_called_once_with(b'foo()\n')
 
 def test_connection_send_error():
     with mock.patch('socket.socket'), mock.patch('select.select'):
@@ -117,40 +123,139 @@ def test_connection_transact():
     with mock.patch('socket.socket'), mock.patch('select.select'):
         select.select.side_effect = [[False], [True]]
         conn = Connection('myhost', 1234, ignore_errors=False)
-        conn._wfile.write.reset_mock()
+        conn._socket.sendall.reset_mock()
         conn._rfile.readline.return_value = b'bar\n'
         result = conn.transact('foo()')
-        conn._wfile.write.assert_called_once_with(b'foo()\n')
+        conn._socket.sendall.assert_called_once_with(b'foo()\n')
         assert result == 'bar'
 
+def test_connection_transact_array():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.side_effect = [[False], [True]]
+        conn = Connection('myhost', 1234, ignore_errors=False)
+        conn._socket.sendall.reset_mock()
+        select.select.side_effect = None
+        select.select.return_value = [True]
+        # A tiny buffer forces the reply to be parsed in several pieces, and
+        # the following reply must be left intact
+        conn._rfile = io.BufferedReader(
+            io.BytesIO(b'1,22,333,4444,5\n6,7\nFail\nbar\n'), 4)
+        result = conn.transact_array('foo()')
+        conn._socket.sendall.assert_called_once_with(b'foo()\n')
+        assert result == array(str('H'), [1, 22, 333, 4444, 5])
+        assert conn.transact_array('foo()', 'i') == array(str('i'), [6, 7])
+        with pytest.raises(CommandError):
+            conn.transact_array('foo()')
+        assert conn.transact('baz()') == 'bar'
+        with pytest.raises(ConnectionClosed):
+            conn.transact_array('foo()')
+        select.select.return_value = [False]
+        with pytest.raises(NoResponse):
+            conn.transact_array('foo()')
+
+def test_connection_transact_many():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.side_effect = [[False], [True]]
+        conn = Connection('myhost', 1234, ignore_errors=False)
+        conn.pipeline_depth = 2
+        conn._socket.sendall.reset_mock()
+        conn._rfile.readline.side_effect = [b'1\n', b'2\n', b'3\n']
+        select.select.side_effect = None
+        select.select.return_value = [True]
+        assert conn.transact_many(['foo()', 'bar()', 'baz()']) == ['1', '2', '3']
+        assert conn._socket.sendall.call_args_list == [
+            mock.call(b'foo()\nbar()\n'), mock.call(b'baz()\n')]
+        assert conn.transact_many([]) == []
+
+def test_connection_transact_many_error():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.side_effect = [[False], [True]]
+        conn = Connection('myhost', 1234, ignore_errors=False)
+        conn._rfile.readline.side_effect = [b'1\n', b'Fail\n', b'3\n', b'4\n']
+        select.select.side_effect = None
+        select.select.return_value = [True]
+        with pytest.raises(CommandError):
+            conn.transact_many(['foo()', 'bar()', 'baz()'])
+        # All replies were consumed despite the failure
+        assert conn.transact('quux()') == '4'
+        conn._rfile.readline.side_effect = socket.timeout
+        s = conn._socket
+        with pytest.raises(NoResponse):
+            conn.transact_many(['foo()', 'bar()'])
+        # The replies are out of step, so the connection is closed
+        assert s.close.called
+        with pytest.raises(ConnectionClosed):
+            conn.transact('quux()')
+
+def test_connection_transact_many_timeout():
+    with FakeServer() as server:
+        conn = Connection(*server.address, timeout=0.1)
+        try:
+            assert conn.transact_many(['world.getBlock(0,0,0)']) == ['0']
+            server.latency = 0.5
+            with pytest.raises(NoResponse):
+                conn.transact_many(['world.getBlock(0,0,0)'] * 3)
+            with pytest.raises(ConnectionClosed):
+                conn.transact('world.getBlock(0,0,0)')
+        finally:
+            conn.close()
+
+def test_connection_transact_many_first_timeout():
+    # Even when errors are ignored, a missing first reply must not leave the
+    # replies that follow it assigned to the wrong commands
+    with FakeServer() as server:
+        conn = Connection(*server.address, timeout=0.1, ignore_errors=True)
+        try:
+            server.latency = 0.5
+            with pytest.raises(NoResponse):
+                conn.transact_many(['world.getBlock(0,0,0)'])
+            with pytest.raises(ConnectionClosed):
+                conn.transact('world.getBlock(0,0,0)')
+        finally:
+            conn.close()
+
 def test_connection_batch_send():
     with mock.patch('socket.socket'), mock.patch('select.select'):
         select.select.return_value = [False]
         conn = Connection('myhost', 1234)
-        conn._wfile.write.reset_mock()
+        conn._socket.sendall.reset_mock()
         with conn.batch_start():
             conn.send('foo()')
             conn.send('bar()')
             conn.send('baz()')
-        conn._wfile.write.assert_called_once_with(b'foo()\nbar()\nbaz()\n')
+        conn._socket.sendall.assert_called_once_with(b'foo()\nbar()\nbaz()\n')
+
+def test_connection_send_bytes():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.return_value = [False]
+        conn = Connection('myhost', 1234)
+        conn._socket.sendall.reset_mock()
+        conn.send(b'foo()\n')
+        conn._socket.sendall.assert_called_once_with(b'foo()\n')
+        conn._socket.sendall.reset_mock()
+        with conn.batch_start():
+            conn.send(b'foo()')
+            conn.send('bar()')
+            conn.send(b'baz()\n')
+        conn._socket.sendall.assert_called_once_with(b'foo()\nbar()\nbaz()\n')
 
 def test_connection_batch_forget():
     with mock.patch('socket.socket'), mock.patch('select.select'):
         select.select.return_value = [False]
         conn = Connection('myhost', 1234)
-        conn._wfile.write.reset_mock()
+        conn._socket.sendall.reset_mock()
         conn.batch_start()
         conn.send('foo()')
         conn.send('bar()')
         conn.send('baz()')
         conn.batch_forget()
-        assert not conn._wfile.write.called
+        assert not conn._socket.sendall.called
 
 def test_connection_batch_exception():
     with mock.patch('socket.socket'), mock.patch('select.select'):
         select.select.return_value = [False]
         conn = Connection('myhost', 1234)
-        conn._wfile.write.reset_mock()
+        conn._socket.sendall.reset_mock()
         try:
             with conn.batch_start():
                 conn.send('foo()')
@@ -159,7 +264,7 @@ def test_connection_batch_exception():
                 raise Exception('boo')
         except Exception:
             pass
-        assert not conn._wfile.write.called
+        assert not conn._socket.sendall.called
 
 def test_connection_batch_start_fail():
     with mock.patch('socket.socket'), mock.patch('select.select'):
@@ -178,8 +283,247 @@ def test_connection_batch_send_fail():
 
 def test_connection_ignore_errors():
     with mock.patch('socket.socket'), mock.patch('select.select'):
-        select.select.side_effect = [[False], [True], [False]]
+        select.select.side_effect = [[False], [True], [False], [True]]
         conn = Connection('myhost', 1234, ignore_errors=True)
         conn.send('foo()')
+        # Sends don't check for errors...
+        assert not conn._socket.recv.called
+        conn._socket.recv.return_value = b'Fail\n'
+        conn._rfile.readline.return_value = b'bar\n'
+        # ...but transactions drain any before sending
+        assert conn.transact('baz()') == 'bar'
         conn._socket.recv.assert_called_once_with(1500)
+        assert conn.ignored_errors == 1
 
+def test_connection_drain_split():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.return_value = [False]
+        conn = Connection('myhost', 1234, ignore_errors=True)
+        conn.send('foo()')
+        conn.send('foo()')
+        conn.send('foo()')
+        # A "Fail" split between reads (or drains) is still counted once
+        select.select.side_effect = [[True], [True], [False], [True]]
+        conn._socket.recv.side_effect = [b'Fail\nFa', b'il\nF']
+        conn._rfile.readline.return_value = b'bar\n'
+        assert conn.transact('baz()') == 'bar'
+        assert conn.ignored_errors == 2
+        select.select.side_effect = [[True], [False], [True]]
+        conn._socket.recv.side_effect = [b'ail\n']
+        assert conn.transact('baz()') == 'bar'
+        assert conn.ignored_errors == 3
+
+def test_connection_drain_interval():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.return_value = [False]
+        conn = Connection('myhost', 1234, ignore_errors=True)
+        conn.drain_interval = 3
+        select.select.reset_mock()
+        conn.send('foo()')
+        conn.send('foo()')
+        assert not select.select.called
+        conn.send('foo()')
+        assert select.select.call_count == 1
+
+def test_connection_batch_compact():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.return_value = [False]
+        conn = Connection('myhost', 1234)
+        conn._socket.sendall.reset_mock()
+        with conn.batch_start(compact=True):
+            conn.send('world.setBlock(0,0,0,1,0)')
+            conn.send('world.setBlock(1,0,0,2,0)')
+            conn.send('world.setBlock(0,0,0,2,0)')
+            conn.send('chat.post(foo)')
+            conn.send('world.setBlock(0,0,0,3)')
+            conn.send('world.setBlock(0,0,0,4)')
+        conn._socket.sendall.assert_called_once_with(
+            b'world.setBlocks(0,0,0,1,0,0,2,0)\n'
+            b'chat.post(foo)\n'
+            b'world.setBlock(0,0,0,4)\n')
+        conn._socket.sendall.reset_mock()
+        with conn.batch_start(compact=True):
+            conn.send('world.setBlock(0,0,0,1)')
+            conn.send('world.setBlocks(-100,0,0,100,0,100,0)')
+            conn.send('world.setBlocks(100,0,0,-100,0,0,0)')
+            conn.send('world.setBlock(1,0,0,2)')
+            conn.send('world.setBlocks(50,50,50,50,50,50,3)')
+        conn._socket.sendall.assert_called_once_with(
+            b'world.setBlocks(-100,0,0,100,0,100,0)\n'
+            b'world.setBlocks(-100,0,0,0,0,0,0)\n'
+            b'world.setBlocks(2,0,0,100,0,0,0)\n'
+            b'world.setBlock(1,0,0,2)\n'
+            b'world.setBlock(50,50,50,3)\n')
+        conn._socket.sendall.reset_mock()
+        # Compaction never makes the batch longer
+        with conn.batch_start(compact=True):
+            conn.send('world.setBlocks(0,0,0,2,2,2,1)')
+            conn.send('world.setBlock(1,1,1,2)')
+        conn._socket.sendall.assert_called_once_with(
+            b'world.setBlocks(0,0,0,2,2,2,1)\n'
+            b'world.setBlock(1,1,1,2)\n')
+        conn._socket.sendall.reset_mock()
+        with conn.batch_start(compact=True):
+            conn.send('world.setBlock(0,0,0,1)')
+            conn.send('world.setBlock(0,0,0,1)')
+        conn._socket.sendall.assert_called_once_with(
+            b'world.setBlock(0,0,0,1)\n')
+        conn._socket.sendall.reset_mock()
+        with conn.batch_start():
+            conn.send('world.setBlock(0,0,0,1)')
+            conn.send('world.setBlock(0,0,0,1)')
+        conn._socket.sendall.assert_called_once_with(
+            b'world.setBlock(0,0,0,1)\nworld.setBlock(0,0,0,1)\n')
+
+def test_connection_auto_batch():
+    with mock.patch('socket.socket'), mock.patch('select.select'), \
+            mock.patch('threading.Timer'):
+        select.select.return_value = [False]
+        conn = Connection('myhost', 1234, auto_batch=True)
+        conn.auto_batch_commands = 3
+        conn._socket.sendall.reset_mock()
+        conn.send('foo()')
+        conn.send('bar()')
+        assert not conn._socket.sendall.called
+        assert threading.Timer.call_count == 1
+        conn.send('baz()')
+        conn._socket.sendall.assert_called_once_with(b'foo()\nbar()\nbaz()\n')
+        threading.Timer.return_value.cancel.assert_called_once_with()
+        conn._socket.sendall.reset_mock()
+        conn.auto_batch_bytes = 10
+        conn.send('foo()')
+        assert not conn._socket.sendall.called
+        conn.send('bar()')
+        conn._socket.sendall.assert_called_once_with(b'foo()\nbar()\n')
+
+def test_connection_auto_batch_timer():
+    with mock.patch('socket.socket'), mock.patch('select.select'), \
+            mock.patch('threading.Timer'):
+        select.select.return_value = [False]
+        conn = Connection('myhost', 1234)
+        conn.auto_batch = True
+        conn.auto_batch_delay = 0.5
+        conn._socket.sendall.reset_mock()
+        conn.send('foo()')
+        conn.send('bar()')
+        assert threading.Timer.call_count == 1
+        delay, flush = threading.Timer.call_args[0]
+        assert delay == 0.5
+        assert not conn._socket.sendall.called
+        flush()
+        conn._socket.sendall.assert_called_once_with(b'foo()\nbar()\n')
+        conn._socket.sendall.reset_mock()
+        flush()
+        assert not conn._socket.sendall.called
+
+def test_connection_auto_batch_flush():
+    with mock.patch('socket.socket'), mock.patch('select.select'), \
+            mock.patch('threading.Timer'):
+        select.select.return_value = [False]
+        conn = Connection('myhost', 1234, auto_batch=True)
+        conn._socket.sendall.reset_mock()
+        conn.send('foo()')
+        conn.flush()
+        conn._socket.sendall.assert_called_once_with(b'foo()\n')
+        conn._socket.sendall.reset_mock()
+        conn.send('foo()')
+        conn._rfile.readline.return_value = b'1\n'
+        select.select.return_value = [True]
+        conn._socket.recv.return_value = b''
+        assert conn.transact('bar()') == '1'
+        assert conn._socket.sendall.call_args_list == [
+            mock.call(b'foo()\n'), mock.call(b'bar()\n')]
+        select.select.return_value = [False]
+        conn._socket.sendall.reset_mock()
+        conn.send('foo()')
+        with conn.batch_start():
+            conn.send('bar()')
+        assert conn._socket.sendall.call_args_list == [
+            mock.call(b'foo()\n'), mock.call(b'bar()\n')]
+        conn._socket.sendall.reset_mock()
+        conn.send('foo()')
+        conn.auto_batch = False
+        conn._socket.sendall.assert_called_once_with(b'foo()\n')
+        conn._socket.sendall.reset_mock()
+        conn.send('bar()')
+        conn._socket.sendall.assert_called_once_with(b'bar()\n')
+        conn.auto_batch = True
+        conn._socket.sendall.reset_mock()
+        conn.send('foo()')
+        s = conn._socket
+        conn.close()
+        s.sendall.assert_called_once_with(b'foo()\n')
+        with pytest.raises(ConnectionClosed):
+            conn.send('foo()')
+
+def test_connection_metrics():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.return_value = [True]
+        socket.socket().makefile().readline.return_value = b'Fail\n'
+        conn = Connection('myhost', 1234, ignore_errors=False)
+        conn._rfile.readline.return_value = b'1\n'
+        metrics = ConnectionMetrics()
+        events = []
+        metrics.add_hook(lambda metric, value, command: events.append(
+            (metric, command)))
+        conn.metrics = metrics
+        assert conn.transact('world.getBlock(0,0,0)') == '1'
+        select.select.return_value = [False]
+        conn.send('world.setBlock(0,0,0,1)')
+        with conn.batch_start():
+            conn.send('world.setBlock(0,0,0,1)')
+            conn.send('chat.post(foo)')
+        result = metrics.snapshot()
+        assert result['commands']['world.getBlock']['count'] == 1
+        assert result['commands']['world.getBlock']['latency']['count'] == 1
+        assert result['commands']['world.setBlock']['count'] == 2
+        assert result['commands']['world.setBlock']['latency']['count'] == 1
+        assert result['commands']['chat.post'] == {'count': 1, 'latency': None}
+        assert result['bytes_sent'] == 22 + 24 + 39
+        assert result['bytes_received'] == 2
+        assert result['lock_wait']['count'] == 3
+        assert result['batch_size']['count'] == 1
+        assert result['batch_size']['sum'] == 2
+        assert result['batch_size']['buckets'][:2] == [(1, 0), (10, 1)]
+        assert ('command', 'world.getBlock') in events
+        assert ('batch_size', None) in events
+        metrics.reset()
+        assert metrics.snapshot()['commands'] == {}
+
+def test_connection_metrics_drain():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.return_value = [False]
+        conn = Connection('myhost', 1234)
+        conn.metrics = ConnectionMetrics()
+        conn.send('foo()')
+        select.select.side_effect = [[True], [False], [True]]
+        conn._socket.recv.return_value = b'Fail\n'
+        conn._rfile.readline.return_value = b'1\n'
+        conn.transact('bar()')
+        result = conn.metrics.snapshot()
+        assert result['bytes_drained'] == 5
+        assert result['failures'] == {'foo': 1}
+
+def test_connection_metrics_failures():
+    with mock.patch('socket.socket'), mock.patch('select.select'):
+        select.select.return_value = [True]
+        socket.socket().makefile().readline.return_value = b'Fail\n'
+        conn = Connection('myhost', 1234, ignore_errors=False)
+        conn.metrics = ConnectionMetrics()
+        # Commands that fail are still recorded by every path
+        with pytest.raises(CommandError):
+            conn.transact('world.getBlock(0,0,0)')
+        with pytest.raises(CommandError):
+            conn.transact_many(['world.getBlock(0,0,0)'])
+        with pytest.raises(CommandError):
+            conn.send('world.setBlock(0,0,0,1)')
+        result = conn.metrics.snapshot()
+        assert result['commands']['world.getBlock']['count'] == 2
+        assert result['commands']['world.getBlock']['latency']['count'] == 1
+        assert result['commands']['world.setBlock']['count'] == 1
+        assert result['lock_wait']['count'] == 3
+        # Commands that can't be transmitted are not
+        conn.close()
+        with pytest.raises(ConnectionClosed):
+            conn.send('world.setBlock(0,0,0,1)')
+        assert conn.metrics.snapshot()['commands'] == result['commands']
@@ -45,6 +45,7 @@ import time
 from picraft import (
     World,
     Vector,
+    vector_range,
     BlockHitEvent,
     PlayerPosEvent,
     ChatPostEvent,
@@ -120,6 +121,87 @@ def test_events_poll_one_move():
         mock.call('events.block.hits()'),
         ])
 
+def test_events_track_player_threshold():
+    conn = mock.MagicMock()
+    conn.transact.side_effect = [
+        '1.0,1.0,1.0', '1.5,1.0,1.0', '', '2.0,1.0,1.0', '']
+    events = picraft.events.Events(conn)
+    events.track_player(1, threshold=1.0)
+    assert set(events.track_players) == {1}
+    assert events.poll() == []
+    result = events.poll()
+    assert len(result) == 1
+    assert result[0].old_pos == Vector(1.0, 1.0, 1.0)
+    assert result[0].new_pos == Vector(2.0, 1.0, 1.0)
+    with pytest.raises(ValueError):
+        events.track_player(1, interval=1.0, idle_interval=0.5)
+
+def test_events_track_player_interval():
+    with mock.patch('picraft.events._clock') as clock:
+        clock.return_value = 0.0
+        conn = mock.MagicMock()
+        conn.transact.side_effect = lambda s: (
+            '1.0,1.0,1.0' if s.startswith('entity.getPos') else '')
+        events = picraft.events.Events(conn)
+        events.track_player(1, interval=0.5, idle_interval=4.0)
+        def queries():
+            return sum(
+                1 for c in conn.transact.call_args_list
+                if c == mock.call('entity.getPos(1)'))
+        polled = []
+        for i in range(100):
+            clock.return_value = i * 0.1
+            events.poll()
+            polled.append(queries())
+        # Queried at setup, then after 0.5s, and then with the interval
+        # doubling while the player is idle: 1.0s, 2.0s, 4.0s, 4.0s
+        assert [i for i in range(1, 100) if polled[i] != polled[i - 1]] == [
+            5, 15, 35, 75]
+        conn.transact.side_effect = lambda s: (
+            '2.0,1.0,1.0' if s.startswith('entity.getPos') else '')
+        clock.return_value = 11.5
+        assert len(events.poll()) == 1
+        clock.return_value = 11.9
+        assert events.poll() == []
+        before = queries()
+        clock.return_value = 12.0
+        events.poll()
+        assert queries() == before + 1
+
+def test_events_track_player_regions():
+    conn = mock.MagicMock()
+    conn.transact.side_effect = [
+        '1.0,1.0,1.0', '2.0,1.0,1.0', '', '5.5,1.0,1.0', '',
+        '6.0,1.0,1.0', '', '0.0,1.0,1.0', '']
+    events = picraft.events.Events(conn)
+    events.track_player(1, regions=[
+        vector_range(Vector(5, 0, 0), Vector(10, 10, 10))])
+    assert events.poll() == []
+    result = events.poll()
+    assert len(result) == 1
+    assert result[0].old_pos == Vector(1.0, 1.0, 1.0)
+    assert result[0].new_pos == Vector(5.5, 1.0, 1.0)
+    assert events.poll() == []
+    result = events.poll()
+    assert len(result) == 1
+    assert result[0].old_pos == Vector(5.5, 1.0, 1.0)
+    assert result[0].new_pos == Vector(0.0, 1.0, 1.0)
+
+def test_events_untrack_player():
+    with mock.patch('picraft.events.Player'):
+        conn = mock.MagicMock()
+        events = picraft.events.Events(conn)
+        events.track_player(1, threshold=2.0)
+        events.track_players = {1, 2}
+        assert events._track_players[1].threshold == 2.0
+        assert events._track_players[2].threshold == 0.0
+        events.clear()
+        assert events._track_players[1].threshold == 2.0
+        events.untrack_player(1)
+        assert set(events.track_players) == {2}
+        with pytest.raises(KeyError):
+            events.untrack_player(1)
+
 def test_events_poll_multi_hits():
     conn = mock.MagicMock()
     conn.transact.return_value = '1,2,3,4,5|-1,0,0,0,1'
@@ -363,6 +445,74 @@ def test_events_hit_handler_filter_face_bytes():
     events.process()
     assert len(result) == 0
 
+def test_events_hit_handler_index():
+    conn = mock.MagicMock()
+    conn.transact.return_value = '1,2,3,4,5|40,2,3,1,5|0,0,0,1,5'
+    events = picraft.events.Events(conn)
+    result = []
+    def register(name, **kwargs):
+        @events.on_block_hit(**kwargs)
+        def handler(event):
+            result.append((name, event.pos))
+    register('exact', pos=Vector(1, 2, 3))
+    register('range', pos=vector_range(Vector(30, 0, 0), Vector(50, 10, 10)))
+    register('huge', pos=vector_range(Vector(-1000, 0, -1000), Vector(1000, 256, 1000)))
+    register('stepped', pos=vector_range(Vector(0, 0, 0), Vector(50, 10, 10), Vector(2, 1, 1)))
+    register('tuple', pos=(Vector(0, 0, 0), Vector(40, 2, 3)))
+    register('list', pos=[Vector(1, 2, 3)])
+    register('top', face='y+')
+    register('any')
+    for i in range(1000):
+        register('button', pos=Vector(i, 100, 0))
+    events.process()
+    assert result == [
+        ('exact', Vector(1, 2, 3)),
+        ('huge', Vector(1, 2, 3)),
+        ('list', Vector(1, 2, 3)),
+        ('any', Vector(1, 2, 3)),
+        ('range', Vector(40, 2, 3)),
+        ('huge', Vector(40, 2, 3)),
+        ('stepped', Vector(40, 2, 3)),
+        ('tuple', Vector(40, 2, 3)),
+        ('top', Vector(40, 2, 3)),
+        ('any', Vector(40, 2, 3)),
+        ('huge', Vector(0, 0, 0)),
+        ('stepped', Vector(0, 0, 0)),
+        ('tuple', Vector(0, 0, 0)),
+        ('top', Vector(0, 0, 0)),
+        ('any', Vector(0, 0, 0)),
+        ]
+    # Handlers registered after the index is built are still dispatched
+    del result[:]
+    conn.transact.return_value = '500,100,0,1,5'
+    register('late', pos=Vector(500, 100, 0))
+    events.process()
+    assert result == [
+        ('huge', Vector(500, 100, 0)),
+        ('top', Vector(500, 100, 0)),
+        ('any', Vector(500, 100, 0)),
+        ('button', Vector(500, 100, 0)),
+        ('late', Vector(500, 100, 0)),
+        ]
+
+def test_events_pos_handler_index():
+    conn = mock.MagicMock()
+    conn.transact.side_effect = ['1.0,1.0,1.0', '1.5,1.0,17.2', '']
+    events = picraft.events.Events(conn)
+    events.track_players = {1}
+    result = []
+    def register(name, **kwargs):
+        @events.on_player_pos(**kwargs)
+        def handler(event):
+            result.append(name)
+    register('enter', new_pos=vector_range(Vector(0, 0, 10), Vector(5, 5, 20)))
+    register('leave', old_pos=Vector(1, 1, 1))
+    register('stay', old_pos=Vector(1, 1, 1), new_pos=Vector(1, 1, 1))
+    register('elsewhere', new_pos=(Vector(1, 1, 1),))
+    register('any')
+    events.process()
+    assert result == ['enter', 'leave', 'any']
+
 def test_events_chat_handler_filter_message():
     conn = mock.MagicMock()
     conn.server_version = 'raspberry-juice'
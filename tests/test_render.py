@@ -56,6 +56,7 @@ from picraft import (
     Vector,
     Block,
     vector_range,
+    lines,
     O, X, Y, Z,
     )
 try:
@@ -273,3 +274,304 @@ f -1 -2 -3 -4"""))
     with pytest.raises(KeyError):
         m.render(materials={})
 
+
+def test_model_render_workers():
+    m = Model(io.StringIO("""
+usemtl brick_block
+
+g group1
+v 0 0 0
+v 4 0 0
+v 4 0 4
+v 0 0 4
+f -1 -2 -3 -4
+
+usemtl stone
+
+g group2
+v 0 0 0
+v 2 0 0
+v 2 0 2
+v 0 0 2
+f -1 -2 -3 -4
+v 0 1 0
+v 4 1 0
+v 4 1 4
+f -1 -2 -3
+"""))
+    result = m.render(workers=2)
+    assert result == m.render()
+    assert result[O] == Block('stone')
+    assert result[4*X + 4*Z] == Block('brick_block')
+
+def test_model_render_sat():
+    m = Model(io.StringIO("""
+usemtl brick_block
+
+v 0 0 0
+v 4 0 0
+v 4 0 4
+v 0 0 4
+f -1 -2 -3 -4"""))
+    assert m.render(engine='sat') == m.render()
+
+def test_model_render_sat_oblique():
+    m = Model(io.StringIO("""
+usemtl stone
+
+v 0 0 0
+v 17 5 3
+v 16 7 2
+f -1 -2 -3"""))
+    result = m.render(engine='sat')
+    points = [v.round() for v in m.faces[0].vectors]
+    assert set(lines(points)) <= set(result)
+    assert m.render(engine='sat', workers=2) == result
+
+def test_model_render_bad_engine():
+    m = Model(io.StringIO("""
+usemtl stone
+
+v 0 0 0
+v 4 0 0
+v 4 0 4
+f -1 -2 -3"""))
+    with pytest.raises(ValueError):
+        m.render(engine='foo')
+
+def test_model_render_solid():
+    m = Model(io.StringIO("""
+usemtl stone
+
+v 0 0 0
+v 4 0 0
+v 4 0 4
+v 0 0 4
+v 0 4 0
+v 4 4 0
+v 4 4 4
+v 0 4 4
+f 1 2 3 4
+f 5 6 7 8
+f 1 2 6 5
+f 2 3 7 6
+f 3 4 8 7
+f 4 1 5 8
+"""))
+    b = Block('stone')
+    assert m.render(engine='sat', solid=True) == {
+        v: b for v in vector_range(O, 4*X + 4*Y + 4*Z + 1)
+        }
+    assert len(m.render(engine='sat')) == 5**3 - 3**3
+
+def test_model_bounds_groups():
+    m = Model(io.StringIO("""
+usemtl stone
+
+v 0 0 0
+v 4 0 0
+v 4 0 4
+v 0 0 4
+v 10 2 10
+v 12 2 10
+v 12 2 12
+g low
+f 1 2 3 4
+g high
+f 5 6 7
+"""))
+    assert m.face_count == 2
+    assert m.vertex_count == 7
+    assert m.bounds == vector_range(O, Vector(12, 2, 12) + 1)
+    assert m.faces[1].bounds == vector_range(
+        Vector(10, 2, 10), Vector(12, 2, 12) + 1)
+    assert m.group_bounds == {
+        'low': vector_range(O, Vector(4, 0, 4) + 1),
+        'high': vector_range(Vector(10, 2, 10), Vector(12, 2, 12) + 1),
+        }
+
+def test_model_render_region():
+    m = Model(io.StringIO("""
+usemtl stone
+
+v 0 0 0
+v 4 0 0
+v 4 0 4
+v 0 0 4
+v 10 2 10
+v 12 2 10
+v 12 2 12
+f 1 2 3 4
+f 5 6 7
+"""))
+    full = m.render(scale=2.0)
+    for region in (
+            vector_range(O, Vector(4, 1, 4)),
+            vector_range(Vector(3, 0, 3), Vector(30, 10, 30)),
+            vector_range(Vector(20, 4, 20), Vector(25, 5, 25)),
+            vector_range(O, Vector(30, 10, 30), Vector(2, 1, 2)),
+            ):
+        assert m.render(scale=2.0, region=region) == {
+            v: b for v, b in full.items() if v in region
+            }
+    with mock.patch('picraft.render._render_face') as render_face:
+        render_face.return_value = ()
+        m.render(scale=2.0, region=vector_range(O, Vector(4, 1, 4)))
+        assert render_face.call_count == 1
+    assert m.render(region=vector_range(Vector(100, 0, 0), Vector(0, 1, 1))) == {}
+    region = vector_range(Vector(-4, 0, -4), Vector(1, 1, 1))
+    assert m.render(scale=-1.0, region=region) == {
+        v: b for v, b in m.render(scale=-1.0).items() if v in region
+        }
+
+def test_model_render_region_solid():
+    m = Model(io.StringIO("""
+usemtl stone
+
+v 0 0 0
+v 4 0 0
+v 4 0 4
+v 0 0 4
+v 0 4 0
+v 4 4 0
+v 4 4 4
+v 0 4 4
+f 1 2 3 4
+f 5 6 7 8
+f 1 2 6 5
+f 2 3 7 6
+f 3 4 8 7
+f 4 1 5 8
+"""))
+    region = vector_range(Vector(1, 1, 1), Vector(3, 3, 3))
+    assert m.render(engine='sat', solid=True, region=region) == {
+        v: Block('stone') for v in region
+        }
+
+def test_model_render_lod():
+    m = Model(io.StringIO("""
+usemtl stone
+
+v 0 0 0
+v 4 0 0
+v 4 0 4
+v 0 0 4
+v 0.1 0 0.1
+v 0.2 0 0.1
+v 0.2 0 0.2
+v 0 4 0
+v 0.1 4 0
+v 0.2 4 0
+f 1 2 3 4
+f 5 6 7
+f 1 2 3 4
+f 8 9 10
+f 1 8 10
+"""))
+    assert m.render(lod=True) == m.render()
+    with mock.patch('picraft.render._render_face') as render_face:
+        render_face.return_value = ()
+        result = m.render(lod=True)
+        # Only the last copy of the square needs voxelising; the tiny
+        # triangle and the sliver collapse to a point and a line
+        assert render_face.call_count == 1
+    assert result == {
+        O: Block('stone'),
+        Y: Block('stone'),
+        2*Y: Block('stone'),
+        3*Y: Block('stone'),
+        4*Y: Block('stone'),
+        }
+
+def test_model_cache_roundtrip(tmpdir):
+    m = Model(io.StringIO("""
+usemtl brick
+
+g group1
+v 0 0 0
+v 1 0 0
+v 1 0 1
+v 0 0 1
+f -1 -2 -3 -4
+
+g group1 group2
+usemtl stone
+v 0 1 0
+f 1 2 5
+f 3 4 5
+"""), swap_yz=True)
+    filename = str(tmpdir.join('model.cache'))
+    m.save_cache(filename)
+    m2 = Model.load(filename)
+    assert len(m2.faces) == len(m.faces)
+    for f1, f2 in zip(m.faces, m2.faces):
+        assert f1.vectors == f2.vectors
+        assert f1.material == f2.material
+        assert f1.groups == f2.groups
+    assert m2.materials == m.materials
+    assert {g: len(f) for g, f in m2.groups.items()} == {'group1': 3, 'group2': 2}
+    assert m2.bounds == m.bounds
+    assert m2.render(materials=lambda f: Block('stone')) == m.render(materials=lambda f: Block('stone'))
+
+def test_model_cache_precision(tmpdir):
+    # 0.35 * 10 rounds up to 4 as a double, but down to 3 as a single
+    m = Model(io.StringIO("""
+v 0 0 0
+v 0.35 0 0
+v 0.35 0 0.35
+f 1 2 3"""))
+    filename = str(tmpdir.join('model.cache'))
+    m.save_cache(filename)
+    m2 = Model.load(filename)
+    assert m2.faces[0].vectors == m.faces[0].vectors
+    stone = lambda f: Block('stone')
+    assert Vector(4, 0, 4) in m.render(scale=10, materials=stone)
+    assert m2.render(scale=10, materials=stone) == m.render(scale=10, materials=stone)
+
+def test_model_cache_no_material(tmpdir):
+    m = Model(io.StringIO("""
+v 0 0 0
+v 1 0 0
+v 1 0 1
+f 1 2 3"""))
+    filename = str(tmpdir.join('model.cache'))
+    m.save_cache(filename)
+    m2 = Model.load(filename)
+    assert m2.materials == {None}
+    assert m2.faces[0].material is None
+
+def test_model_cache_bad(tmpdir):
+    filename = tmpdir.join('model.cache')
+    filename.write_binary(b'foo')
+    with pytest.raises(ValueError):
+        Model.load(str(filename))
+
+def test_model_cache_reuse(tmpdir):
+    source = tmpdir.join('model.obj')
+    source.write("""
+usemtl stone
+v 0 0 0
+v 1 0 0
+v 1 0 1
+f 1 2 3""")
+    cache = str(tmpdir.join('model.cache'))
+    m = Model(str(source), cache=cache)
+    assert len(m.faces) == 1
+    with mock.patch('picraft.render.Parser') as parser:
+        m = Model(str(source), cache=cache)
+        assert not parser.called
+        assert m.faces[0].vectors == ((0, 0, 0), (1, 0, 0), (1, 0, 1))
+        m = Model(str(source), swap_yz=True, cache=cache)
+        assert parser.called
+    source.write("""
+usemtl stone
+v 0 0 0
+v 2 0 0
+v 2 0 2
+f 1 2 3""")
+    m = Model(str(source), cache=cache)
+    assert m.faces[0].vectors == ((0, 0, 0), (2, 0, 0), (2, 0, 2))
+
+def test_model_cache_requires_filename():
+    with pytest.raises(ValueError):
+        Model(io.StringIO("v 0 0 0"), cache='foo.cache')
@@ -0,0 +1,191 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# An alternate Python Minecraft library for the Rasperry-Pi
+# Copyright (c) 2013-2016 Dave Jones <dave@waveform.org.uk>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+str = type('')
+
+
+import io
+import os
+import gzip
+import struct
+
+import pytest
+from picraft import World, Vector, vector_range, Block, Schematic
+from picraft.testing import FakeServer
+
+
+def test_schematic_init():
+    s = Schematic(Vector(2, 3, 4))
+    assert s.size == Vector(2, 3, 4)
+    assert len(s) == 24
+    assert repr(s) == '<Schematic size=2,3,4>'
+    assert s[Vector(1, 2, 3)] == Block('air')
+    assert list(s.vrange)[:3] == [Vector(0, 0, 0), Vector(1, 0, 0), Vector(0, 0, 1)]
+    s[Vector(1, 2, 3)] = Block('wool', 3)
+    assert s[Vector(1, 2, 3)] == Block('wool', 3)
+    assert s.ids[-1] == 35
+    assert s.data[-1] == 3
+    with pytest.raises(IndexError):
+        s[Vector(2, 0, 0)]
+    with pytest.raises(IndexError):
+        s[Vector(0, -1, 0)] = Block('stone')
+    with pytest.raises(ValueError):
+        Schematic(Vector(0, 1, 1))
+    with pytest.raises(ValueError):
+        Schematic(Vector(1, 1, 2), ids=[1])
+    s = Schematic(Vector(2, 1, 1), ids=[1, 2], data=[0, 1])
+    assert s[Vector(1, 0, 0)] == Block(2, 1)
+
+@pytest.mark.parametrize('fmt', ['picraft', 'schematic'])
+def test_schematic_save_load(fmt):
+    s = Schematic(Vector(3, 2, 2))
+    s[Vector(0, 0, 0)] = Block('stone')
+    s[Vector(2, 1, 1)] = Block('wool', 14)
+    s[Vector(1, 1, 0)] = Block(300, 2)
+    s[Vector(2, 0, 1)] = Block(257)
+    stream = io.BytesIO()
+    s.save(stream, format=fmt)
+    stream.seek(0)
+    t = Schematic.load(stream)
+    assert t.size == s.size
+    assert list(t.ids) == list(s.ids)
+    assert list(t.data) == list(s.data)
+    with pytest.raises(ValueError):
+        s.save(io.BytesIO(), format='foo')
+
+def test_schematic_save_filename(tmpdir):
+    s = Schematic(Vector(2, 2, 2))
+    s[Vector(1, 1, 1)] = Block('stone')
+    filename = os.path.join(str(tmpdir), 'test.schematic')
+    s.save(filename)
+    with gzip.open(filename, 'rb') as f:
+        content = f.read()
+    # Named compound tag "Schematic"
+    assert content.startswith(b'\x0a\x00\x09Schematic')
+    assert b'\x02\x00\x05Width\x00\x02' in content
+    assert b'\x08\x00\x09Materials\x00\x05Alpha' in content
+    assert Schematic.load(filename)[Vector(1, 1, 1)] == Block('stone')
+    filename = os.path.join(str(tmpdir), 'test.bin')
+    s.save(filename)
+    with gzip.open(filename, 'rb') as f:
+        assert f.read().startswith(b'PICRAFT-SCHEMATIC-1\n')
+    assert Schematic.load(filename)[Vector(1, 1, 1)] == Block('stone')
+
+def test_schematic_load_nbt():
+    # A schematic with extra tags of every type, as other tools write them
+    def name(s):
+        return struct.pack('>H', len(s)) + s
+    content = (
+        b'\x0a' + name(b'Schematic') +
+        b'\x02' + name(b'Width') + struct.pack('>h', 2) +
+        b'\x02' + name(b'Height') + struct.pack('>h', 1) +
+        b'\x02' + name(b'Length') + struct.pack('>h', 1) +
+        b'\x01' + name(b'Byte') + b'\x01' +
+        b'\x03' + name(b'Int') + struct.pack('>i', 1) +
+        b'\x04' + name(b'Long') + struct.pack('>q', 1) +
+        b'\x05' + name(b'Float') + struct.pack('>f', 1) +
+        b'\x06' + name(b'Double') + struct.pack('>d', 1) +
+        b'\x0b' + name(b'IntArray') + struct.pack('>iii', 2, 1, 2) +
+        b'\x0c' + name(b'LongArray') + struct.pack('>iq', 1, 1) +
+        b'\x09' + name(b'List') + struct.pack('>bi', 8, 1) + name(b'foo') +
+        b'\x0a' + name(b'Compound') + b'\x01' + name(b'A') + b'\x01\x00' +
+        b'\x07' + name(b'Blocks') + struct.pack('>i', 2) + b'\x01\x23' +
+        b'\x07' + name(b'Data') + struct.pack('>i', 2) + b'\x00\x05' +
+        b'\x00')
+    stream = io.BytesIO()
+    with gzip.GzipFile(fileobj=stream, mode='wb') as f:
+        f.write(content)
+    stream.seek(0)
+    s = Schematic.load(stream)
+    assert s.size == Vector(2, 1, 1)
+    assert s[Vector(0, 0, 0)] == Block('stone')
+    assert s[Vector(1, 0, 0)] == Block('wool', 5)
+
+def test_schematic_load_bad():
+    with pytest.raises(ValueError):
+        Schematic.load(io.BytesIO(b'foo'))
+    for content in (b'foo', b'\x0a\x00\x09Schema', b'\x0a\x00\x01S\x00'):
+        stream = io.BytesIO()
+        with gzip.GzipFile(fileobj=stream, mode='wb') as f:
+            f.write(content)
+        stream.seek(0)
+        with pytest.raises(ValueError):
+            Schematic.load(stream)
+
+def test_schematic_numpy():
+    np = pytest.importorskip('numpy')
+    s = Schematic(Vector(3, 2, 4))
+    s[Vector(2, 1, 3)] = Block('wool', 3)
+    ids, data = s.to_numpy()
+    assert ids.shape == (2, 4, 3)
+    assert ids[1, 3, 2] == 35
+    assert data[1, 3, 2] == 3
+    t = Schematic.from_numpy(ids, data)
+    assert t.size == s.size
+    assert t[Vector(2, 1, 3)] == Block('wool', 3)
+    t = Schematic.from_numpy(np.ones((1, 2, 3)))
+    assert t.size == Vector(3, 1, 2)
+    assert t[Vector(2, 0, 1)] == Block('stone')
+
+@pytest.mark.parametrize('version', ['raspberry-juice', 'minecraft-pi'])
+def test_schematic_copy_place(version):
+    with FakeServer(version=version) as server:
+        with World(*server.address, timeout=0.1) as w:
+            w.blocks[Vector(0, 0, 0):Vector(4, 1, 4)] = Block('grass')
+            w.blocks[Vector(1, 1, 1)] = Block('wool', 3)
+            w.blocks[Vector(2, 1, 3)] = Block('stone')
+            with pytest.raises(ValueError):
+                Schematic.from_world(w, vector_range(
+                    Vector(0, 0, 0), Vector(4, 2, 4), Vector(2, 1, 1)))
+            s = Schematic.from_world(w, vector_range(
+                Vector(0, 0, 0), Vector(4, 2, 4)))
+            assert s.size == Vector(4, 2, 4)
+            assert s[Vector(3, 0, 3)] == Block('grass')
+            assert s[Vector(1, 1, 1)] == Block('wool', 3)
+            assert s[Vector(2, 1, 3)] == Block('stone')
+            assert s[Vector(3, 1, 2)] == Block('air')
+            server.commands.clear()
+            s.place(w, Vector(10, 5, 10))
+            # Reading blocks ensures the server has processed the writes
+            assert w.blocks[Vector(13, 5, 13)] == Block('grass')
+            assert w.blocks[Vector(11, 6, 11)] == Block('wool', 3)
+            assert w.blocks[Vector(12, 6, 13)] == Block('stone')
+            assert server.commands['world.setBlock'] + server.commands['world.setBlocks'] < 10
+            w.blocks[Vector(20, 1, 20)] = Block('dirt')
+            server.commands.clear()
+            s.place(w, Vector(20, 0, 20), air=False)
+            assert w.blocks[Vector(20, 1, 20)] == Block('dirt')
+            assert w.blocks[Vector(21, 1, 21)] == Block('wool', 3)
+            assert server.commands['world.setBlocks'] == 1
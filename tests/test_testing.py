@@ -0,0 +1,163 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# An alternate Python Minecraft library for the Rasperry-Pi
+# Copyright (c) 2013-2016 Dave Jones <dave@waveform.org.uk>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+str = type('')
+
+import time
+import socket
+import pytest
+from picraft import World, Vector, Block, vector_range, O, X, Y, Z
+from picraft.testing import FakeServer
+
+
+@pytest.fixture()
+def server(request):
+    server = FakeServer()
+    request.addfinalizer(server.close)
+    return server
+
+@pytest.fixture()
+def world(request, server):
+    world = World(*server.address)
+    request.addfinalizer(world.connection.close)
+    return world
+
+@pytest.fixture()
+def pi_server(request):
+    server = FakeServer(version='minecraft-pi')
+    request.addfinalizer(server.close)
+    return server
+
+@pytest.fixture()
+def pi_world(request, pi_server):
+    world = World(*pi_server.address, timeout=0.1)
+    request.addfinalizer(world.connection.close)
+    return world
+
+
+def test_fake_server_bad_version():
+    with pytest.raises(ValueError):
+        FakeServer(version='foo')
+
+def test_fake_server_version_detect(world, pi_world):
+    assert world.connection.server_version == 'raspberry-juice'
+    assert pi_world.connection.server_version == 'minecraft-pi'
+
+def test_fake_server_blocks(server, world):
+    world.blocks[O] = Block('stone')
+    world.blocks[vector_range(X, X + 3)] = Block('wool', 3)
+    assert world.blocks[O] == Block('stone')
+    assert world.blocks[X + 2] == Block('wool', 3)
+    assert world.blocks[vector_range(O, 2 * X + 1)] == [
+        Block('stone'), Block('wool', 0), Block('wool', 0)]
+    assert server.blocks[X + Y + Z] == Block('wool', 3)
+    assert len(server.blocks) == 28
+    world.blocks[vector_range(O, Vector(100, 100, 100))] = Block('air')
+    assert world.blocks[O] == Block('air')
+    assert server.blocks == {}
+
+def test_fake_server_get_blocks_order(server, world):
+    vrange = vector_range(Vector(-1, -1, -1), Vector(2, 2, 2))
+    world.blocks[vrange] = [Block.from_id(i) for i in range(len(vrange))]
+    assert world.blocks[vrange] == [
+        Block.from_id(i) for i in range(len(vrange))]
+
+def test_fake_server_height(server, world):
+    world.blocks[Vector(3, 5, 3)] = Block('stone')
+    world.blocks[Vector(3, 9, 3)] = Block('stone')
+    assert world.height[Vector(3, 0, 3)] == Vector(3, 9, 3)
+    world.blocks[Vector(3, 9, 3)] = Block('air')
+    assert world.height[Vector(3, 0, 3)] == Vector(3, 5, 3)
+
+def test_fake_server_checkpoint(pi_server, pi_world):
+    pi_world.blocks[O] = Block('stone')
+    pi_world.checkpoint.save()
+    pi_world.blocks[O] = Block('dirt')
+    pi_world.checkpoint.restore()
+    assert pi_world.blocks[O] == Block('stone')
+
+def test_fake_server_players(server, world):
+    pid = server.add_player(pos=Vector(1, 2, 3))
+    assert set(world.players) == {1, pid}
+    world.player.pos = Vector(0.5, 1, 0.5)
+    assert world.player.pos == Vector(0.5, 1, 0.5)
+    assert world.player.tile_pos == Vector(0, 1, 0)
+    assert world.players[pid].tile_pos == Vector(1, 2, 3)
+    world.players[pid].tile_pos = Vector(4, 5, 6)
+    assert world.player.heading == 0.0
+    assert world.player.pitch == 0.0
+    assert server.players[pid] == Vector(4, 5, 6)
+
+def test_fake_server_events(server, world):
+    server.hit_block(Vector(1, 2, 3), 'x+')
+    server.post_chat('hello world')
+    events = world.events.poll()
+    assert len(events) == 2
+    assert events[0].pos == Vector(1, 2, 3)
+    assert events[0].face == 'x+'
+    assert events[1].message == 'hello world'
+    assert world.events.poll() == []
+
+def test_fake_server_chat_settings(pi_server, pi_world):
+    pi_world.say('hello, world')
+    pi_world.immutable = True
+    pi_world.player.autojump = False
+    pi_world.connection.transact('world.getBlock(0,0,0)')
+    assert pi_server.chat == ['hello, world']
+    assert pi_server.settings == {
+        'world_immutable': True, 'player.autojump': False}
+    assert pi_server.commands['chat.post'] == 1
+
+def test_fake_server_fail(server, world):
+    for line in ('world.getBlock(a,b,c)', 'foo.bar()', 'nonsense'):
+        assert server.execute(line) == 'Fail'
+    assert server.execute('world.checkpoint.save()') == 'Fail'
+    with FakeServer(version='minecraft-pi') as pi:
+        assert pi.execute('world.getBlocks(0,0,0,1,1,1)') is None
+        assert pi.execute('world.getBlock(a,b,c)') == 'Fail'
+
+def test_fake_server_latency(server, world):
+    server.latency = 0.05
+    start = time.time()
+    world.blocks[O]
+    assert time.time() - start >= 0.05
+    start = time.time()
+    with world.connection.batch_start():
+        for i in range(100):
+            world.blocks[i * X] = Block('stone')
+    world.blocks[O]
+    assert time.time() - start < 1.0
+    assert server.bytes_received > 0
+    assert server.bytes_sent > 0
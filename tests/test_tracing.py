@@ -0,0 +1,150 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# An alternate Python Minecraft library for the Rasperry-Pi
+# Copyright (c) 2013-2016 Dave Jones <dave@waveform.org.uk>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+str = type('')
+
+import io
+import pytest
+from picraft import World, Model, Vector, Block, vector_range, O, X, Y, Z
+from picraft.testing import FakeServer
+from picraft.tracing import (
+    Tracer,
+    RecordingTracer,
+    set_tracer,
+    get_tracer,
+    span,
+    )
+
+
+@pytest.fixture()
+def tracer(request):
+    tracer = RecordingTracer()
+    set_tracer(tracer)
+    request.addfinalizer(lambda: set_tracer(None))
+    return tracer
+
+
+def test_span_no_tracer():
+    assert get_tracer() is None
+    with span('foo', bar=1) as s:
+        assert not s.recording
+        s.set(baz=2)
+
+def test_span_nesting(tracer):
+    assert get_tracer() is tracer
+    with span('outer', a=1) as outer:
+        assert outer.recording
+        with span('inner') as inner:
+            inner.set(b=2)
+    assert [s.name for s in tracer.spans] == ['inner', 'outer']
+    assert inner.parent is outer
+    assert outer.parent is None
+    assert inner.attrs == {'b': 2}
+    assert outer.attrs == {'a': 1}
+    assert outer.duration >= inner.duration >= 0
+    assert tracer.totals()['inner'][0] == 1
+
+def test_span_error(tracer):
+    with pytest.raises(ValueError):
+        with span('foo'):
+            raise ValueError('bar')
+    assert isinstance(tracer.spans[0].error, ValueError)
+
+def test_recording_tracer_limit():
+    tracer = RecordingTracer(limit=2)
+    for i in range(5):
+        with tracer.span('span%d' % i):
+            pass
+    assert [s.name for s in tracer.spans] == ['span3', 'span4']
+    tracer = RecordingTracer(limit=0)
+    with tracer.span('foo'):
+        pass
+    assert tracer.spans == []
+
+def test_tracer_subclass():
+    finished = []
+    class MyTracer(Tracer):
+        def finish(self, span):
+            finished.append(span.name)
+    set_tracer(MyTracer())
+    try:
+        with span('foo'):
+            pass
+    finally:
+        set_tracer(None)
+    assert finished == ['foo']
+
+def test_trace_world(tracer):
+    with FakeServer() as server:
+        world = World(*server.address)
+        try:
+            del tracer.spans[:]
+            world.blocks[vector_range(O, X * 3 + 1)] = Block('stone')
+            assert world.blocks[vector_range(O, X * 3 + 1)] == [Block('stone')] * 4
+            world.height[O]
+            world.events.poll()
+            with world.connection.batch_start():
+                world.blocks[O] = Block('dirt')
+        finally:
+            world.connection.close()
+    names = [s.name for s in tracer.spans]
+    assert names == [
+        'blocks.set',
+        'connection.transact_array', 'blocks.get',
+        'connection.transact', 'height.get',
+        'connection.transact', 'connection.transact', 'events.poll',
+        'blocks.set', 'connection.batch_send',
+        ]
+    assert tracer.spans[0].attrs == {
+        'count': 4, 'server_version': 'raspberry-juice'}
+    assert tracer.spans[1].parent is tracer.spans[2]
+    assert tracer.spans[1].attrs['command'] == 'world.getBlocks'
+    assert tracer.spans[2].attrs['count'] == 4
+    assert tracer.spans[-1].attrs == {'commands': 1}
+
+def test_trace_render(tracer):
+    m = Model(io.StringIO("""
+usemtl stone
+
+v 0 0 0
+v 4 0 0
+v 4 0 4
+v 0 0 4
+f 1 2 3 4
+"""))
+    m.render()
+    assert tracer.spans[-1].name == 'model.render'
+    assert tracer.spans[-1].attrs == {
+        'engine': 'filled', 'workers': None, 'faces': 1, 'voxels': 25}
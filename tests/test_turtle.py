@@ -0,0 +1,411 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# An alternate Python Minecraft library for the Rasperry-Pi
+# Copyright (c) 2013-2016 Dave Jones <dave@waveform.org.uk>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+str = type('')
+
+
+import time
+import threading
+
+import pytest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+import picraft.turtle
+import picraft.block
+from picraft import (
+    World, Vector, vector_range, Block, ConnectionError, O, X, Y, Z)
+from picraft.testing import FakeServer
+from picraft.turtle import Turtle, TurtleScreen, TurtleCache
+
+
+@pytest.fixture(params=['raspberry-juice', 'minecraft-pi'])
+def server(request):
+    server = FakeServer(version=request.param)
+    request.addfinalizer(server.close)
+    return server
+
+@pytest.fixture()
+def world(request, server):
+    world = World(*server.address, timeout=0.1)
+    request.addfinalizer(world.connection.close)
+    return world
+
+
+def test_turtle_cache_get(server, world):
+    world.blocks[Vector(1, 2, 3)] = Block('wool', 3)
+    cache = TurtleCache(world)
+    assert cache[[O, Vector(1, 2, 3)]] == {
+        O: Block('air'), Vector(1, 2, 3): Block('wool', 3)}
+    assert cache[[X, Y, Z]] == {X: Block('air'), Y: Block('air'), Z: Block('air')}
+    if server.version == 'raspberry-juice':
+        # The chunk around the origin is read once; only the non-air block
+        # requires its data to be read separately
+        assert server.commands['world.getBlocks'] == 1
+        assert server.commands['world.getBlockWithData'] == 1
+    else:
+        assert server.commands['world.getBlockWithData'] == 5
+
+def test_turtle_cache_set(server, world):
+    cache = TurtleCache(world)
+    cache[[O, X]]
+    with cache:
+        cache[[O, X]] = [Block('stone'), Block('air')]
+        assert cache[[O]] == {O: Block('stone')}
+        assert world.blocks[O] == Block('air')
+    assert world.blocks[O] == Block('stone')
+    assert server.commands['world.setBlock'] == 1
+
+def test_turtle_cache_compact(server, world):
+    cache = TurtleCache(world)
+    row = [O, X, 2 * X]
+    # Changes written immediately are sent as they were made...
+    cache[row] = [Block('stone')] * 3
+    assert world.blocks[O] == Block('stone')
+    assert server.commands['world.setBlock'] == 3
+    assert server.commands['world.setBlocks'] == 0
+    # ...but held changes are compacted when flushed
+    cache.defer = True
+    cache[row] = [Block('gold_block')] * 3
+    cache.flush()
+    assert world.blocks[O] == Block('gold_block')
+    assert server.commands['world.setBlock'] == 3
+    assert server.commands['world.setBlocks'] == 1
+
+def test_turtle_cache_flush_error(server, world):
+    cache = TurtleCache(world)
+    cache.defer = True
+    cache[[O, X]] = [Block('stone'), Block('stone')]
+    with mock.patch.object(
+            picraft.block.Blocks, '__setitem__',
+            side_effect=ConnectionError('write failed')):
+        with pytest.raises(ConnectionError):
+            cache.flush()
+    # The changes are held again, with later changes winning
+    cache[[X]] = [Block('gold_block')]
+    cache.flush()
+    assert world.blocks[O] == Block('stone')
+    assert world.blocks[X] == Block('gold_block')
+
+def test_turtle_cache_flush_later_error(server, world):
+    cache = TurtleCache(world)
+    cache.defer = True
+    cache.interval = 0.05
+    with mock.patch.object(
+            picraft.block.Blocks, '__setitem__',
+            side_effect=ConnectionError('write failed')), \
+            mock.patch('picraft.turtle.logger') as logger:
+        cache[[O]] = [Block('stone')]
+        time.sleep(0.3)
+        assert logger.exception.called
+    cache.flush()
+    assert world.blocks[O] == Block('stone')
+
+def test_turtle_prefetch(server, world):
+    world.blocks[Vector(0, 10, 2)] = Block('wool', 3)
+    t = Turtle(TurtleScreen(world), pos=Vector(0, 10, 0))
+    for i in range(100):
+        t.fd(3)
+        t.rt(37)
+    if server.version == 'raspberry-juice':
+        assert server.commands['world.getBlocks'] < 10
+        assert server.commands['world.getBlockWithData'] == 1
+    for i in range(200):
+        t.undo()
+    assert world.blocks[Vector(0, 10, 2)] == Block('wool', 3)
+
+def test_turtle_prefetch_solid(server, world):
+    world.blocks[vector_range(
+        Vector(-16, -16, -16), Vector(32, 16, 32))] = Block('stone')
+    world.blocks[O]
+    server.commands.clear()
+    t = Turtle(TurtleScreen(world), pos=O)
+    t.penblock('gold_block')
+    for i in range(20):
+        t.fd(1)
+    assert world.blocks[Vector(0, 0, 19)] == Block('gold_block')
+    if server.version == 'raspberry-juice':
+        # Each chunk is scanned once, however much of it isn't air
+        assert server.commands['world.getBlocks'] <= 4
+
+def test_turtle_undo_fill(server, world):
+    t = Turtle(TurtleScreen(world), pos=O)
+    t.hideturtle()
+    t.fill(True)
+    for i in range(4):
+        t.fd(30)
+        t.rt(90)
+    t.fill(False)
+    assert world.blocks[Vector(-15, 0, 15)] == Block('stone')
+    lookups = []
+    getitem = picraft.turtle._PackedChanges.__getitem__
+    def counted(self, key):
+        lookups.append(key)
+        return getitem(self, key)
+    picraft.turtle._PackedChanges.__getitem__ = counted
+    try:
+        t.undo()
+    finally:
+        picraft.turtle._PackedChanges.__getitem__ = getitem
+    assert world.blocks[Vector(-15, 0, 15)] == Block('air')
+    # Reverting the fill's ~900 blocks mustn't look each one up (which scans
+    # the packed changes, making the undo quadratic)
+    assert not lookups
+
+def test_turtle_packed_changes():
+    changes = picraft.turtle._PackedChanges({
+        O: Block('stone'), Vector(1, -2, 3): Block('wool', 3)})
+    assert len(changes) == 2
+    assert set(changes.keys()) == {O, Vector(1, -2, 3)}
+    assert changes[Vector(1, -2, 3)] == Block('wool', 3)
+    assert dict(changes.items()) == {
+        O: Block('stone'), Vector(1, -2, 3): Block('wool', 3)}
+    assert set(changes.values()) == {Block('stone'), Block('wool', 3)}
+    with pytest.raises(KeyError):
+        changes[X]
+    with pytest.raises(TypeError):
+        picraft.turtle._PackedChanges({Vector(0.5, 0, 0): Block('stone')})
+
+def test_turtle_undo(server, world):
+    t = Turtle(TurtleScreen(world), pos=O)
+    entries = t.undobufferentries()
+    t.fd(2)
+    t.fd(3)
+    assert world.blocks[2*Z] == Block('stone')
+    assert world.blocks[4*Z] == Block('stone')
+    assert t.undobufferentries() == entries + 2
+    t.undo()
+    assert world.blocks[4*Z] == Block('air')
+    assert world.blocks[2*Z] == Block('stone')
+    assert t.pos() == 2*Z
+    t.undo()
+    assert world.blocks[2*Z] == Block('air')
+    assert t.pos() == O
+    assert t.undobufferentries() == entries
+
+def test_turtle_undo_buffer(server, world):
+    world.blocks[Vector(0, 0, 2)] = Block('wool', 3)
+    t = Turtle(TurtleScreen(world), pos=O)
+    t.setundobuffer(3)
+    for i in range(4):
+        t.fd(4)
+        t.rt(90)
+    assert t.undobufferentries() == 3
+    assert len(t._sprite.history) < 6
+    for i in range(5):
+        t.undo()
+    # Only the last side is undone; the rest is beyond the undo buffer
+    assert world.blocks[Vector(-2, 0, 0)] == Block('air')
+    assert world.blocks[Vector(-4, 0, 4)] == Block('stone')
+    assert world.blocks[Vector(0, 0, 3)] == Block('stone')
+    t.clear()
+    assert world.blocks[Vector(0, 0, 3)] == Block('air')
+    assert world.blocks[Vector(0, 0, 2)] == Block('wool', 3)
+    t.setundobuffer(None)
+    t.fd(2)
+    assert t.undobufferentries() == 0
+    before = dict(server.blocks)
+    t.undo()
+    assert dict(server.blocks) == before
+
+def test_turtle_fill(server, world):
+    t = Turtle(TurtleScreen(world), pos=O)
+    t.fillblock('wool', 3)
+    assert not t.fill()
+    t.begin_fill()
+    assert t.fill()
+    for i in range(3):
+        t.fd(4)
+        t.lt(90)
+    t.end_fill()
+    assert not t.fill()
+    assert world.blocks[Vector(2, 0, 2)] == Block('wool', 3)
+    assert world.blocks[Vector(0, 0, 2)] == Block('stone')
+    # Ending a fill that hasn't begun does nothing
+    t.end_fill()
+    assert t.undobufferentries() == 9
+
+def test_turtle_fill_evicted(server, world):
+    t = Turtle(TurtleScreen(world), pos=O)
+    t.setundobuffer(2)
+    t.fill(True)
+    for i in range(3):
+        t.fd(4)
+        t.lt(90)
+    assert t.fill()
+    t.fill(False)
+    assert not t.fill()
+    assert world.blocks[Vector(2, 0, 2)] == Block('stone')
+    assert world.blocks[Vector(3, 0, 3)] == Block('stone')
+
+def test_turtle_tracer(server, world):
+    def writes():
+        return server.commands['world.setBlock'] + server.commands['world.setBlocks']
+    screen = TurtleScreen(world)
+    t = Turtle(screen, pos=O)
+    assert screen.tracer() == 1
+    assert screen.tracing
+    screen.tracer(0)
+    assert screen.tracer() == 0
+    assert not screen.tracing
+    # Read a block so the server has processed the turtle's initial writes
+    world.blocks[O]
+    count = writes()
+    for i in range(4):
+        t.fd(4)
+        t.rt(90)
+    assert writes() == count
+    assert t.undobufferentries() == 8
+    screen.update()
+    assert world.blocks[Vector(0, 0, 3)] == Block('stone')
+    assert world.blocks[Vector(-4, 0, 2)] == Block('stone')
+    assert world.blocks[Vector(0, 0, 1)] == Block('wool', 15)
+    # A line drawn and undone before the next update costs nothing
+    count = writes()
+    t.fd(4)
+    t.undo()
+    screen.update()
+    assert writes() == count
+    assert world.blocks[Vector(0, 0, 1)] == Block('wool', 15)
+    screen.tracer(1)
+    t.fd(2)
+    assert world.blocks[Vector(0, 0, 2)] == Block('stone')
+    with pytest.raises(ValueError):
+        screen.tracer(-1)
+
+def test_turtle_tracer_every(server, world):
+    screen = TurtleScreen(world)
+    t = Turtle(screen, pos=O)
+    screen.tracer(3)
+    t.fd(2)
+    t.fd(2)
+    assert world.blocks[Vector(0, 0, 3)] == Block('air')
+    t.fd(2)
+    assert world.blocks[Vector(0, 0, 3)] == Block('stone')
+    assert world.blocks[Vector(0, 0, 7)] == Block('wool', 15)
+    assert screen.tracer() == 3
+    assert picraft.turtle.tracer.__doc__
+    assert picraft.turtle.update.__doc__
+
+def test_turtle_screen_interval(server, world):
+    screen = TurtleScreen(world)
+    with pytest.raises(ValueError):
+        screen.interval = 0
+    screen.interval = 0.05
+    assert screen.interval == 0.05
+    t = Turtle(screen, pos=O)
+    t.fd(3)
+    assert world.blocks[Vector(0, 0, 2)] == Block('air')
+    time.sleep(0.3)
+    assert world.blocks[Vector(0, 0, 2)] == Block('stone')
+    screen.interval = None
+    t.fd(3)
+    assert world.blocks[Vector(0, 0, 5)] == Block('stone')
+
+def test_turtle_screen_conflicts(server, world):
+    region = vector_range(Vector(-3, 0, -3), Vector(4, 1, 4))
+    def draw(interval, finish):
+        screen = TurtleScreen(world)
+        screen.interval = interval
+        t1 = Turtle(screen, pos=Vector(-2, 0, 0))
+        t2 = Turtle(screen, pos=Vector(0, 0, -2))
+        t1.hideturtle()
+        t2.hideturtle()
+        t1.penblock('stone')
+        t2.penblock('gold_block')
+        t1.rt(90)
+        # t2 draws through (0, 0, 0) first, then t1 draws over it
+        t2.fd(4)
+        t1.bk(4)
+        finish(screen)
+        result = world.blocks[region]
+        world.blocks[region] = Block('air')
+        return result
+    expected = draw(None, lambda screen: None)
+    assert expected[region.index(O)] == Block('stone')
+    assert expected[region.index(Vector(1, 0, 0))] == Block('stone')
+    assert expected[region.index(Vector(0, 0, 1))] == Block('gold_block')
+    # Merged changes give the same result however they are written
+    assert draw(10, lambda screen: screen.update()) == expected
+    assert draw(0.05, lambda screen: time.sleep(0.3)) == expected
+
+def test_turtle_screen_threads(server, world):
+    screen = TurtleScreen(world)
+    screen.interval = 0.01
+    turtles = [Turtle(screen, pos=Vector(i * 2, 0, 0)) for i in range(20)]
+    def draw(t):
+        for i in range(4):
+            t.fd(5)
+            t.rt(90)
+    threads = [threading.Thread(target=draw, args=(t,)) for t in turtles]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    screen.update()
+    for i in range(20):
+        assert world.blocks[Vector(i * 2, 0, 3)] == Block('stone')
+
+def test_turtle_functions(server, world):
+    assert 'fd' in dir(picraft.turtle)
+    assert 'tracer' in picraft.turtle.__all__
+    namespace = {}
+    exec('from picraft.turtle import *', namespace)
+    assert 'fd' in namespace
+    assert 'TurtleScreen' in namespace
+    for name in ('World', 'Vector', 'Block', 'O', 'X', 'Y', 'Z', 'line', 'filled'):
+        assert name in namespace
+    assert 'Lock' not in namespace
+    assert 'namedtuple' not in namespace
+    assert 'span' not in namespace
+    assert picraft.turtle.fd.__name__ == 'fd'
+    assert picraft.turtle.fd is picraft.turtle.fd
+    assert '>>> forward(5)' in picraft.turtle.forward.__doc__
+    assert 'turtle.forward' not in picraft.turtle.forward.__doc__
+    with pytest.raises(AttributeError):
+        picraft.turtle.foo
+    screen = TurtleScreen(world)
+    try:
+        picraft.turtle._SCREEN = screen
+        picraft.turtle._TURTLE = Turtle(screen, pos=O)
+        picraft.turtle.fd(3)
+        assert world.blocks[Vector(0, 0, 2)] == Block('stone')
+        assert picraft.turtle.pos() == Vector(0, 0, 3)
+        picraft.turtle.tracer(0)
+        assert screen.tracer() == 0
+    finally:
+        picraft.turtle._SCREEN = None
+        picraft.turtle._TURTLE = None
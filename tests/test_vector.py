@@ -39,7 +39,7 @@ str = type('')
 import pytest
 import math
 from conftest import fp_equal, fp_vectors_equal
-from picraft import Vector, vector_range, line, lines, circle, sphere, filled, O, X, Y, Z, V
+from picraft import Vector, vector_range, line, lines, circle, sphere, filled, cuboids, O, X, Y, Z, V
 from picraft.vector import rmod, rdiv, sign
 from picraft.compat import range
 
@@ -424,3 +424,14 @@ def test_vector_filled_circle():
     assert set(filled(circle(O, X))) == {-X, Y, X, -Y, O}
     assert set(filled(circle(X, X))) == {O, X+Y, X, 2*X, X-Y}
     assert set(filled(circle(O, 2*X))) == {-2*X, -X+Y, 2*Y, X+Y, 2*X, X-Y, -2*Y, -X-Y, -X, Y, X, -Y, O}
+
+def test_vector_cuboids():
+    assert list(cuboids([])) == []
+    assert list(cuboids([O, O])) == [vector_range(O, O + 1)]
+    assert list(cuboids(vector_range(V(2, 3, 4)))) == [vector_range(V(2, 3, 4))]
+    assert list(cuboids([O, X, 2*X, Z, 2*Z])) == [
+        vector_range(V(3, 1, 1)), vector_range(Z, V(1, 1, 3))]
+    points = set(sphere(O, 4))
+    boxes = list(cuboids(points))
+    assert sum(len(box) for box in boxes) == len(points)
+    assert set(v for box in boxes for v in box) == points
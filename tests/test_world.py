@@ -38,11 +38,13 @@ str = type('')
 
 import pytest
 import io
+import os
 import picraft.world
 import picraft.block
 import picraft.player
 import picraft.events
-from picraft import World, Vector, vector_range, Connection, NotSupported
+from picraft import World, Vector, vector_range, Connection, NotSupported, Block, Snapshot
+from picraft.testing import FakeServer
 try:
     from unittest import mock
 except ImportError:
@@ -187,3 +189,81 @@ def test_camera_3rd_person():
         c().server_version = 'raspberry-juice'
         with pytest.raises(NotSupported):
             w.camera.third_person(w.player)
+
+@pytest.mark.parametrize('version', ['raspberry-juice', 'minecraft-pi'])
+def test_snapshot_restore(version):
+    with FakeServer(version=version) as server:
+        with World(*server.address, timeout=0.1) as w:
+            w.blocks[Vector(1, 0, 1)] = Block('wool', 3)
+            w.blocks[Vector(2, 1, 2)] = Block('stone')
+            region = vector_range(Vector(0, 0, 0), Vector(4, 2, 4))
+            s = w.snapshot(region, 'test')
+            assert w.snapshots == {'test': s}
+            assert len(s) == 32
+            assert s.vrange == region
+            assert s[Vector(1, 0, 1)] == Block('wool', 3)
+            assert s[Vector(2, 1, 2)] == Block('stone')
+            assert list(s)[0] == Block('air')
+            assert Vector(3, 1, 3) in s
+            assert Vector(4, 1, 3) not in s
+            with pytest.raises(KeyError):
+                s[Vector(4, 0, 0)]
+            w.blocks[Vector(0, 0, 0):Vector(4, 1, 4)] = Block('dirt')
+            w.blocks[Vector(2, 1, 2)] = Block('air')
+            w.blocks[Vector(1, 0, 1)] = Block('wool', 5)
+            # Read a block so the server has processed the writes above
+            assert w.blocks[Vector(1, 0, 1)] == Block('wool', 5)
+            server.commands.clear()
+            with mock.patch.object(
+                    w.connection, 'batch_send',
+                    wraps=w.connection.batch_send) as batch_send:
+                s.restore()
+                assert batch_send.call_count == 1
+            assert w.blocks[Vector(1, 0, 1)] == Block('wool', 3)
+            assert w.blocks[Vector(2, 1, 2)] == Block('stone')
+            assert w.blocks[Vector(3, 0, 3)] == Block('air')
+            assert list(w.snapshot(region)) == list(s)
+            # Differing blocks are written in boxes
+            assert server.commands['world.setBlock'] + server.commands['world.setBlocks'] < 8
+            server.commands.clear()
+            s.restore()
+            assert server.commands['world.setBlock'] == 0
+            assert server.commands['world.setBlocks'] == 0
+
+def test_snapshot_context():
+    with FakeServer() as server:
+        with World(*server.address, timeout=0.1) as w:
+            region = vector_range(Vector(0, 0, 0), Vector(2, 2, 2))
+            with w.snapshot(region):
+                w.blocks[Vector(0, 0, 0)] = Block('stone')
+            assert w.blocks[Vector(0, 0, 0)] == Block('stone')
+            with pytest.raises(ValueError):
+                with w.snapshot(region):
+                    w.blocks[Vector(1, 1, 1)] = Block('stone')
+                    raise ValueError()
+            assert w.blocks[Vector(0, 0, 0)] == Block('stone')
+            assert w.blocks[Vector(1, 1, 1)] == Block('air')
+
+def test_snapshot_save_load(tmpdir):
+    with FakeServer(version='minecraft-pi') as server:
+        with World(*server.address, timeout=0.1) as w:
+            w.blocks[Vector(1, 0, 1)] = Block('wool', 3)
+            region = vector_range(Vector(0, 0, 0), Vector(3, 2, 3), order='xyz')
+            s = w.snapshot(region)
+            stream = io.BytesIO()
+            s.save(stream)
+            stream.seek(0)
+            t = w.load_snapshot(stream, 'loaded')
+            assert w.snapshots['loaded'] is t
+            assert t.vrange == region
+            assert t.vrange.order == 'xyz'
+            assert list(t) == list(s)
+            filename = os.path.join(str(tmpdir), 'region.snapshot')
+            s.save(filename)
+            t = Snapshot.load(w, filename)
+            assert list(t) == list(s)
+            w.blocks[Vector(1, 0, 1)] = Block('air')
+            t.restore()
+            assert w.blocks[Vector(1, 0, 1)] == Block('wool', 3)
+            with pytest.raises(ValueError):
+                Snapshot.load(w, io.BytesIO(b'foo'))